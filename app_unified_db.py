@@ -12,17 +12,23 @@ MODIFIED VERSION - Uses Database + Excel Export
 import sys
 import io
 import os
+import re
 import time
+import queue
 import logging
+import threading
+import zipfile
+from functools import partial
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict, Optional
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import openpyxl
-import qrcode
-from PIL import Image
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from PIL.PngImagePlugin import PngInfo
 import base64
 from dotenv import load_dotenv
 
@@ -33,12 +39,13 @@ load_dotenv()
 from database import (
     init_database, save_qc_checks,
     check_process_status, battery_pack_exists, get_all_battery_packs,
-    get_qc_checks, get_dashboard_status, get_not_ok_checks,
-    save_battery_pack, get_battery_pack_info
+    get_qc_checks, get_all_qc_checks_by_pack, get_dashboard_status, get_not_ok_checks,
+    save_battery_pack, get_battery_pack_info, get_qc_checks_export_rows
 )
-from excel_generator import (
-    generate_battery_excel, generate_master_excel, update_excel_after_entry,
-    generate_battery_excel_bytes, generate_all_reports_excel_bytes
+# excel_generator (openpyxl), plotly, qrcode and cv2 are imported where they are
+# used, so the first page render doesn't wait for libraries most reruns never touch
+from process_definitions import (
+    PROCESS_DEFINITIONS, PROCESS_ROW_MAPPING, PROCESS_ORDER, PROCESS_CHECKS
 )
 from backup_manager import create_backup, list_backups, get_database_size
 from hioki_streamlit_simple import render_hioki_cell_sorting_tab
@@ -58,209 +65,6 @@ try:
 except Exception as e:
     logger.error(f"Database initialization failed: {e}")
 
-# Process definitions - Synced with template.xlsx (source of truth)
-PROCESS_DEFINITIONS = {
-    "Cell Sorting": {
-        "qc_checks": [
-            "1.1.1 Acceptable range Voltage : 3.58 to 3.6 V, IR : 11.5 to 12.5 mΩ",
-            "1.2.1 Jig setup on the flat surface",
-            "1.2.2 Visual & spacing inspection",
-            "1.2.3 No moisture, dust on the cell surface (no contaminations) - IP clean",
-        ],
-        "acceptance_criteria": [
-            "Nominal Voltage within 3.58–3.6 V (20 mV) & IR : 11.5–12.5 mΩ",
-            "Flatness ≤0.2 mm. No wobble or movement during assembly",
-            "All cells aligned as per design. No dents/scratches. Adhesive thickness 400 microns, cell-to-cell gap maintained",
-            "Surfaces free from dust, fibers, particles, oil, grease, or foreign substances on cells or jig",
-        ]
-    },
-    "Module Assembly": {
-        "qc_checks": [
-            "2.1.1 Proper fitment to the Base plate fixture and base plate orientation",
-            "2.1.2 Clinch/all rivets perpendicular to the plate & proper clinch",
-            "2.2.1 Volume consistency",
-            "2.2.2 Coverage in space/gap",
-            "2.2.3 Jig alignment correction",
-            "2.2.4 Cure and bond integrity - 2 hrs. adhesive curing after cell flip",
-            "2.3.1 Cell continuity check & visual check on cell fitment, Cell Height (72.6 mm) from base plate after dismantling fixture",
-            "2.3.2 Cleanliness inspection",
-            "2.4.1 Even fix of sidewall (PC sheets) on all four sides without gaps, proper dimension 72.5 mm × 239.4 mm",
-            "2.5.1 Placement as per drawing & wire routings (Thermistor - 7 nos / Voltage harness - 14 nos)",
-            "2.5.2 Secure adhesion & positioning with thermal adhesive",
-            "2.5.3 No insulation damage or routing faults (Visual + routing diagram comparison)",
-            "2.6.1 Busbar fitment as per drawings, Curing time 1 hr.",
-            "2.6.2 Busbar placement & defect absence",
-            "2.6.3 Adhesive coverage - Ensure full bond",
-            "2.6.4 Adhesion strength",
-            "2.6.5 Busbar and CPT sub-assembly dim (Ht 22.2 mm from the base)",
-        ],
-        "acceptance_criteria": [
-            "Battery pack sits flush; no gaps or misalignment; locking features engage properly and not wobble",
-            "Rivets: no bending/cracking; rivet heads flush with surface; clinch depth meets design specs",
-            "Volume within ±10% of spec (400–600 microns); no spill/insufficient bond. Dielectric strength 19.0 kV/mm",
-            "Uniform spread & no voids",
-            "Proper jig positioning & no misalignment",
-            "No cracks, bubbles, or discoloration in cured adhesive",
-            "No continuity; cell in nominal voltage. Height 72.6 mm ± 0.15 mm from base plate (all cells)",
-            "Cell surfaces free from dust, moisture, oil, or any foreign particles",
-            "No warping/bending/uneven spacing. Dim Tol: 72.5 mm ±0.15 mm × 239.4 mm (±0.20–0.30)",
-            "Thermistors 15 mm from top of cell; Voltage Harness orientation & positioning correct",
-            "Firm fixation & no loose ends",
-            "No cuts/abrasions/exposed conductors; wires not pinched/twisted/routed over sharp edges",
-            "As per drawing; orientation & alignment correct; busbar undisturbed during curing",
-            "Busbar free from bends, warping, or surface damage",
-            "Full coverage; even thickness (200 micron); no overflow/underfill. Dielectric strength 19.0 kV/mm. Full cure in 2–3 hrs at 25°C",
-            "Manual pull/peel should not cause detachment without damaging substrate",
-            "Tolerance: 22.2 mm ± 0.10 mm",
-        ]
-    },
-    "Encapsulation & Soldering - Phase 1": {
-        "qc_checks": [
-            "3.1.1 No encapsulant leakage from sidewalls. Curing time 2 hr @ room temperature ~25°C",
-            "3.1.2 Dimensions: L 410.3 × W 239.4 mm",
-            "3.2.1 Busbar + CPT module assembly dim (Ht 78 mm from the base)",
-            "3.2.2 Soldering check & Voltage of module level (soft soldering of voltage taps on cell positive surface)",
-            "3.3.1 Proper Stripping, crimping & connector insertion for voltage tap and thermistor",
-        ],
-        "acceptance_criteria": [
-            "Encapsulant fills 75–85% of cavity height uniformly; no leakage from side walls or joints",
-            "Outer casing dimensions post-potting within ±0.50 to 1.50 mm of original",
-            "Tolerance: 78 mm ± 0.15 mm",
-            "Solder flows and wets both pad and lead; no excessive solder; each tap outputs correct voltage; no continuity present",
-            "Firmly bonded; no loose strands/misalignment/broken housing; no insulation debris; labels clearly visible; no disconnect under light pull test",
-        ]
-    },
-    "Wire Bonding": {
-        "qc_checks": [
-            "4.1.1 The 4 bonds on each cell as per the drawing, module voltage & continuity (no continuity present)",
-        ],
-        "acceptance_criteria": [
-            "Smooth loop; loop height ≤1 mm from bus bar; no bond lift/broken during normal handling; double bonds per terminal; all bonded connections pass continuity test",
-        ]
-    },
-    "Encapsulation Phase II (100%)": {
-        "qc_checks": [
-            "5.1.1 Equal distribution of encapsulant on the module (4 hrs. curing)",
-            "5.2.1 Dimensions: H 78.6 × L 410.3 × W 239.4 mm",
-        ],
-        "acceptance_criteria": [
-            "All internal components, pins, wires, and solder joints must be fully embedded",
-            "Final fill height within ±1 mm of designed enclosure height (no overfilling)",
-        ]
-    },
-    "Module QC Checks": {
-        "qc_checks": [
-            "6.1.1 Check for Spec: a) Weight 17 Kg  b) Module Voltage 50 V  c) Continuity: Not present  d) Module Height: 78.6 mm. Encapsulation & Final module visual checks, Floating Voltage & Isolation",
-        ],
-        "acceptance_criteria": [
-            "a) Weight 17 ± 0.500 Kg  b) Module Voltage difference 100–150 mV  c) Continuity: Not present  d) Module Height: 78.6 mm ± 0.15 mm. Surface level/smooth/tack-free after curing; final fill within ±1 mm; potting seals wire outlets",
-        ]
-    },
-    "EOL Testing": {
-        "qc_checks": [
-            "7.1.1 Check for Abnormal temp & voltages and cell imbalance, Isolation resistance (EOL: 300 amp charge and discharge)",
-        ],
-        "acceptance_criteria": [
-            "Isolation resistance min 10 MΩ per module before CDC; no continuity. 0.3C DChg, 0.5C Chg, 4C DChg pulse; compliance with all EOL testing criteria including capacity, temperature, and sensor accuracy",
-        ]
-    },
-    "Pack Assembly": {
-        "qc_checks": [
-            "8.1.1 Check whether PRV nut interfering",
-            "8.2.1 Check sealant applied uniformly & MSM gap maintained between two modules (11.2 mm)",
-            "8.3.1 Check sealant application and side foam in fire arrestor. Check width 168.4 mm & leak check",
-            "8.4.1 Torque check @ M4 Allen head",
-            "8.5.1 No gaps allowed / proper fitment check. PRV: M5 - 1 Nm",
-            "8.6.1 Terminal Placement verification with Jig",
-            "8.6.2 PCB Placement verification with Jig",
-            "8.6.3 Stud Placement and weld check with Jig",
-            "8.6.4 Mounting point alignment (Heatsink) with Jig",
-            "8.6.5 Pack dimensions (430 × 168.4 × 301.35 mm) check",
-            "8.6.6 Torque checks & torque marking",
-            "8.6.7 Flatness ≤ 0.5 mm",
-            "8.6.8 Sealing - PCB, Overall Pack Body & Terminals",
-            "8.6.9 Overall aesthetics/cleanliness of the pack",
-            "8.6.10 Top casing torque check and paint marking (M4 socket head)",
-            "8.6.11 Leak test / Pressure test (Passed/Failed)",
-            "8.6.12 Pack weight (CAD Wt.: 38 Kg)",
-            "8.7.1 Pack voltage: 100 V Nominal",
-            "8.7.2 Isolation resistance: Min in MΩ",
-            "8.7.3 Hard leakage to body - Shouldn't present",
-            "8.7.4 Voltage taps and thermistor readings with respect to PRAVAIG BMS (PCB communications: voltage + temperature)",
-            "8.7.5 Hard leakage to body - Shouldn't present (after bench drop test ~20°)",
-        ],
-        "acceptance_criteria": [
-            "Module 1 & 2 sit flush; no tilt or gap >0.5 mm; bolt holes/studs align ±0.5 mm; no connectors/harnesses rubbing enclosure; PRV nut torques freely to full spec",
-            "Tolerance: ±0.10 to 0.15 mm",
-            "Foam seated evenly without compression loss; sealant continuous with no gaps; M6: 6.5–7.0 Nm, M5: 3–3.5 Nm; assembled width 168.4 mm ± 0.2 mm",
-            "M4: 1.5 Nm ± 0.1 Nm; proper alignment with terminal pads; no oxidation/oil/dust on contact area",
-            "Cover flush; no warpage/scratches/dents; PRV: M5 torqued to 1.0 Nm ± 0.1 Nm; clean, free from smudges/sealant spills/loose parts",
-            "Should match acceptance jig for alignment (terminal hole matches busbar)",
-            "Should match acceptance jig for alignment",
-            "Match jig; 90° ± 1° perpendicular to base; no thread damage (M5); no cracks/undercuts/pinholes",
-            "Should match acceptance jig for alignment",
-            "Tolerance: ±0.40 to 0.60 mm",
-            "M6: 6.5–7.0 Nm, M5: 3–3.5 Nm, M4: 1.5 Nm ±0.1 Nm, M3: 0.5–0.6 Nm, PRV M5: 1 Nm",
-            "Tolerance: ±0.1 mm",
-            "Full coverage; no gaps/voids along PCB edge or housing boundary; fasteners must NOT be sealed with sealant",
-            "Dust/particle free; no sealant overflow/oil/grease residue; top cover/side plates/connectors flush ±0.5 mm; all fasteners present and fixed",
-            "M4: 1.5 Nm ± 0.1 Nm with torque wrench",
-            "Terminal glands, casing joints, PRV leak-free after 3 psi applied; pack must hold 3 psi",
-            "Acceptable weight range: 37.5 kg – 38.5 kg",
-            "98 V to 100 V",
-            "Min 10 MΩ (-ve to casing body & +ve to casing body)",
-            "No continuity present",
-            "28 voltage taps verified: 100–150 mV; 11 thermistor readings verified",
-            "No continuity present",
-        ]
-    },
-    "Ready for Dispatch": {
-        "qc_checks": [
-            "9.1 Overall pack visual inspection: No defects/no dents/no stains. HV terminals covered with Kapton, PCB covered, PRV placed and covered, product labels, warning labels, +ve & -ve terminal labels, manufacturing date and QC decals placed. (SOC % before dispatch ≤30%)",
-        ],
-        "acceptance_criteria": [
-            "All inspection criteria met; labels verified; SOC ≤30% confirmed before dispatch",
-        ]
-    }
-}
-
-# Row mapping for Excel sheet
-# Maps process name to starting row and column configuration
-PROCESS_ROW_MAPPING = {
-    "Cell Sorting": {"start_row": 8, "type": "standard"},
-    "Module Assembly": {"start_row": 12, "type": "standard"},
-    "Encapsulation & Soldering - Phase 1": {"start_row": 29, "type": "standard"},
-    "Wire Bonding": {"start_row": 34, "type": "standard"},
-    "Encapsulation Phase II (100%)": {"start_row": 35, "type": "standard"},
-    "Module QC Checks": {"start_row": 37, "type": "standard"},
-    "EOL Testing": {"start_row": 38, "type": "standard"},
-    "Pack Assembly": {"start_row": 40, "type": "pack"},
-    "Ready for Dispatch": {"start_row": 62, "type": "dispatch"}
-}
-
-# Helper Functions
-def safe_write_cell(ws, row: int, column: int, value):
-    """Safely write to a cell, handling merged cells."""
-    try:
-        cell = ws.cell(row=row, column=column)
-        # Check if this is a MergedCell
-        if isinstance(cell, openpyxl.cell.cell.MergedCell):
-            # Find the merged range this cell belongs to
-            for merged_range in ws.merged_cells.ranges:
-                if cell.coordinate in merged_range:
-                    # Get the top-left cell of the merged range
-                    min_row = merged_range.min_row
-                    min_col = merged_range.min_col
-                    top_left_cell = ws.cell(row=min_row, column=min_col)
-                    top_left_cell.value = value
-                    return
-        else:
-            # Normal cell, write directly
-            cell.value = value
-    except Exception as e:
-        logger.error(f"Error writing to cell ({row}, {column}): {e}")
-        raise
-
 # ============================================================================
 # CACHED DB READ WRAPPERS
 # Short TTL prevents stale data; cache is explicitly cleared after every write.
@@ -271,19 +75,67 @@ def safe_write_cell(ws, row: int, column: int, value):
 def cached_get_qc_checks(pack_id: str, process_name: str = None):
     return get_qc_checks(pack_id, process_name)
 
+@st.cache_data(ttl=5)
+def cached_get_existing_check_data(pack_id: str, process_name: str) -> dict:
+    """Saved values per check name for one pack/process, already shaped for the QC form."""
+    existing_data = {}
+    for check in get_qc_checks(pack_id, process_name):
+        existing_data[check.get('check_name', '')] = {
+            'module_x': check.get('module_x', ''),
+            'module_y': check.get('module_y', ''),
+            'technician_name': check.get('technician_name', ''),
+            'qc_name': check.get('qc_name', ''),
+            'remarks': check.get('remarks', ''),
+            'end_date': check.get('end_date', '')
+        }
+    return existing_data
+
 @st.cache_data(ttl=5)
 def cached_check_process_status(pack_id: str, process_name: str):
     return check_process_status(pack_id, process_name)
 
+@st.cache_data(ttl=5)
+def cached_battery_pack_exists(pack_id: str):
+    return battery_pack_exists(pack_id)
+
+@st.cache_data(ttl=5)
+def cached_get_battery_pack_info(pack_id: str):
+    return get_battery_pack_info(pack_id)
+
+@st.cache_data(ttl=5)
+def cached_get_not_ok_checks(pack_id: str, process_names: tuple):
+    return get_not_ok_checks(pack_id, list(process_names))
+
 @st.cache_data(ttl=10)
 def cached_get_all_battery_packs():
     return get_all_battery_packs()
 
+@st.cache_data(ttl=10)
+def cached_get_all_qc_checks_by_pack():
+    """Every pack's QC checks from one query, for views that list all packs."""
+    return get_all_qc_checks_by_pack()
+
 @st.cache_data(ttl=300)
 def cached_generate_battery_excel_bytes(pack_id: str):
     """Cache Excel bytes per pack — regenerated only after a QC save or every 5 min."""
+    from excel_generator import generate_battery_excel_bytes
     return generate_battery_excel_bytes(pack_id)
 
+def build_pack_excel_download(pack_id: str) -> bytes:
+    """Excel bytes for a Reports-tab download, built when the button is clicked."""
+    excel_data = cached_generate_battery_excel_bytes(pack_id)
+    if excel_data is None:
+        raise RuntimeError(f"Excel generation failed for {pack_id}")
+    return excel_data
+
+def build_all_reports_download() -> bytes:
+    """All-packs workbook for the Reports tab, built when the button is clicked."""
+    from excel_generator import generate_all_reports_excel_bytes
+    excel_bytes = generate_all_reports_excel_bytes()
+    if excel_bytes is None:
+        raise RuntimeError("All-reports Excel generation failed or there is no data to export")
+    return excel_bytes
+
 @st.cache_data(ttl=60)
 def cached_list_backups():
     return list_backups()
@@ -295,8 +147,13 @@ def cached_get_database_size():
 def clear_data_caches():
     """Call after any write operation to ensure fresh data on next read."""
     cached_get_qc_checks.clear()
+    cached_get_existing_check_data.clear()
     cached_check_process_status.clear()
+    cached_battery_pack_exists.clear()
+    cached_get_battery_pack_info.clear()
+    cached_get_not_ok_checks.clear()
     cached_get_all_battery_packs.clear()
+    cached_get_all_qc_checks_by_pack.clear()
     cached_generate_battery_excel_bytes.clear()
 
 def clear_backup_caches():
@@ -305,6 +162,106 @@ def clear_backup_caches():
     cached_get_database_size.clear()
 
 
+# ============================================================================
+# DEFERRED EXCEL EXPORT + BACKUP WORKER
+# Saves only write to the database and enqueue the pack ID. A single background
+# thread coalesces repeated saves (same pack within the window) into one Excel
+# rebuild, so operators never wait on openpyxl. Backups are debounced: at most
+# one per BACKUP_INTERVAL_SECONDS, plus a trailing one once the interval after
+# the last save has elapsed, so the newest data always ends up in a backup.
+# ============================================================================
+
+EXPORT_COALESCE_SECONDS = 0.5
+BACKUP_INTERVAL_SECONDS = 300
+
+def _export_worker(export_queue: queue.Queue):
+    """Drain the export queue forever, rebuilding each pending pack's Excel once per batch."""
+    from excel_generator import update_excel_after_entry
+
+    last_backup = float("-inf")
+    backup_due = False
+    while True:
+        # Sleep until the next save, or until a pending backup becomes due
+        timeout = max(0.0, last_backup + BACKUP_INTERVAL_SECONDS - time.monotonic()) if backup_due else None
+        try:
+            pending = {export_queue.get(timeout=timeout)}
+        except queue.Empty:
+            pending = set()
+
+        if pending:
+            time.sleep(EXPORT_COALESCE_SECONDS)
+            while True:
+                try:
+                    pending.add(export_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                for pack_id in pending:
+                    update_excel_after_entry(pack_id)
+            except Exception as e:
+                logger.warning(f"Deferred Excel export failed: {e}")
+            backup_due = True
+
+        if backup_due and time.monotonic() - last_backup >= BACKUP_INTERVAL_SECONDS:
+            try:
+                # Automatic backup after data entry (debounced)
+                backup_file = create_backup()
+                if backup_file:
+                    logger.info(f"Automatic backup created after data entry: {backup_file}")
+            except Exception as e:
+                logger.warning(f"Automatic backup failed: {e}")
+            last_backup = time.monotonic()
+            backup_due = False
+
+@st.cache_resource
+def get_export_queue() -> queue.Queue:
+    """Start the export worker once per server process and return its queue."""
+    export_queue = queue.Queue()
+    threading.Thread(target=_export_worker, args=(export_queue,),
+                     name="excel-export-worker", daemon=True).start()
+    return export_queue
+
+
+QR_CODES_DIR = Path("qr_codes")
+QR_CODES_DIR.mkdir(exist_ok=True)
+# Rows per page in the Saved QR Codes gallery
+QR_GALLERY_PAGE_SIZE = 25
+
+
+@st.cache_resource(ttl=30)
+def cached_qr_code_ids() -> set:
+    """Battery pack IDs with a saved QR PNG, from one directory scan.
+    The set is shared (not copied), so generate_qr_code adds new IDs in place."""
+    QR_CODES_DIR.mkdir(exist_ok=True)
+    with os.scandir(QR_CODES_DIR) as entries:
+        return {entry.name[:-4] for entry in entries if entry.name.endswith(".png")}
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def cached_list_qr_files() -> list:
+    """(pack_id, casefolded pack_id, mtime, size) for every saved QR PNG, newest
+    first, from one directory scan; the gallery's search and sort work on this list."""
+    QR_CODES_DIR.mkdir(exist_ok=True)
+    with os.scandir(QR_CODES_DIR) as entries:
+        qr_files = [(entry.name[:-4], entry.name[:-4].casefold(), stat.st_mtime, stat.st_size)
+                    for entry in entries if entry.name.endswith(".png")
+                    for stat in (entry.stat(),)]
+    qr_files.sort(key=itemgetter(2), reverse=True)
+    return qr_files
+
+
+def build_qr_zip(pack_ids: tuple) -> bytes:
+    """ZIP of the given packs' QR PNGs for the gallery's bulk download, built on click.
+    PNGs are already DEFLATE-compressed, so they are stored as-is rather than
+    recompressed."""
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_STORED) as zip_file:
+        for pack_id in pack_ids:
+            zip_file.write(QR_CODES_DIR / f"{pack_id}.png", f"{pack_id}.png")
+    return zip_buffer.getvalue()
+
+
 def check_battery_exists(battery_pack_id: str) -> dict:
     """Check if battery pack ID already exists in system."""
     exists_info = {
@@ -314,17 +271,13 @@ def check_battery_exists(battery_pack_id: str) -> dict:
         'sheet_exists': False
     }
 
-    # Check if QR code file exists
-    qr_dir = Path("qr_codes")
-    qr_dir.mkdir(exist_ok=True)
-    qr_path = qr_dir / f"{battery_pack_id}.png"
-
-    if qr_path.exists():
+    # Check if QR code file exists (cached directory listing)
+    if battery_pack_id in cached_qr_code_ids():
         exists_info['qr_exists'] = True
-        exists_info['qr_path'] = qr_path
+        exists_info['qr_path'] = QR_CODES_DIR / f"{battery_pack_id}.png"
 
-    # Check if battery exists in database
-    exists_info['data_exists'] = battery_pack_exists(battery_pack_id)
+    # Check if battery exists in database (cached)
+    exists_info['data_exists'] = cached_battery_pack_exists(battery_pack_id)
     exists_info['sheet_exists'] = exists_info['data_exists']
 
     return exists_info
@@ -337,89 +290,150 @@ def check_process_data_exists(battery_pack_id: str, process_name: str) -> dict:
     return cached_check_process_status(battery_pack_id, process_name)
 
 
+def empty_process_status(process_name: str) -> dict:
+    """Status of a process with no saved checks (same shape as check_process_status)."""
+    process_info = PROCESS_ROW_MAPPING.get(process_name)
+    return {
+        'exists': False,
+        'started': False,
+        'completed': False,
+        'process_type': process_info.kind if process_info else None,
+        'both_modules_complete': False,
+        'module_x_complete': False,
+        'module_y_complete': False,
+        'has_any_data': False,
+        'completed_checks': 0,
+        'total_checks': 0
+    }
+
+
 def get_blocking_not_ok_processes(pack_id: str, target_process_name: str) -> list:
     """
     Check if any process BEFORE target_process_name has a NOT OK result.
     Returns list of blocking items: [{process_name, check_name, module}, ...]
     """
-    process_order = list(PROCESS_DEFINITIONS.keys())
-
     try:
-        target_index = process_order.index(target_process_name)
+        target_index = PROCESS_ORDER.index(target_process_name)
     except ValueError:
         return []
 
     # Get all processes that come BEFORE the target
-    prior_processes = process_order[:target_index]
+    prior_processes = PROCESS_ORDER[:target_index]
 
     if not prior_processes:
         return []
 
-    return get_not_ok_checks(pack_id, prior_processes)
+    return cached_get_not_ok_checks(pack_id, prior_processes)
 
 
+QR_LABEL_HEIGHT = 40
+# PNG text chunk holding the data a saved QR encodes (checked before reusing the file)
+QR_PNG_DATA_KEY = "qr-data"
+# Fixed QR mask: pack-ID codes are short, so scoring all eight masks for the
+# lowest penalty (most of qrcode's make() time) buys nothing for scanning
+QR_MASK_PATTERN = 0
 
-def generate_qr_code(battery_pack_id: str, size: int = 300, include_label: bool = True) -> bytes:
-    """Generate QR code for battery pack ID and save to qr_codes folder."""
+
+@st.cache_resource
+def get_qr_label_font():
+    """Load the QR label font once per process (falls back to PIL's default font)."""
     try:
-        # Create QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=10,
-            border=4,
-        )
+        return ImageFont.truetype("arial.ttf", 20)
+    except OSError:
+        return ImageFont.load_default()
+
+
+@st.cache_data(show_spinner=False)
+def render_qr_png(data: str, label: str, size: int, include_label: bool) -> bytes:
+    """Render a QR code (optionally with a text label underneath) to PNG bytes.
+    Cached per (data, label, size, include_label) so reruns skip qrcode/PIL work."""
+    import qrcode
+
+    # Create QR code
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        box_size=10,
+        border=4,
+        mask_pattern=QR_MASK_PATTERN,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    # Render at (nearly) the final resolution: pick the largest whole-pixel module
+    # size that fits instead of drawing at 10px/module and filtering down
+    qr.box_size = max(1, size // (qr.modules_count + 2 * qr.border))
+
+    # Create image
+    img = qr.make_image(fill_color="black", back_color="white")
+
+    # Resize to requested size (NEAREST keeps module edges hard; the remaining
+    # scale factor is close to 1, so this only duplicates a few pixel rows)
+    img = img.resize((size, size), Image.Resampling.NEAREST)
+
+    # Add label if requested
+    if include_label:
+        # Create new image with space for label
+        new_img = Image.new('RGB', (size, size + QR_LABEL_HEIGHT), 'white')
+        new_img.paste(img, (0, 0))
+
+        # Draw label
+        draw = ImageDraw.Draw(new_img)
+        font = get_qr_label_font()
+
+        # Get text bbox and center it
+        bbox = draw.textbbox((0, 0), label, font=font)
+        text_width = bbox[2] - bbox[0]
+        text_x = (size - text_width) // 2
+        text_y = size + 10
+
+        draw.text((text_x, text_y), label, fill='black', font=font)
+        img = new_img
+
+    # Record the encoded data in the PNG so a saved file can be checked before reuse
+    png_info = PngInfo()
+    png_info.add_text(QR_PNG_DATA_KEY, data)
 
+    # Convert to bytes (zlib level 1: QR images are flat black/white, so the
+    # size difference against the default level 6 is small and encoding is faster)
+    img_buffer = io.BytesIO()
+    img.save(img_buffer, format='PNG', compress_level=1, optimize=False, pnginfo=png_info)
+    return img_buffer.getvalue()
+
+
+def generate_qr_code(battery_pack_id: str, size: int = 300, include_label: bool = True) -> bytes:
+    """Generate QR code for battery pack ID and save to qr_codes folder.
+    An existing file that encodes the same URL at the same dimensions is reused
+    instead of being re-rendered."""
+    try:
         # Generate URL from environment variable (HTTPS with domain for camera support)
         base_url = os.getenv('APP_BASE_URL', 'https://mes.pravaig.com')
         data = f"{base_url}/entry/{battery_pack_id}"
-        qr.add_data(data)
-        qr.make(fit=True)
-
-        # Create image
-        img = qr.make_image(fill_color="black", back_color="white")
-
-        # Resize to requested size
-        img = img.resize((size, size), Image.Resampling.LANCZOS)
-
-        # Add label if requested
-        if include_label:
-            from PIL import ImageDraw, ImageFont
-            # Create new image with space for label
-            label_height = 40
-            new_img = Image.new('RGB', (size, size + label_height), 'white')
-            new_img.paste(img, (0, 0))
-
-            # Draw label
-            draw = ImageDraw.Draw(new_img)
-            text = battery_pack_id
-            # Use default font
-            try:
-                font = ImageFont.truetype("arial.ttf", 20)
-            except:
-                font = ImageFont.load_default()
 
-            # Get text bbox and center it
-            bbox = draw.textbbox((0, 0), text, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_x = (size - text_width) // 2
-            text_y = size + 10
+        QR_CODES_DIR.mkdir(exist_ok=True)
+        qr_path = QR_CODES_DIR / f"{battery_pack_id}.png"
 
-            draw.text((text_x, text_y), text, fill='black', font=font)
-            img = new_img
+        # Reuse the saved file when it encodes the same URL (APP_BASE_URL can change)
+        # and matches the requested size/label variant. Image.open only reads the
+        # PNG header and the text chunks before the image data here.
+        if qr_path.exists():
+            expected_size = (size, size + QR_LABEL_HEIGHT if include_label else size)
+            with Image.open(qr_path) as existing_img:
+                existing_size = existing_img.size
+                existing_data = existing_img.info.get(QR_PNG_DATA_KEY)
+            if existing_size == expected_size and existing_data == data:
+                logger.info(f"QR code already exists at {qr_path}, reusing it")
+                return qr_path.read_bytes()
+
+        png_bytes = render_qr_png(data, battery_pack_id, size, include_label)
 
         # Save to qr_codes folder
-        qr_dir = Path("qr_codes")
-        qr_dir.mkdir(exist_ok=True)
-        qr_path = qr_dir / f"{battery_pack_id}.png"
-        img.save(qr_path)
+        qr_path.write_bytes(png_bytes)
+        cached_qr_code_ids().add(battery_pack_id)
+        cached_list_qr_files.clear()
         logger.info(f"QR code saved to {qr_path}")
 
-        # Convert to bytes for display
-        img_buffer = io.BytesIO()
-        img.save(img_buffer, format='PNG')
-        img_buffer.seek(0)
-        return img_buffer.getvalue()
+        return png_bytes
 
     except Exception as e:
         logger.error(f"QR generation error: {e}")
@@ -431,22 +445,48 @@ def get_battery_report_path(battery_pack_id: str) -> Optional[Path]:
     if not excel_dir.exists():
         excel_dir.mkdir(parents=True, exist_ok=True)
 
-    # Look for existing file
+    # Reports are written as <pack_id>.xlsx, so a single stat usually answers;
+    # only fall back to the directory walk for legacy suffixed file names
+    report_path = excel_dir / f"{battery_pack_id}.xlsx"
+    if report_path.exists():
+        return report_path
+
     pattern = f"{battery_pack_id}*.xlsx"
     existing_files = list(excel_dir.glob(pattern))
 
     if existing_files:
         return existing_files[0]
 
-    return excel_dir / f"{battery_pack_id}.xlsx"
+    return report_path
+
+DUPLICATE_SUBMIT_WINDOW_SECONDS = 10
+
+
+@st.cache_resource
+def get_recent_submissions() -> dict:
+    """Last saved payload fingerprint + time per (pack, process), shared across sessions."""
+    return {}
+
 
 def add_detailed_entry(battery_pack_id: str, process_name: str, technician_name: str,
                       qc_name: str, remarks: str, checks: List[Dict]) -> Path:
     """
     Add detailed entry - NOW saves to database then generates Excel
     Excel format remains EXACTLY the same
+    An identical resubmission within DUPLICATE_SUBMIT_WINDOW_SECONDS (double-click,
+    rerun) is skipped: the data is already saved and the export already queued.
     """
     try:
+        # 0. Skip identical repeat submissions
+        submission_key = (battery_pack_id, process_name)
+        fingerprint = hash(repr((technician_name, qc_name, remarks, checks)))
+        recent_submissions = get_recent_submissions()
+        previous = recent_submissions.get(submission_key)
+        now = time.monotonic()
+        if previous and previous[0] == fingerprint and now - previous[1] < DUPLICATE_SUBMIT_WINDOW_SECONDS:
+            logger.info(f"Duplicate submission for {battery_pack_id} - Process: {process_name}, skipped")
+            return Path("sample.xlsx")
+
         # 1. Save to database (handles concurrent writes safely)
         success = save_qc_checks(
             pack_id=battery_pack_id,
@@ -459,20 +499,13 @@ def add_detailed_entry(battery_pack_id: str, process_name: str, technician_name:
 
         if not success:
             raise ValueError("Failed to save data to database")
+        recent_submissions[submission_key] = (fingerprint, now)
 
         # 2. Clear cached DB reads so next rerun shows fresh data immediately
         clear_data_caches()
 
-        # 3. Generate Excel file for this battery pack
-        update_excel_after_entry(battery_pack_id)
-
-        # 3. Automatic backup after data entry
-        try:
-            backup_file = create_backup()
-            if backup_file:
-                logger.info(f"Automatic backup created after data entry for {battery_pack_id}")
-        except Exception as backup_error:
-            logger.warning(f"Auto-backup after data entry failed: {backup_error}")
+        # 3. Queue Excel regeneration + automatic backup (runs in the background worker)
+        get_export_queue().put(battery_pack_id)
 
         logger.info(f"Saved data for {battery_pack_id} - Process: {process_name}")
         return Path("sample.xlsx")
@@ -490,410 +523,305 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Professional CSS - Modern Enterprise Design
-st.markdown("""
-<style>
-    /* Root Variables - Professional Color Palette */
-    :root {
-        --primary-color: #1565C0;
-        --primary-dark: #0D47A1;
-        --primary-light: #1976D2;
-        --success-color: #2E7D32;
-        --success-light: #66BB6A;
-        --error-color: #C62828;
-        --error-light: #EF5350;
-        --warning-color: #F57C00;
-        --info-color: #0288D1;
-        --gray-50: #FAFAFA;
-        --gray-100: #F5F5F5;
-        --gray-200: #EEEEEE;
-        --gray-300: #E0E0E0;
-        --gray-400: #BDBDBD;
-        --gray-500: #9E9E9E;
-        --gray-700: #616161;
-        --gray-800: #424242;
-        --gray-900: #212121;
-    }
-
-    /* Global Styles */
-    .main > div {
-        padding: 1.5rem 2rem;
-        max-width: 1400px;
-        margin: 0 auto;
-    }
+# Professional CSS - Modern Enterprise Design (static/app.css)
+@st.cache_resource
+def load_app_css() -> str:
+    """Read the stylesheet once per server process instead of rebuilding it each rerun."""
+    return Path("static/app.css").read_text(encoding="utf-8")
 
-    /* Typography */
-    h1 {
-        color: var(--gray-900);
-        font-size: 2rem;
-        font-weight: 600;
-        margin-bottom: 0.5rem;
-        letter-spacing: -0.02em;
-    }
 
-    h2 {
-        color: var(--gray-800);
-        font-size: 1.5rem;
-        font-weight: 600;
-        margin-top: 2rem;
-        margin-bottom: 1rem;
-    }
+st.markdown(f"<style>{load_app_css()}</style>", unsafe_allow_html=True)
 
-    h3 {
-        color: var(--gray-800);
-        font-size: 1.25rem;
-        font-weight: 500;
-        margin-top: 1.5rem;
-        margin-bottom: 0.75rem;
-    }
 
-    /* Buttons - Material Design Style */
-    .stButton > button {
-        width: 100%;
-        padding: 0.75rem 1.5rem;
-        font-size: 0.95rem;
-        font-weight: 500;
-        border-radius: 4px;
-        border: none;
-        transition: all 0.2s ease;
-        letter-spacing: 0.02em;
-        text-transform: uppercase;
-    }
+# ============================================================================
+# QR CODE DETECTION
+# ============================================================================
 
-    .stButton > button:hover {
-        transform: translateY(-1px);
-        box-shadow: 0 4px 12px rgba(0, 0, 0, 0.15);
-    }
+# Longest side (px) fed to the QR detector; larger phone photos are downscaled first
+QR_DECODE_MAX_SIDE = 1024
+# Photo decodes running at once across all sessions (each one is CPU-heavy OpenCV work)
+QR_DECODE_WORKERS = 2
 
-    /* Input Fields */
-    .stTextInput > div > div > input,
-    .stSelectbox > div > div > select,
-    .stTextArea > div > div > textarea {
-        font-size: 1rem;
-        padding: 0.75rem;
-        border: 1px solid var(--gray-300);
-        border-radius: 4px;
-        transition: border-color 0.2s ease;
-    }
 
-    .stTextInput > div > div > input:focus,
-    .stSelectbox > div > div > select:focus,
-    .stTextArea > div > div > textarea:focus {
-        border-color: var(--primary-color);
-        box-shadow: 0 0 0 2px rgba(21, 101, 192, 0.1);
-    }
+def decode_qr_from_image(image):
+    """Decode QR code from uploaded image using OpenCV.
+    QR detection only needs luminance, so the image is converted to 8-bit
+    grayscale and large photos are downscaled before detection."""
+    try:
+        import cv2
 
-    /* Labels */
-    .stTextInput > label,
-    .stSelectbox > label,
-    .stTextArea > label {
-        font-size: 0.875rem;
-        font-weight: 500;
-        color: var(--gray-700);
-        margin-bottom: 0.5rem;
-    }
+        # Convert PIL Image straight to a single-channel grayscale array
+        full_gray = np.asarray(image.convert("L"), dtype=np.uint8)
 
-    /* Tabs - Professional Navigation */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 0;
-        background-color: var(--gray-100);
-        border-bottom: 2px solid var(--gray-300);
-        padding: 0;
-    }
+        gray = full_gray
+        longest_side = max(full_gray.shape)
+        if longest_side > QR_DECODE_MAX_SIDE:
+            scale = QR_DECODE_MAX_SIDE / longest_side
+            gray = cv2.resize(full_gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
 
-    .stTabs [data-baseweb="tab"] {
-        height: 56px;
-        padding: 0 24px;
-        background-color: transparent;
-        border-radius: 0;
-        font-size: 0.875rem;
-        font-weight: 500;
-        color: var(--gray-700);
-        text-transform: uppercase;
-        letter-spacing: 0.05em;
-        border-bottom: 3px solid transparent;
-    }
+        # Initialize QR code detector (construction is trivial; instances are not shared across sessions)
+        detector = cv2.QRCodeDetector()
 
-    .stTabs [aria-selected="true"] {
-        background-color: white;
-        color: var(--primary-color);
-        border-bottom: 3px solid var(--primary-color);
-    }
+        # Detect and decode QR code
+        data, bbox, straight_qrcode = detector.detectAndDecode(gray)
 
-    /* Cards */
-    .card {
-        background: white;
-        border: 1px solid var(--gray-200);
-        border-radius: 8px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-        box-shadow: 0 1px 3px rgba(0, 0, 0, 0.06);
-    }
+        # Small QR codes in large photos can be lost by downscaling - retry at full resolution
+        if not data and gray is not full_gray:
+            data, bbox, straight_qrcode = detector.detectAndDecode(full_gray)
 
-    .card-header {
-        font-size: 1.125rem;
-        font-weight: 600;
-        color: var(--gray-800);
-        margin-bottom: 1rem;
-        padding-bottom: 0.75rem;
-        border-bottom: 1px solid var(--gray-200);
-    }
+        if data:
+            logger.info(f"QR code detected: {data}")
+            return data
+        else:
+            logger.warning("No QR code found in image")
+            return None
 
-    /* Status Badges */
-    .badge {
-        display: inline-block;
-        padding: 0.35rem 0.75rem;
-        border-radius: 12px;
-        font-size: 0.75rem;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.05em;
-    }
+    except Exception as e:
+        logger.error(f"QR decode error: {e}", exc_info=True)
+        return None
 
-    .badge-success {
-        background-color: #E8F5E9;
-        color: var(--success-color);
-    }
 
-    .badge-info {
-        background-color: #E3F2FD;
-        color: var(--info-color);
-    }
+def decode_qr_from_upload(file_bytes: bytes):
+    """Decode the QR code in an uploaded photo.
+    JPEGs are decoded by libjpeg at a reduced scale (Image.draft) close to
+    QR_DECODE_MAX_SIDE instead of materialising every pixel of a phone photo."""
+    with Image.open(io.BytesIO(file_bytes)) as image:
+        full_size = image.size
+        image.draft("L", (QR_DECODE_MAX_SIDE, QR_DECODE_MAX_SIDE))
+        data = decode_qr_from_image(image)
+        if data or image.size == full_size:
+            return data
 
-    .badge-warning {
-        background-color: #FFF3E0;
-        color: var(--warning-color);
-    }
+    # Reduced-scale decode found nothing: retry on the full-resolution photo
+    with Image.open(io.BytesIO(file_bytes)) as image:
+        return decode_qr_from_image(image)
 
-    .badge-error {
-        background-color: #FFEBEE;
-        color: var(--error-color);
-    }
 
-    /* Alert Boxes */
-    .alert {
-        padding: 1rem 1.25rem;
-        border-radius: 4px;
-        margin: 1rem 0;
-        border-left: 4px solid;
-    }
+@st.cache_resource
+def get_qr_decode_pool() -> ThreadPoolExecutor:
+    """Process-wide pool that runs photo decodes, bounded by QR_DECODE_WORKERS."""
+    return ThreadPoolExecutor(max_workers=QR_DECODE_WORKERS, thread_name_prefix="qr-decode")
 
-    .alert-success {
-        background-color: #E8F5E9;
-        border-left-color: var(--success-color);
-        color: var(--success-color);
-    }
 
-    .alert-info {
-        background-color: #E3F2FD;
-        border-left-color: var(--info-color);
-        color: #01579B;
-    }
+@st.cache_data(show_spinner=False, max_entries=16)
+def cached_decode_qr_from_upload(file_bytes: bytes):
+    """Decode an uploaded QR photo once per distinct file, so reruns while the
+    upload panel stays open don't repeat the OpenCV detection. The work runs on
+    the shared decode pool, so simultaneous uploads queue instead of all
+    competing for the CPU with every session's reruns."""
+    return get_qr_decode_pool().submit(decode_qr_from_upload, file_bytes).result()
 
-    .alert-warning {
-        background-color: #FFF3E0;
-        border-left-color: var(--warning-color);
-        color: #E65100;
-    }
 
-    .alert-error {
-        background-color: #FFEBEE;
-        border-left-color: var(--error-color);
-        color: var(--error-color);
-    }
+# Battery ID = text after the last '/entry/' up to any query string or fragment
+BATTERY_ID_URL_RE = re.compile(r".*/entry/([^?#]*)", re.DOTALL)
 
-    /* Scanner Method Cards */
-    .method-card {
-        background: white;
-        border: 2px solid var(--gray-200);
-        border-radius: 8px;
-        padding: 1.5rem;
-        text-align: center;
-        cursor: pointer;
-        transition: all 0.2s ease;
-        height: 100%;
-    }
 
-    .method-card:hover {
-        border-color: var(--primary-color);
-        box-shadow: 0 4px 12px rgba(21, 101, 192, 0.15);
-    }
+def extract_battery_id_from_url(url):
+    """Extract battery pack ID from QR code URL."""
+    try:
+        match = BATTERY_ID_URL_RE.match(url)
+        if match:
+            return match.group(1).strip()
+        return url
+    except:
+        return url
 
-    .method-card.primary {
-        border-color: var(--primary-color);
-        background: linear-gradient(135deg, #E3F2FD 0%, #BBDEFB 100%);
-    }
 
-    .method-card.secondary {
-        border-color: var(--success-color);
-        background: linear-gradient(135deg, #E8F5E9 0%, #C8E6C9 100%);
-    }
+def check_camera_support():
+    """Check if camera scanning is supported in current environment."""
+    # Camera works on localhost and HTTPS
+    # For HTTP deployments, recommend photo upload
+    try:
+        # This is a placeholder - actual detection would require JavaScript
+        # For now, we'll show both options and let user choose
+        return True
+    except:
+        return False
 
-    .method-title {
-        font-size: 1.125rem;
-        font-weight: 600;
-        color: var(--gray-900);
-        margin-bottom: 0.5rem;
-    }
 
-    .method-description {
-        font-size: 0.875rem;
-        color: var(--gray-600);
-        line-height: 1.5;
-    }
+# ============================================================================
+# DATA ENTRY TAB
+# ============================================================================
 
-    /* Metrics Cards */
-    .metric-card {
-        background: white;
-        border: 1px solid var(--gray-200);
-        border-radius: 8px;
-        padding: 1.5rem;
-        text-align: center;
-    }
+# Module X/Y result choices for every QC check, and value -> radio index
+QC_RESULT_OPTIONS = ("", "OK", "NOT OK", "N/A")
+QC_RESULT_INDEX = {value: idx for idx, value in enumerate(QC_RESULT_OPTIONS)}
 
-    .metric-value {
-        font-size: 2rem;
-        font-weight: 700;
-        color: var(--primary-color);
-        line-height: 1;
-        margin: 0.5rem 0;
-    }
+# Check name -> widget-key fragment: spaces and slashes become "_", parentheses are dropped
+CHECK_KEY_TRANSLATION = str.maketrans({' ': '_', '/': '_', '(': None, ')': None})
 
-    .metric-label {
-        font-size: 0.875rem;
-        font-weight: 500;
-        color: var(--gray-600);
-        text-transform: uppercase;
-        letter-spacing: 0.05em;
-    }
 
-    /* File Upload */
-    .uploadedFile {
-        font-size: 0.875rem;
-    }
+@st.cache_resource
+def get_check_widget_keys(process_name: str) -> tuple:
+    """Sanitised widget-key fragment for each QC check of a process (built once per process)."""
+    return tuple(check_name.translate(CHECK_KEY_TRANSLATION)
+                 for check_name in PROCESS_CHECKS.get(process_name, ()))
 
-    [data-testid="stFileUploader"] {
-        border: 2px dashed var(--gray-300);
-        border-radius: 8px;
-        padding: 2rem;
-        background: var(--gray-50);
-        transition: border-color 0.2s ease;
-    }
 
-    [data-testid="stFileUploader"]:hover {
-        border-color: var(--primary-color);
-        background: white;
-    }
+# Per-check text fields validated before saving: (field, max length, label)
+QC_FIELD_LIMITS = (
+    ('technician_name', 100, 'Technician name'),
+    ('qc_name', 100, 'QC inspector name'),
+    ('remarks', 500, 'Remarks'),
+)
 
-    /* QR Scanner Container */
-    .scanner-container {
-        background: white;
-        border: 1px solid var(--gray-200);
-        border-radius: 8px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-    }
 
-    /* Dividers */
-    hr {
-        border: none;
-        border-top: 1px solid var(--gray-200);
-        margin: 2rem 0;
-    }
+def find_qc_entry_error(checks_list: List[Dict]) -> Optional[str]:
+    """First validation error for the QC rows about to be saved, or None."""
+    if not checks_list:
+        return "Please complete at least one QC check"
+
+    missing_technicians = []
+    for check in checks_list:
+        for field, max_len, label in QC_FIELD_LIMITS:
+            if len(check[field]) > max_len:
+                return f"{label} too long for check '{check['check_name']}' (max {max_len} characters)"
+        if not check['technician_name']:
+            missing_technicians.append(check['check_name'])
+
+    if missing_technicians:
+        return ("Technician name is required for each QC check with data entered:\n"
+                + "\n".join(f"- {name}" for name in missing_technicians))
+    return None
+
+
+# Static scan-method cards shown above the three scanner buttons
+METHOD_CARD_BARCODE = """
+<div class="method-card primary">
+    <div class="method-title">🔍 Barcode Scanner</div>
+    <div class="method-description">
+        USB/Wireless Scanner<br/>
+        <strong>Recommended for Desktop</strong>
+    </div>
+</div>
+"""
+METHOD_CARD_UPLOAD = """
+<div class="method-card secondary">
+    <div class="method-title">📸 Photo Upload</div>
+    <div class="method-description">
+        Upload QR image<br/>
+        Works on all devices
+    </div>
+</div>
+"""
+METHOD_CARD_CAMERA = """
+<div class="method-card secondary">
+    <div class="method-title">📷 Live Camera</div>
+    <div class="method-description">
+        Direct scanning<br/>
+        Requires HTTPS
+    </div>
+</div>
+"""
 
-    /* Mobile Responsive */
-    @media (max-width: 768px) {
-        .main > div {
-            padding: 1rem;
+# Focuses the scanner field once when the barcode scanner opens. Runs in a
+# components iframe (st.markdown never executes <script>) and reaches into the
+# parent page, which is same-origin.
+SCANNER_AUTOFOCUS_HTML = """
+<script>
+    setTimeout(function() {
+        const inputs = window.parent.document.querySelectorAll('input[placeholder*="Click here and scan"]');
+        if (inputs.length > 0) {
+            inputs[0].focus();
+            inputs[0].select();
         }
+    }, 100);
+</script>
+"""
 
-        h1 {
-            font-size: 1.5rem;
-        }
 
-        .method-card {
-            padding: 1rem;
+# Live camera scanner (html5-qrcode 2.3.8, fetched from unpkg each time the panel opens)
+CAMERA_SCANNER_HTML = """
+<div class="scanner-container">
+    <div id="reader" style="width:100%; max-width: 500px; margin: 0 auto;"></div>
+    <div id="result" style="margin-top: 1rem; font-size: 1.1rem; font-weight: 600; text-align: center; color: #2E7D32;"></div>
+</div>
+
+<script src="https://unpkg.com/html5-qrcode@2.3.8/html5-qrcode.min.js"></script>
+<script>
+    function onScanSuccess(decodedText, decodedResult) {
+        let batteryId = decodedText;
+        if (decodedText.includes('/entry/')) {
+            batteryId = decodedText.split('/entry/')[1].split('?')[0].split('#')[0];
         }
 
-        .metric-value {
-            font-size: 1.5rem;
+        document.getElementById('result').innerHTML = 'Detected: ' + batteryId;
+
+        // Stop scanner
+        html5QrcodeScanner.clear().catch(err => console.error(err));
+
+        // Fill the hidden input field
+        const inputElements = window.parent.document.querySelectorAll('input[aria-label="Scanned ID"]');
+        if (inputElements.length > 0) {
+            const nativeInputValueSetter = Object.getOwnPropertyDescriptor(window.HTMLInputElement.prototype, "value").set;
+            nativeInputValueSetter.call(inputElements[0], batteryId);
+            const event = new Event('input', { bubbles: true });
+            inputElements[0].dispatchEvent(event);
         }
     }
 
-    /* Hide Streamlit Branding */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    header {visibility: hidden;}
-</style>
-""", unsafe_allow_html=True)
+    function onScanFailure(error) {
+        // Silent
+    }
 
+    let html5QrcodeScanner = new Html5QrcodeScanner(
+        "reader",
+        {
+            fps: 10,
+            qrbox: { width: 250, height: 250 },
+            aspectRatio: 1.0
+        },
+        false
+    );
+
+    html5QrcodeScanner.render(onScanSuccess, onScanFailure);
+</script>
+"""
 
-# ============================================================================
-# QR CODE DETECTION
-# ============================================================================
+# Session-state flags of the three scan-method panels; at most one is open
+SCANNER_STATE_KEYS = ('barcode_scanner_open', 'photo_upload_open', 'camera_scanner_open')
 
-def decode_qr_from_image(image):
-    """Decode QR code from uploaded image using OpenCV."""
-    try:
-        import cv2
-        import numpy as np
 
-        # Convert PIL Image to numpy array
-        img_array = np.array(image)
+def any_scanner_open() -> bool:
+    """True while any scan-method panel is showing."""
+    return any(st.session_state.get(key, False) for key in SCANNER_STATE_KEYS)
 
-        # Convert RGB to BGR (OpenCV uses BGR)
-        if len(img_array.shape) == 3 and img_array.shape[2] == 3:
-            img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-        elif len(img_array.shape) == 3 and img_array.shape[2] == 4:
-            img_array = cv2.cvtColor(img_array, cv2.COLOR_RGBA2BGR)
 
-        # Initialize QR code detector
-        detector = cv2.QRCodeDetector()
+def close_all_scanners():
+    """Close every scan-method panel."""
+    for key in SCANNER_STATE_KEYS:
+        st.session_state[key] = False
 
-        # Detect and decode QR code
-        data, bbox, straight_qrcode = detector.detectAndDecode(img_array)
 
-        if data:
-            logger.info(f"QR code detected: {data}")
-            return data
-        else:
-            logger.warning("No QR code found in image")
-            return None
+def open_scanner(scanner_key: str):
+    """Show one scan-method panel and close the others."""
+    close_all_scanners()
+    st.session_state[scanner_key] = True
 
-    except Exception as e:
-        logger.error(f"QR decode error: {e}", exc_info=True)
-        return None
 
+def on_barcode_scan_submit():
+    """Barcode form submit callback: apply the scanned pack ID before the rerun."""
+    # HID scanners type the whole code and end it with Enter (sometimes with a
+    # stray CR/LF or Tab). Keystrokes inside st.form never rerun the script, so
+    # one scan = one submit; strip the terminators before parsing the value.
+    scanner_input = st.session_state.get('scanner_input_field', '').strip()
+    if not scanner_input:
+        return
 
-def extract_battery_id_from_url(url):
-    """Extract battery pack ID from QR code URL."""
-    try:
-        if '/entry/' in url:
-            battery_id = url.split('/entry/')[-1]
-            battery_id = battery_id.split('?')[0]
-            battery_id = battery_id.split('#')[0]
-            return battery_id.strip()
-        return url
-    except:
-        return url
+    # Extract battery ID from scanned data
+    battery_id = extract_battery_id_from_url(scanner_input) if scanner_input.startswith('http') else scanner_input
 
+    if battery_id:
+        st.session_state['scanned_battery_id'] = battery_id
+        st.session_state['barcode_scanner_open'] = False
+    else:
+        st.session_state['barcode_scan_invalid'] = True
 
-def check_camera_support():
-    """Check if camera scanning is supported in current environment."""
-    # Camera works on localhost and HTTPS
-    # For HTTP deployments, recommend photo upload
-    try:
-        import streamlit as st
-        # This is a placeholder - actual detection would require JavaScript
-        # For now, we'll show both options and let user choose
-        return True
-    except:
-        return False
 
+def close_barcode_scanner():
+    """Barcode form cancel callback."""
+    st.session_state['barcode_scanner_open'] = False
 
-# ============================================================================
-# DATA ENTRY TAB
-# ============================================================================
 
 def render_data_entry_tab():
     """Render Data Entry tab with professional QR scanning interface."""
@@ -910,57 +838,27 @@ def render_data_entry_tab():
     st.markdown("### Battery Pack Identification")
 
     # Only show method selection if no scanner is currently open
-    if not st.session_state.get('photo_upload_open', False) and not st.session_state.get('camera_scanner_open', False) and not st.session_state.get('barcode_scanner_open', False):
+    if not any_scanner_open():
         # Three scanning methods - Barcode Scanner prioritized
         col1, col2, col3 = st.columns(3)
 
         with col1:
-            st.markdown("""
-            <div class="method-card primary">
-                <div class="method-title">🔍 Barcode Scanner</div>
-                <div class="method-description">
-                    USB/Wireless Scanner<br/>
-                    <strong>Recommended for Desktop</strong>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(METHOD_CARD_BARCODE, unsafe_allow_html=True)
 
             if st.button("Use Barcode Scanner", key="open_barcode", use_container_width=True, type="primary"):
-                st.session_state['barcode_scanner_open'] = True
-                st.session_state['photo_upload_open'] = False
-                st.session_state['camera_scanner_open'] = False
+                open_scanner('barcode_scanner_open')
 
         with col2:
-            st.markdown("""
-            <div class="method-card secondary">
-                <div class="method-title">📸 Photo Upload</div>
-                <div class="method-description">
-                    Upload QR image<br/>
-                    Works on all devices
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(METHOD_CARD_UPLOAD, unsafe_allow_html=True)
 
             if st.button("Upload QR Code Photo", key="open_upload", use_container_width=True, type="secondary"):
-                st.session_state['photo_upload_open'] = True
-                st.session_state['camera_scanner_open'] = False
-                st.session_state['barcode_scanner_open'] = False
+                open_scanner('photo_upload_open')
 
         with col3:
-            st.markdown("""
-            <div class="method-card secondary">
-                <div class="method-title">📷 Live Camera</div>
-                <div class="method-description">
-                    Direct scanning<br/>
-                    Requires HTTPS
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(METHOD_CARD_CAMERA, unsafe_allow_html=True)
 
             if st.button("Open Camera Scanner", key="open_camera", use_container_width=True, type="secondary"):
-                st.session_state['camera_scanner_open'] = True
-                st.session_state['photo_upload_open'] = False
-                st.session_state['barcode_scanner_open'] = False
+                open_scanner('camera_scanner_open')
 
     # Barcode Scanner Input (Priority Method)
     if st.session_state.get('barcode_scanner_open', False):
@@ -976,46 +874,32 @@ def render_data_entry_tab():
 
         # Simple form with submit button
         with st.form(key="barcode_scanner_form", clear_on_submit=True):
-            scanner_input = st.text_input(
+            st.text_input(
                 "Scan QR Code",
                 key="scanner_input_field",
                 placeholder="Click here and scan...",
                 help="Click in this field and scan the QR code with your barcode scanner"
             )
 
+            # Handled in callbacks (run before the script), so a scan or cancel
+            # renders the next screen in a single rerun instead of two
             col1, col2 = st.columns([1, 1])
             with col1:
-                submitted = st.form_submit_button("Submit Scan", use_container_width=True, type="primary")
+                st.form_submit_button("Submit Scan", use_container_width=True, type="primary",
+                                      on_click=on_barcode_scan_submit)
             with col2:
-                cancel = st.form_submit_button("Cancel", use_container_width=True)
+                st.form_submit_button("Cancel", use_container_width=True, on_click=close_barcode_scanner)
 
-            if cancel:
-                st.session_state['barcode_scanner_open'] = False
-                st.rerun()
+            if st.session_state.pop('barcode_scan_invalid', False):
+                st.error("Invalid QR code data. Please scan again.")
 
-            if submitted and scanner_input:
-                # Extract battery ID from scanned data
-                battery_id = extract_battery_id_from_url(scanner_input) if scanner_input.startswith('http') else scanner_input.strip()
-
-                if battery_id:
-                    st.session_state['scanned_battery_id'] = battery_id
-                    st.session_state['barcode_scanner_open'] = False
-                    st.rerun()
-                else:
-                    st.error("Invalid QR code data. Please scan again.")
-
-        # Auto-focus JavaScript (simpler version)
-        st.markdown("""
-        <script>
-            setTimeout(function() {
-                const inputs = window.parent.document.querySelectorAll('input[placeholder*="Click here and scan"]');
-                if (inputs.length > 0) {
-                    inputs[0].focus();
-                    inputs[0].select();
-                }
-            }, 100);
-        </script>
-        """, unsafe_allow_html=True)
+        # Auto-focus only on the run that opens the scanner; later reruns skip the
+        # iframe so the listener/timer is not torn down and restarted mid-typing
+        if not st.session_state.get('_scanner_js_injected'):
+            st.components.v1.html(SCANNER_AUTOFOCUS_HTML, height=0)
+            st.session_state['_scanner_js_injected'] = True
+    else:
+        st.session_state.pop('_scanner_js_injected', None)
 
     # Photo Upload Scanner
     if st.session_state.get('photo_upload_open', False):
@@ -1038,27 +922,24 @@ def render_data_entry_tab():
 
         if uploaded_file is not None:
             try:
-                image = Image.open(uploaded_file)
+                file_bytes = uploaded_file.getvalue()
 
                 col_img, col_result = st.columns([1, 1])
 
                 with col_img:
-                    st.image(image, caption="Uploaded Image", use_column_width=True)
+                    # Pass the uploaded bytes straight through (no PIL decode/re-encode per rerun)
+                    st.image(file_bytes, caption="Uploaded Image", use_column_width=True)
 
                 with col_result:
                     with st.spinner("Scanning QR code..."):
-                        qr_data = decode_qr_from_image(image)
+                        qr_data = cached_decode_qr_from_upload(file_bytes)
 
                     if qr_data:
                         battery_id = extract_battery_id_from_url(qr_data)
 
-                        st.markdown(f"""
-                        <div class="alert alert-success">
-                            <strong>QR Code Detected</strong><br/>
-                            <span style="font-size: 1.75rem; font-weight: 700; display: block; margin: 0.5rem 0;">{battery_id}</span>
-                            <span style="font-size: 0.875rem; opacity: 0.8;">Proceeding to data entry...</span>
-                        </div>
-                        """, unsafe_allow_html=True)
+                        # Toasts survive st.rerun(), so the confirmation is still shown
+                        # without holding the server thread before proceeding
+                        st.toast(f"QR Code Detected: {battery_id}")
 
                         # Automatically set and proceed
                         st.session_state['scanned_battery_id'] = battery_id
@@ -1105,54 +986,7 @@ def render_data_entry_tab():
             st.session_state['camera_scanner_open'] = False
             st.rerun()
 
-        scanner_html = """
-        <div class="scanner-container">
-            <div id="reader" style="width:100%; max-width: 500px; margin: 0 auto;"></div>
-            <div id="result" style="margin-top: 1rem; font-size: 1.1rem; font-weight: 600; text-align: center; color: #2E7D32;"></div>
-        </div>
-
-        <script src="https://unpkg.com/html5-qrcode@2.3.8/html5-qrcode.min.js"></script>
-        <script>
-            function onScanSuccess(decodedText, decodedResult) {
-                let batteryId = decodedText;
-                if (decodedText.includes('/entry/')) {
-                    batteryId = decodedText.split('/entry/')[1].split('?')[0].split('#')[0];
-                }
-
-                document.getElementById('result').innerHTML = 'Detected: ' + batteryId;
-
-                // Stop scanner
-                html5QrcodeScanner.clear().catch(err => console.error(err));
-
-                // Fill the hidden input field
-                const inputElements = window.parent.document.querySelectorAll('input[aria-label="Scanned ID"]');
-                if (inputElements.length > 0) {
-                    const nativeInputValueSetter = Object.getOwnPropertyDescriptor(window.HTMLInputElement.prototype, "value").set;
-                    nativeInputValueSetter.call(inputElements[0], batteryId);
-                    const event = new Event('input', { bubbles: true });
-                    inputElements[0].dispatchEvent(event);
-                }
-            }
-
-            function onScanFailure(error) {
-                // Silent
-            }
-
-            let html5QrcodeScanner = new Html5QrcodeScanner(
-                "reader",
-                {
-                    fps: 10,
-                    qrbox: { width: 250, height: 250 },
-                    aspectRatio: 1.0
-                },
-                false
-            );
-
-            html5QrcodeScanner.render(onScanSuccess, onScanFailure);
-        </script>
-        """
-
-        st.components.v1.html(scanner_html, height=600)
+        st.components.v1.html(CAMERA_SCANNER_HTML, height=600)
 
         if st.button("Cancel", key="close_camera", use_container_width=True):
             st.session_state['camera_scanner_open'] = False
@@ -1162,7 +996,7 @@ def render_data_entry_tab():
     battery_pack_id = st.session_state.get('scanned_battery_id', '')
 
     # Only show manual entry if no scanning interface is open and no ID is set
-    if not battery_pack_id and not st.session_state.get('photo_upload_open', False) and not st.session_state.get('camera_scanner_open', False) and not st.session_state.get('barcode_scanner_open', False):
+    if not battery_pack_id and not any_scanner_open():
         st.markdown("---")
         with st.expander("Manual Entry"):
             st.caption("Enter Battery Pack ID manually if scanning is unavailable")
@@ -1206,16 +1040,14 @@ def render_data_entry_tab():
 
     if st.button("Scan Different Pack", key="rescan", use_container_width=False):
         st.session_state['scanned_battery_id'] = ''
-        st.session_state['photo_upload_open'] = False
-        st.session_state['camera_scanner_open'] = False
-        st.session_state['barcode_scanner_open'] = False
+        close_all_scanners()
         st.rerun()
 
     st.markdown("---")
 
     # Module Serial Numbers
     st.markdown("### Module Serial Numbers")
-    _pack_info = get_battery_pack_info(battery_pack_id)
+    _pack_info = cached_get_battery_pack_info(battery_pack_id)
     col_sn1, col_sn2 = st.columns(2)
     with col_sn1:
         module_sn1_val = st.text_input(
@@ -1243,12 +1075,15 @@ def render_data_entry_tab():
 
     process_name = st.selectbox(
         "Select Production Process",
-        options=list(PROCESS_DEFINITIONS.keys()),
+        options=PROCESS_ORDER,
         key="process_name"
     )
 
-    # Check if this process already has data
-    process_status = check_process_data_exists(battery_pack_id, process_name)
+    # Check if this process already has data (a pack with no DB row has none)
+    if exists_info['data_exists']:
+        process_status = check_process_data_exists(battery_pack_id, process_name)
+    else:
+        process_status = empty_process_status(process_name)
 
     # === BLOCKING CHECK: Prevent entry if a prior process has NOT OK ===
     blockers = get_blocking_not_ok_processes(battery_pack_id, process_name)
@@ -1326,28 +1161,28 @@ def render_data_entry_tab():
         else:
             st.markdown('<span class="badge badge-success">New Record - Create Mode</span>', unsafe_allow_html=True)
 
+    render_qc_checks_form(battery_pack_id, process_name, process_status['has_any_data'])
+
+
+@st.fragment
+def render_qc_checks_form(battery_pack_id: str, process_name: str, has_any_data: bool):
+    """Render the QC check inputs and Save button as a fragment: radio clicks and
+    text edits rerun only this form, not the scanner/status sections above it."""
+    # After a successful save the pack is cleared from the session; the next
+    # interaction inside the form has to refresh the whole page (back to scanning)
+    if st.session_state.get('scanned_battery_id') != battery_pack_id:
+        st.rerun()
+
     process_def = PROCESS_DEFINITIONS.get(process_name, {})
-    qc_checks = process_def.get("qc_checks", [])
+    qc_checks = PROCESS_CHECKS.get(process_name, ())
 
     # Load existing data if available
     existing_data = {}
 
-    if process_status['has_any_data']:
+    if has_any_data:
         try:
-            checks = cached_get_qc_checks(battery_pack_id, process_name)
-
-            if checks:
-                # Build existing data dict with per-check technician/QC names and remarks
-                for check in checks:
-                    check_name = check.get('check_name', '')
-                    existing_data[check_name] = {
-                        'module_x': check.get('module_x', ''),
-                        'module_y': check.get('module_y', ''),
-                        'technician_name': check.get('technician_name', ''),
-                        'qc_name': check.get('qc_name', ''),
-                        'remarks': check.get('remarks', ''),
-                        'end_date': check.get('end_date', '')
-                    }
+            # Existing data dict with per-check technician/QC names and remarks (cached)
+            existing_data = cached_get_existing_check_data(battery_pack_id, process_name)
         except Exception as e:
             logger.error(f"Error loading existing data: {e}")
 
@@ -1366,10 +1201,18 @@ def render_data_entry_tab():
         st.warning("No QC checks defined for this process")
         return
 
-    checks_data = {}
+    # Rows for save_qc_checks, built in the render loop in the shape it expects
+    checks_list = []
+    # Widget keys created by this form, so a successful save can reset exactly these
+    form_widget_keys = st.session_state.setdefault('qc_form_widget_keys', set())
 
-    for idx, check_name in enumerate(qc_checks):
-        check_key = check_name.replace(' ', '_').replace('/', '_').replace('(', '').replace(')', '')
+    for idx, (check_name, check_key) in enumerate(zip(qc_checks, get_check_widget_keys(process_name))):
+        tech_x_key, tech_y_key = f"tech_x_{idx}_{check_key}", f"tech_y_{idx}_{check_key}"
+        qc_x_key, qc_y_key = f"qc_x_{idx}_{check_key}", f"qc_y_{idx}_{check_key}"
+        result_x_key, result_y_key = f"check_{idx}_{check_key}_x", f"check_{idx}_{check_key}_y"
+        remarks_key = f"remarks_{idx}_{check_key}"
+        form_widget_keys.update((tech_x_key, tech_y_key, qc_x_key, qc_y_key,
+                                 result_x_key, result_y_key, remarks_key))
 
         # Get existing values for this check (needed here for completion indicator)
         existing_check = existing_data.get(check_name, {})
@@ -1411,14 +1254,14 @@ def render_data_entry_tab():
             tech_x = st.text_input(
                 "Module X – Technician",
                 value=tech_x_val,
-                key=f"tech_x_{idx}_{check_key}",
+                key=tech_x_key,
                 placeholder="Module X technician name"
             )
         with col_ty:
             tech_y = st.text_input(
                 "Module Y – Technician (Optional)",
                 value=tech_y_val,
-                key=f"tech_y_{idx}_{check_key}",
+                key=tech_y_key,
                 placeholder="Same as Module X if blank"
             )
 
@@ -1428,39 +1271,38 @@ def render_data_entry_tab():
             qc_x = st.text_input(
                 "Module X – QC Inspector (Optional)",
                 value=qc_x_val,
-                key=f"qc_x_{idx}_{check_key}",
+                key=qc_x_key,
                 placeholder="Module X QC inspector"
             )
         with col_qy:
             qc_y = st.text_input(
                 "Module Y – QC Inspector (Optional)",
                 value=qc_y_val,
-                key=f"qc_y_{idx}_{check_key}",
+                key=qc_y_key,
                 placeholder="Same as Module X if blank"
             )
 
         # Find index of existing value in options
-        options = ["", "OK", "NOT OK", "N/A"]
-        default_x_index = options.index(existing_module_x) if existing_module_x in options else 0
-        default_y_index = options.index(existing_module_y) if existing_module_y in options else 0
+        default_x_index = QC_RESULT_INDEX.get(existing_module_x, 0)
+        default_y_index = QC_RESULT_INDEX.get(existing_module_y, 0)
 
         col_x, col_y = st.columns(2)
 
         with col_x:
             module_x = st.radio(
                 "Module X",
-                options=options,
+                options=QC_RESULT_OPTIONS,
                 index=default_x_index,
-                key=f"check_{idx}_{check_key}_x",
+                key=result_x_key,
                 horizontal=True
             )
 
         with col_y:
             module_y = st.radio(
                 "Module Y",
-                options=options,
+                options=QC_RESULT_OPTIONS,
                 index=default_y_index,
-                key=f"check_{idx}_{check_key}_y",
+                key=result_y_key,
                 horizontal=True
             )
 
@@ -1468,7 +1310,7 @@ def render_data_entry_tab():
         check_remarks = st.text_area(
             "Remarks (Optional)",
             value=existing_remarks_for_check,
-            key=f"remarks_{idx}_{check_key}",
+            key=remarks_key,
             placeholder="Notes for this check",
             height=68
         )
@@ -1483,66 +1325,27 @@ def render_data_entry_tab():
             _qc_y = qc_y.strip() or _qc_x
             combined_qc = f"{_qc_x}, {_qc_y}" if _qc_y != _qc_x else _qc_x
 
-            checks_data[check_name] = {
+            checks_list.append({
+                "check_name": check_name,
                 "module_x": module_x if module_x else "",
                 "module_y": module_y if module_y else "",
                 "technician_name": combined_tech,
                 "qc_name": combined_qc,
                 "remarks": check_remarks.strip()
-            }
+            })
 
     st.markdown("---")
 
     # Submit Button
     if st.button("Save Production Data", type="primary", use_container_width=True, key="save_data"):
-        # Per-check validation for technician names
-        missing_technicians = []
-        for check_name_key, check_values in checks_data.items():
-            tech_name = check_values.get('technician_name', '').strip()
-            if not tech_name:
-                missing_technicians.append(check_name_key)
-            elif len(tech_name) > 100:
-                st.error(f"Technician name too long for check '{check_name_key}' (max 100 characters)")
-                return
-
-        if missing_technicians:
-            st.error("Technician name is required for each QC check with data entered:")
-            for mt in missing_technicians:
-                st.markdown(f"- {mt}")
-            return
-
-        # Per-check validation for QC names (optional but max length)
-        for check_name_key, check_values in checks_data.items():
-            qc_val = check_values.get('qc_name', '').strip()
-            if qc_val and len(qc_val) > 100:
-                st.error(f"QC inspector name too long for check '{check_name_key}' (max 100 characters)")
-                return
-
-        # Per-check remarks length validation
-        for check_name_key, check_values in checks_data.items():
-            r = check_values.get('remarks', '')
-            if r and len(r) > 500:
-                st.error(f"Remarks too long for check '{check_name_key}' (max 500 characters)")
-                return
-
-        if not checks_data:
-            st.error("Please complete at least one QC check")
+        # Required technician names and per-field length limits, in one pass
+        entry_error = find_qc_entry_error(checks_list)
+        if entry_error:
+            st.error(entry_error)
             return
 
         try:
             with st.spinner("Saving data..."):
-                # Convert checks_data to list format with per-check technician/QC names
-                checks_list = []
-                for check_name, check_values in checks_data.items():
-                    checks_list.append({
-                        'check_name': check_name,
-                        'module_x': check_values['module_x'],
-                        'module_y': check_values['module_y'],
-                        'technician_name': check_values.get('technician_name', ''),
-                        'qc_name': check_values.get('qc_name', ''),
-                        'remarks': check_values.get('remarks', '')
-                    })
-
                 output_file = add_detailed_entry(
                     battery_pack_id=battery_pack_id,
                     process_name=process_name,
@@ -1558,14 +1361,11 @@ def render_data_entry_tab():
 
                 # Clear form and edit mode
                 st.session_state['scanned_battery_id'] = ''
-                st.session_state['photo_upload_open'] = False
-                st.session_state['camera_scanner_open'] = False
-                st.session_state['barcode_scanner_open'] = False
+                close_all_scanners()
                 if 'edit_mode' in st.session_state:
                     del st.session_state['edit_mode']
-                for key in list(st.session_state.keys()):
-                    if key.startswith('check_') or key.startswith('tech_') or key.startswith('qc_') or key.startswith('remarks_'):
-                        del st.session_state[key]
+                for key in st.session_state.pop('qc_form_widget_keys', ()):
+                    st.session_state.pop(key, None)
 
                 if st.button("Enter Next Pack", key="scan_next"):
                     st.rerun()
@@ -1626,7 +1426,6 @@ def render_qr_generator_tab():
                         st.session_state['qr_pack_id'] = battery_pack_id
                         st.success(f"QR code generated and saved for {battery_pack_id}")
                         st.info(f"Saved to: qr_codes/{battery_pack_id}.png")
-                        st.rerun()
                     except Exception as e:
                         st.error(f"Generation failed: {str(e)}")
 
@@ -1649,15 +1448,11 @@ def render_qr_generator_tab():
         st.markdown("### Saved QR Codes")
 
         try:
-            from pathlib import Path
-            import os
-
-            qr_dir = Path("qr_codes")
-            if not qr_dir.exists():
+            if not QR_CODES_DIR.exists():
                 st.info("No QR codes generated yet. Use the 'Generate New QR Code' tab to create one.")
             else:
-                # Get all QR code files
-                qr_files = sorted(qr_dir.glob("*.png"), key=os.path.getmtime, reverse=True)
+                # (pack_id, mtime, size) for all QR code files, newest first
+                qr_files = cached_list_qr_files()
 
                 if not qr_files:
                     st.info("No QR codes generated yet. Use the 'Generate New QR Code' tab to create one.")
@@ -1683,80 +1478,72 @@ def render_qr_generator_tab():
 
                     # Filter files based on search
                     if search_term:
-                        filtered_files = [f for f in qr_files if search_term.lower() in f.stem.lower()]
+                        search_folded = search_term.casefold()
+                        filtered_files = [qr for qr in qr_files if search_folded in qr[1]]
                     else:
                         filtered_files = qr_files
 
-                    # Sort files
+                    # Sort files. The cached list is already newest first; pack IDs are
+                    # unique, so plain tuple order is name order (no key function)
                     if sort_order == "Name A-Z":
-                        filtered_files = sorted(filtered_files, key=lambda x: x.stem)
+                        filtered_files = sorted(filtered_files)
                     elif sort_order == "Name Z-A":
-                        filtered_files = sorted(filtered_files, key=lambda x: x.stem, reverse=True)
+                        filtered_files = sorted(filtered_files, reverse=True)
                     elif sort_order == "Oldest First":
-                        filtered_files = sorted(filtered_files, key=os.path.getmtime)
-                    else:  # Newest First
-                        filtered_files = sorted(filtered_files, key=os.path.getmtime, reverse=True)
-
-                    st.caption(f"Showing {len(filtered_files)} of {len(qr_files)} QR codes")
-
-                    st.markdown("---")
+                        filtered_files = filtered_files[::-1]
 
-                    # Display QR codes in list format (same as Reports tab)
-                    for qr_file in filtered_files:
-                        pack_id = qr_file.stem
-                        col1, col2 = st.columns([4, 1])
+                    # Only one page of rows is rendered per rerun
+                    page_count = max(1, -(-len(filtered_files) // QR_GALLERY_PAGE_SIZE))
+                    page = 1
+                    if page_count > 1:
+                        page = st.number_input("Page", min_value=1, max_value=page_count, value=1,
+                                               step=1, key="qr_gallery_page")
+                    page_start = (page - 1) * QR_GALLERY_PAGE_SIZE
+                    page_files = filtered_files[page_start:page_start + QR_GALLERY_PAGE_SIZE]
 
-                        with col1:
-                            st.markdown(f"**{pack_id}**")
-                            file_size = qr_file.stat().st_size / 1024
-                            st.caption(f"Size: {file_size:.1f} KB | File: qr_codes/{pack_id}.png")
+                    st.caption(f"Showing {len(filtered_files)} of {len(qr_files)} QR codes"
+                               + (f" (page {page} of {page_count})" if page_count > 1 else ""))
 
-                        with col2:
-                            # Read file for download
-                            with open(qr_file, 'rb') as f:
-                                qr_data = f.read()
-
-                            st.download_button(
-                                label="Download File",
-                                data=qr_data,
-                                file_name=f"{pack_id}.png",
-                                mime="image/png",
-                                use_container_width=True,
-                                key=f"download_qr_{pack_id}"
-                            )
+                    st.markdown("---")
 
-                        st.markdown('<hr style="margin: 0.5rem 0;">', unsafe_allow_html=True)
+                    # Display QR codes in list format (same as Reports tab); row
+                    # separators come from the container's CSS class (static/app.css)
+                    with st.container(key="qr_gallery_rows"):
+                        for pack_id, _, _, size_bytes in page_files:
+                            qr_file = QR_CODES_DIR / f"{pack_id}.png"
+                            col1, col2 = st.columns([4, 1])
+
+                            with col1:
+                                st.markdown(f"**{pack_id}**")
+                                file_size = size_bytes / 1024
+                                st.caption(f"Size: {file_size:.1f} KB | File: qr_codes/{pack_id}.png")
+
+                            with col2:
+                                # Deferred: the PNG is read only when this button is clicked,
+                                # not for every listed file on every rerun
+                                st.download_button(
+                                    label="Download File",
+                                    data=qr_file.read_bytes,
+                                    file_name=f"{pack_id}.png",
+                                    mime="image/png",
+                                    use_container_width=True,
+                                    key=f"download_qr_{pack_id}"
+                                )
 
                     st.markdown("---")
 
                     # Bulk Actions (same format as Reports tab)
                     st.markdown("### Bulk Actions")
 
-                    if st.button("Download All QR Codes as ZIP", use_container_width=True):
-                        try:
-                            import zipfile
-                            from io import BytesIO
-                            from datetime import datetime
-
-                            # Create ZIP file in memory
-                            zip_buffer = BytesIO()
-                            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                                for qr_file in filtered_files:
-                                    zip_file.write(qr_file, qr_file.name)
-
-                            zip_buffer.seek(0)
-                            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-                            st.download_button(
-                                label=f"Download ZIP File ({len(filtered_files)} files)",
-                                data=zip_buffer.getvalue(),
-                                file_name=f"QR_Codes_{timestamp}.zip",
-                                mime="application/zip",
-                                use_container_width=True,
-                                type="primary"
-                            )
-                        except Exception as e:
-                            st.error(f"Failed to create ZIP: {str(e)}")
+                    # Archive is built when the button is clicked, not on every rerun
+                    st.download_button(
+                        label=f"Download All QR Codes as ZIP ({len(filtered_files)} files)",
+                        data=partial(build_qr_zip, tuple(pack_id for pack_id, *_ in filtered_files)),
+                        file_name=f"QR_Codes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+                        mime="application/zip",
+                        use_container_width=True,
+                        key="download_qr_zip"
+                    )
 
         except Exception as e:
             st.error(f"Error loading QR codes: {str(e)}")
@@ -1767,6 +1554,153 @@ def render_qr_generator_tab():
 # DASHBOARD TAB
 # ============================================================================
 
+# Expected number of checks per stage, in tracker column order
+TRACKER_EXPECTED_CHECKS = pd.Series({stage: len(PROCESS_CHECKS.get(stage, ())) for stage in PROCESS_ORDER})
+
+
+# Cell CSS for each stage/overall status shown in the tracker table
+TRACKER_CELL_STYLES = {
+    "QC OK": 'background-color: #c8e6c9; color: #2e7d32; font-weight: 600;',
+    "QC NOT OK": 'background-color: #ffcdd2; color: #c62828; font-weight: 600;',
+    "Processing": 'background-color: #fff3e0; color: #e65100; font-weight: 500;',
+    "Ready to dispatch": 'background-color: #2e7d32; color: white; font-weight: 700; text-align: center;',
+    "QC Issues": 'background-color: #c62828; color: white; font-weight: 700; text-align: center;',
+    "In Process": 'background-color: #1976d2; color: white; font-weight: 600; text-align: center;',
+    "Not Started": 'background-color: #9e9e9e; color: white; font-weight: 500; text-align: center;',
+    "0": 'background-color: #f5f5f5; color: #9e9e9e;',
+}
+
+
+def tracker_cell_styles(df: pd.DataFrame) -> pd.DataFrame:
+    """Styler.apply(axis=None) function: CSS for every tracker cell at once
+    (one hashed dict lookup per column instead of comparing against each status)."""
+    return df.apply(lambda column: column.map(TRACKER_CELL_STYLES)).fillna('')
+
+
+def build_pack_tracker(pack_ids: List[str], checks_by_pack: Dict[str, List[Dict]]) -> pd.DataFrame:
+    """Battery Pack Tracker table: one row per pack, a status per stage and an overall Status.
+
+    A check counts as filled when either module is NOT OK or both modules have a
+    result. A stage is "0" with nothing filled, "QC NOT OK" if any check is NOT OK,
+    "Processing" until every expected check is filled, then "QC OK".
+    """
+    packs = sorted(pack_ids)
+    checks = pd.DataFrame.from_records(
+        [(check['pack_id'], check['process_name'], check.get('module_x') or '', check.get('module_y') or '')
+         for pack_checks in checks_by_pack.values() for check in pack_checks],
+        columns=['pack_id', 'process_name', 'module_x', 'module_y'])
+
+    # One scan per check over both module results joined together
+    not_ok = (checks['module_x'] + '|' + checks['module_y']).str.contains("NOT OK", regex=False)
+    checks['filled'] = not_ok | ((checks['module_x'] != '') & (checks['module_y'] != ''))
+    checks['not_ok'] = not_ok
+    per_stage = checks.groupby(['pack_id', 'process_name'])[['filled', 'not_ok']].agg({'filled': 'sum', 'not_ok': 'any'})
+
+    filled = (per_stage['filled'].unstack(fill_value=0)
+              .reindex(index=packs, columns=PROCESS_ORDER, fill_value=0))
+    has_not_ok = (per_stage['not_ok'].unstack(fill_value=False)
+                  .reindex(index=packs, columns=PROCESS_ORDER, fill_value=False).astype(bool))
+
+    stages = pd.DataFrame(
+        np.select([filled.eq(0), has_not_ok, filled.lt(TRACKER_EXPECTED_CHECKS, axis=1)],
+                  ["0", "QC NOT OK", "Processing"], default="QC OK"),
+        index=packs, columns=list(PROCESS_ORDER))
+
+    qc_ok_count = stages.eq("QC OK").sum(axis=1)
+    status = np.select(
+        [stages.eq("QC NOT OK").any(axis=1),
+         qc_ok_count >= len(PROCESS_ORDER),
+         (qc_ok_count > 0) | stages.eq("Processing").any(axis=1)],
+        ["QC Issues", "Ready to dispatch", "In Process"], default="Not Started")
+
+    tracker = stages.reset_index(drop=True)
+    tracker.insert(0, "Sl.No", range(1, len(packs) + 1))
+    tracker.insert(1, "Battery Pack", packs)
+    tracker["Status"] = status
+    return tracker
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def cached_plan_bar_chart(target_packs: int, completed_packs: int, in_process_packs: int, rejected_packs: int):
+    """Plan vs Actual bar chart, rebuilt only when the pack counts or target change."""
+    import plotly.graph_objects as go
+
+    # Bar chart data
+    bar_data = pd.DataFrame({
+        'Category': ['Target', 'Completed', 'In Process', 'QC Issues'],
+        'Count': [target_packs, completed_packs, in_process_packs, rejected_packs]
+    })
+
+    # Create plotly bar chart
+    fig_bar = go.Figure(data=[
+        go.Bar(
+            x=bar_data['Category'],
+            y=bar_data['Count'],
+            marker_color=['#1976D2', '#FF9800', '#FFA726', '#EF5350'],
+            text=bar_data['Count'],
+            textposition='outside',
+            textfont=dict(size=14, color='black', family='Arial Black')
+        )
+    ])
+
+    fig_bar.update_layout(
+        height=350,
+        margin=dict(l=20, r=20, t=40, b=40),
+        yaxis=dict(range=[0, max(target_packs, completed_packs, in_process_packs) * 1.2]),
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font=dict(size=12, color='#424242')
+    )
+    return fig_bar
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def cached_plan_pie_chart(target_packs: int, completed_packs: int, in_process_packs: int, rejected_packs: int):
+    """Production Plan % pie chart, rebuilt only when the pack counts or target change."""
+    import plotly.graph_objects as go
+
+    # Calculate percentages
+    if target_packs > 0:
+        completed_pct = (completed_packs / target_packs) * 100
+        in_process_pct = (in_process_packs / target_packs) * 100
+        rejected_pct = (rejected_packs / target_packs) * 100
+        target_pct = 100
+    else:
+        completed_pct = in_process_pct = rejected_pct = target_pct = 0
+
+    # Pie chart data
+    pie_data = pd.DataFrame({
+        'Status': ['Target', 'Completed', 'In Process', 'QC Issues'],
+        'Percentage': [target_pct, completed_pct, in_process_pct, rejected_pct]
+    })
+
+    # Create plotly pie chart
+    fig_pie = go.Figure(data=[go.Pie(
+        labels=pie_data['Status'],
+        values=pie_data['Percentage'],
+        marker=dict(colors=['#1976D2', '#FF9800', '#4CAF50', '#EF5350']),
+        textinfo='label+percent',
+        textfont=dict(size=12, color='white', family='Arial'),
+        hole=0
+    )])
+
+    fig_pie.update_layout(
+        height=350,
+        margin=dict(l=20, r=20, t=20, b=20),
+        showlegend=True,
+        legend=dict(
+            orientation="v",
+            yanchor="middle",
+            y=0.5,
+            xanchor="left",
+            x=1.05
+        ),
+        plot_bgcolor='white',
+        paper_bgcolor='white'
+    )
+    return fig_pie
+
+
 def render_dashboard_tab():
     """Render production dashboard with Pack Tracker and Production Charts."""
     st.markdown("## Production Dashboard")
@@ -1805,13 +1739,6 @@ def render_dashboard_tab():
         # ZMC Pack Tracker Table
         st.markdown("### Battery Pack Tracker")
 
-        tracker_data = []
-        process_stages = [
-            "Cell Sorting", "Module Assembly", "Encapsulation & Soldering - Phase 1",
-            "Wire Bonding", "Encapsulation Phase II (100%)", "Module QC Checks",
-            "EOL Testing", "Pack Assembly", "Ready for Dispatch"
-        ]
-
         # Get all battery packs from database (cached)
         all_packs = cached_get_all_battery_packs()
 
@@ -1819,95 +1746,13 @@ def render_dashboard_tab():
             st.info("No production data available. Begin tracking battery packs to see metrics here.")
             return
 
-        for idx, pack_id in enumerate(sorted(all_packs), 1):
-            try:
-                row_data = {"Sl.No": idx, "Battery Pack": pack_id}
-
-                # Get all QC checks for this pack from database (cached)
-                all_checks = cached_get_qc_checks(pack_id)
-
-                # Group checks by process — track filled count and NOT OK flag
-                processes_data = {}  # {process_name: {'filled': int, 'has_not_ok': bool}}
-                for check in all_checks:
-                    process_name = check['process_name']
-                    if process_name not in processes_data:
-                        processes_data[process_name] = {'filled': 0, 'has_not_ok': False}
-
-                    module_x = check.get('module_x', '')
-                    module_y = check.get('module_y', '')
-
-                    if "NOT OK" in str(module_x) or "NOT OK" in str(module_y):
-                        processes_data[process_name]['has_not_ok'] = True
-                        processes_data[process_name]['filled'] += 1
-                    elif module_x and module_y:  # Both modules must be filled
-                        processes_data[process_name]['filled'] += 1
-
-                # Map database processes to display stages
-                qc_ok_count = 0
-                has_deviations = False
-                has_processing = False
-
-                for stage in process_stages:
-                    expected = len(PROCESS_DEFINITIONS.get(stage, {}).get('qc_checks', []))
-                    pdata = processes_data.get(stage, {'filled': 0, 'has_not_ok': False})
-
-                    if pdata['filled'] == 0:
-                        stage_status = "0"
-                    elif pdata['has_not_ok']:
-                        stage_status = "QC NOT OK"
-                        has_deviations = True
-                    elif pdata['filled'] < expected:
-                        stage_status = "Processing"
-                        has_processing = True
-                    else:
-                        stage_status = "QC OK"
-                        qc_ok_count += 1
-
-                    row_data[stage] = stage_status
-
-                # Determine final overall status
-                if has_deviations:
-                    row_data["Status"] = "QC Issues"
-                elif qc_ok_count >= 9:
-                    row_data["Status"] = "Ready to dispatch"
-                elif qc_ok_count > 0 or has_processing:
-                    row_data["Status"] = "In Process"
-                else:
-                    row_data["Status"] = "Not Started"
-
-                tracker_data.append(row_data)
+        # QC checks of every pack from one query (cached), instead of a query per pack
+        df_tracker = build_pack_tracker(all_packs, cached_get_all_qc_checks_by_pack())
 
-            except Exception as e:
-                logger.error(f"Error reading pack {pack_id}: {e}")
-                continue
-
-        # Create DataFrame
-        if tracker_data:
-            df_tracker = pd.DataFrame(tracker_data)
-
-            # Style the dataframe
-            def style_cell(val):
-                if val == "QC OK":
-                    return 'background-color: #c8e6c9; color: #2e7d32; font-weight: 600;'
-                elif val == "QC NOT OK":
-                    return 'background-color: #ffcdd2; color: #c62828; font-weight: 600;'
-                elif val == "Processing":
-                    return 'background-color: #fff3e0; color: #e65100; font-weight: 500;'
-                elif val == "Ready to dispatch":
-                    return 'background-color: #2e7d32; color: white; font-weight: 700; text-align: center;'
-                elif val == "QC Issues":
-                    return 'background-color: #c62828; color: white; font-weight: 700; text-align: center;'
-                elif val == "In Process":
-                    return 'background-color: #1976d2; color: white; font-weight: 600; text-align: center;'
-                elif val == "Not Started":
-                    return 'background-color: #9e9e9e; color: white; font-weight: 500; text-align: center;'
-                elif val == "0":
-                    return 'background-color: #f5f5f5; color: #9e9e9e;'
-                return ''
-
-            # Display as styled table
+        if not df_tracker.empty:
+            # Display as styled table (whole style matrix computed in one pass)
             st.dataframe(
-                df_tracker.style.applymap(style_cell),
+                df_tracker.style.apply(tracker_cell_styles, axis=None),
                 use_container_width=True,
                 height=400
             )
@@ -1923,88 +1768,21 @@ def render_dashboard_tab():
         target_packs = st.session_state.get('production_target', 50)
 
         # Count packs by status
-        completed_packs = sum(1 for row in tracker_data if row.get("Status") == "Ready to dispatch")
-        in_process_packs = sum(1 for row in tracker_data if row.get("Status") == "In Process")
-        not_started_packs = sum(1 for row in tracker_data if row.get("Status") == "Not Started")
-        rejected_packs = sum(1 for row in tracker_data if row.get("Status") == "QC Issues")
+        status_counts = df_tracker["Status"].value_counts()
+        completed_packs = int(status_counts.get("Ready to dispatch", 0))
+        in_process_packs = int(status_counts.get("In Process", 0))
+        not_started_packs = int(status_counts.get("Not Started", 0))
+        rejected_packs = int(status_counts.get("QC Issues", 0))
 
         with col_chart1:
             st.markdown("### Plan vs Actual in Packs")
-
-            # Bar chart data
-            bar_data = pd.DataFrame({
-                'Category': ['Target', 'Completed', 'In Process', 'QC Issues'],
-                'Count': [target_packs, completed_packs, in_process_packs, rejected_packs]
-            })
-
-            # Create plotly bar chart
-            fig_bar = go.Figure(data=[
-                go.Bar(
-                    x=bar_data['Category'],
-                    y=bar_data['Count'],
-                    marker_color=['#1976D2', '#FF9800', '#FFA726', '#EF5350'],
-                    text=bar_data['Count'],
-                    textposition='outside',
-                    textfont=dict(size=14, color='black', family='Arial Black')
-                )
-            ])
-
-            fig_bar.update_layout(
-                height=350,
-                margin=dict(l=20, r=20, t=40, b=40),
-                yaxis=dict(range=[0, max(target_packs, completed_packs, in_process_packs) * 1.2]),
-                plot_bgcolor='white',
-                paper_bgcolor='white',
-                font=dict(size=12, color='#424242')
-            )
-
-            st.plotly_chart(fig_bar, use_container_width=True)
+            st.plotly_chart(cached_plan_bar_chart(target_packs, completed_packs, in_process_packs, rejected_packs),
+                            use_container_width=True)
 
         with col_chart2:
             st.markdown("### Production Plan in %")
-
-            # Calculate percentages
-            total_actual = completed_packs + in_process_packs + rejected_packs
-            if target_packs > 0:
-                completed_pct = (completed_packs / target_packs) * 100
-                in_process_pct = (in_process_packs / target_packs) * 100
-                rejected_pct = (rejected_packs / target_packs) * 100
-                target_pct = 100
-            else:
-                completed_pct = in_process_pct = rejected_pct = target_pct = 0
-
-            # Pie chart data
-            pie_data = pd.DataFrame({
-                'Status': ['Target', 'Completed', 'In Process', 'QC Issues'],
-                'Percentage': [target_pct, completed_pct, in_process_pct, rejected_pct]
-            })
-
-            # Create plotly pie chart
-            fig_pie = go.Figure(data=[go.Pie(
-                labels=pie_data['Status'],
-                values=pie_data['Percentage'],
-                marker=dict(colors=['#1976D2', '#FF9800', '#4CAF50', '#EF5350']),
-                textinfo='label+percent',
-                textfont=dict(size=12, color='white', family='Arial'),
-                hole=0
-            )])
-
-            fig_pie.update_layout(
-                height=350,
-                margin=dict(l=20, r=20, t=20, b=20),
-                showlegend=True,
-                legend=dict(
-                    orientation="v",
-                    yanchor="middle",
-                    y=0.5,
-                    xanchor="left",
-                    x=1.05
-                ),
-                plot_bgcolor='white',
-                paper_bgcolor='white'
-            )
-
-            st.plotly_chart(fig_pie, use_container_width=True)
+            st.plotly_chart(cached_plan_pie_chart(target_packs, completed_packs, in_process_packs, rejected_packs),
+                            use_container_width=True)
 
     except Exception as e:
         st.error(f"Error loading dashboard: {str(e)}")
@@ -2015,6 +1793,17 @@ def render_dashboard_tab():
 # REPORTS TAB
 # ============================================================================
 
+# Header of the CSV report, one column per get_qc_checks_export_rows field
+QC_CSV_COLUMNS = ["Battery Pack ID", "Process Name", "Check Name", "Module X", "Module Y",
+                  "Technician", "QC Name", "Remarks", "Start Date", "End Date"]
+
+
+def build_qc_csv_export() -> bytes:
+    """CSV of every QC check (one query, written by pandas), built when the
+    download button is clicked."""
+    return pd.DataFrame(get_qc_checks_export_rows(), columns=QC_CSV_COLUMNS).to_csv(index=False).encode("utf-8")
+
+
 def render_reports_tab():
     """Render reports management interface - reads directly from database."""
     st.markdown("## Production Reports")
@@ -2065,42 +1854,29 @@ def render_reports_tab():
 
         # Display battery packs in a fixed-height scrollable container
         # so the Backup section below is always visible at a fixed position.
-        # Fallback to plain container if Streamlit version < 1.33 (no height support).
-        try:
-            _reports_container = st.container(height=500)
-        except TypeError:
-            _reports_container = st.container()
-        with _reports_container:
+        # Row separators come from the container's CSS class (static/app.css).
+        with st.container(height=500, key="report_rows"):
+            # QC checks of every pack from one query (cached), for the per-row counts
+            checks_by_pack = cached_get_all_qc_checks_by_pack()
             for pack_id in filtered_packs:
                 col1, col2 = st.columns([4, 1])
 
                 with col1:
-                    # Get QC check count for this pack (cached)
-                    checks = cached_get_qc_checks(pack_id)
-                    check_count = len(checks) if checks else 0
+                    check_count = len(checks_by_pack.get(pack_id, ()))
                     st.markdown(f"**{pack_id}**")
                     st.caption(f"QC Checks: {check_count} records in database")
 
                 with col2:
-                    # Use cached Excel bytes — only generated once per pack per session
-                    try:
-                        excel_data = cached_generate_battery_excel_bytes(pack_id)
-                        if excel_data:
-                            st.download_button(
-                                label="Download",
-                                data=excel_data,
-                                file_name=f"{pack_id}.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                                key=f"download_{pack_id}",
-                                use_container_width=True
-                            )
-                        else:
-                            st.caption("No data")
-                    except Exception as e:
-                        logger.error(f"Error generating Excel for {pack_id}: {e}")
-                        st.caption("Error")
-
-                st.markdown('<hr style="margin: 0.5rem 0;">', unsafe_allow_html=True)
+                    # Workbook is generated only when this pack's button is clicked
+                    # (then cached), not for every listed pack on every rerun
+                    st.download_button(
+                        label="Download",
+                        data=partial(build_pack_excel_download, pack_id),
+                        file_name=f"{pack_id}.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                        key=f"download_{pack_id}",
+                        use_container_width=True
+                    )
 
         st.markdown("---")
 
@@ -2111,59 +1887,26 @@ def render_reports_tab():
         col_excel, col_csv = st.columns(2)
 
         with col_excel:
-            if st.button("Generate All Reports Excel", type="primary", use_container_width=True):
-                with st.spinner("Generating Excel file with all reports..."):
-                    try:
-                        excel_bytes = generate_all_reports_excel_bytes()
-                        if excel_bytes:
-                            st.download_button(
-                                label="Download All Reports (Excel)",
-                                data=excel_bytes,
-                                file_name=f"all_reports_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                                key="download_all_excel",
-                                use_container_width=True
-                            )
-                        else:
-                            st.warning("No data to export")
-                    except Exception as e:
-                        st.error(f"Error generating Excel: {str(e)}")
-                        logger.error(f"Error generating all reports Excel: {e}")
+            # Workbook is built when the button is clicked; no bytes are held between reruns
+            st.download_button(
+                label="Download All Reports (Excel)",
+                data=build_all_reports_download,
+                file_name=f"all_reports_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key="download_all_excel",
+                type="primary",
+                use_container_width=True
+            )
 
         with col_csv:
-            # Generate CSV data from database
-            try:
-                csv_buffer = io.StringIO()
-
-                # Write CSV header
-                csv_buffer.write("Battery Pack ID,Process Name,Check Name,Module X,Module Y,Technician,QC Name,Remarks,Start Date,End Date\n")
-
-                # Write data rows
-                for pack_id in all_packs:
-                    checks = cached_get_qc_checks(pack_id)
-                    for check in checks:
-                        csv_buffer.write(f"{pack_id},")
-                        csv_buffer.write(f"{check.get('process_name', '')},")
-                        csv_buffer.write(f"{check.get('check_name', '')},")
-                        csv_buffer.write(f"{check.get('module_x', '')},")
-                        csv_buffer.write(f"{check.get('module_y', '')},")
-                        csv_buffer.write(f"{check.get('technician_name', '')},")
-                        csv_buffer.write(f"{check.get('qc_name', '')},")
-                        csv_buffer.write(f"{check.get('remarks', '')},")
-                        csv_buffer.write(f"{check.get('start_date', '')},")
-                        csv_buffer.write(f"{check.get('end_date', '')}\n")
-
-                csv_data = csv_buffer.getvalue()
-
-                st.download_button(
-                    label="Download CSV Report",
-                    data=csv_data,
-                    file_name=f"production_reports_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv",
-                    use_container_width=True
-                )
-            except Exception as e:
-                logger.error(f"Error generating CSV: {e}")
+            # CSV is generated from the database when the button is clicked
+            st.download_button(
+                label="Download CSV Report",
+                data=build_qc_csv_export,
+                file_name=f"production_reports_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
 
         # Database Backup Section
         st.markdown("---")
@@ -2206,7 +1949,6 @@ def render_reports_tab():
                     "Age (days)": backup['age_days']
                 })
 
-            import pandas as pd
             df_backups = pd.DataFrame(backup_data)
             st.dataframe(df_backups, use_container_width=True, hide_index=True)
 
@@ -3,14 +3,94 @@ Database Backup Manager for Battery Pack MES
 Handles automatic and manual backups of the SQLite database
 """
 
+import os
 import shutil
+import sqlite3
+import time
 import logging
+from contextlib import closing
 from pathlib import Path
 from datetime import datetime
 from typing import List, Optional
 
+try:
+    import fcntl  # Unix only; Windows falls through to the chunked copy
+except ImportError:
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
+# Backup file names: battery_mes_backup_<YYYYmmdd_HHMMSS>.db
+BACKUP_PREFIX = "battery_mes_backup_"
+BACKUP_SUFFIX = ".db"
+
+BYTES_PER_MB = 1024 * 1024
+SECONDS_PER_DAY = 86400
+
+# Read/write chunk for database file copies (shutil's default is 64 KiB)
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+# Bytes per os.copy_file_range call
+KERNEL_COPY_CHUNK = 16 * 1024 * 1024
+# Linux ioctl that clones a file's extents (copy-on-write filesystems: Btrfs, XFS)
+FICLONE = 0x40049409
+# Pages copied per backup step; the source's read lock is released between steps
+BACKUP_STEP_PAGES = 1024
+# How long the pre-backup checkpoint waits on the app's readers/writers before giving up
+CHECKPOINT_TIMEOUT_SECONDS = 2.0
+
+
+def _kernel_copy(src_fd: int, dst_fd: int) -> bool:
+    """Copy without moving the bytes through Python: a copy-on-write clone, else
+    os.copy_file_range. Returns False (destination left empty) if neither is supported."""
+    if fcntl is not None:
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+            return True
+        except OSError:
+            pass
+
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while os.copy_file_range(src_fd, dst_fd, KERNEL_COPY_CHUNK):
+                pass
+            return True
+        except OSError:
+            # e.g. cross-filesystem on older kernels: rewind for the fallback copy
+            os.lseek(src_fd, 0, os.SEEK_SET)
+            os.lseek(dst_fd, 0, os.SEEK_SET)
+            os.ftruncate(dst_fd, 0)
+
+    return False
+
+
+def _fast_copy(src: Path, dst: Path, bufsize: int = COPY_BUFFER_SIZE) -> None:
+    """Copy a database file in the kernel where possible, otherwise in large
+    chunks (fewer read/write calls than shutil.copy)"""
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        if not _kernel_copy(src_file.fileno(), dst_file.fileno()):
+            shutil.copyfileobj(src_file, dst_file, bufsize)
+
+
+def checkpoint_wal(db_path: Path) -> None:
+    """
+    Fold the WAL back into the database file and truncate it before a backup
+
+    Best effort: if the app holds the database busy the checkpoint is partial
+    (logged) and the backup still reads the remaining pages through the WAL.
+
+    Args:
+        db_path: Database file to checkpoint
+    """
+    try:
+        with closing(sqlite3.connect(str(db_path), timeout=CHECKPOINT_TIMEOUT_SECONDS)) as conn:
+            busy, log_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        if busy:
+            logger.warning(f"WAL checkpoint blocked: {checkpointed}/{log_pages} pages checkpointed")
+        else:
+            logger.debug(f"WAL checkpoint: {checkpointed}/{log_pages} pages checkpointed")
+    except sqlite3.Error as e:
+        logger.warning(f"WAL checkpoint skipped: {e}")
+
 
 def create_backup(backup_dir: str = "backups", keep_count: int = 30) -> Optional[Path]:
     """
@@ -35,10 +115,27 @@ def create_backup(backup_dir: str = "backups", keep_count: int = 30) -> Optional
 
         # Create timestamped backup filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = backup_path / f"battery_mes_backup_{timestamp}.db"
-
-        # Copy database file (copy without preserving metadata to get current timestamp)
-        shutil.copy(db_path, backup_file)
+        backup_file = backup_path / f"{BACKUP_PREFIX}{timestamp}{BACKUP_SUFFIX}"
+        # Written under a temporary name so an interrupted backup is never listed or
+        # counted towards keep_count
+        partial_file = backup_path / f"{backup_file.name}.partial"
+
+        # Shrink the WAL first so the database file itself is current
+        checkpoint_wal(db_path)
+
+        # Snapshot through SQLite's Online Backup API: pages are read under the
+        # database's own locking (including any not yet checkpointed from the WAL),
+        # so a write in progress can't leave the copy half-updated
+        try:
+            with closing(sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=30.0)) as src, \
+                    closing(sqlite3.connect(str(partial_file))) as dst:
+                src.backup(dst, pages=BACKUP_STEP_PAGES)
+                # The copied header says WAL; switch the backup to a single self-contained file
+                dst.execute("PRAGMA journal_mode=DELETE")
+            os.replace(partial_file, backup_file)
+        finally:
+            if partial_file.exists():
+                partial_file.unlink()
 
         logger.info(f"Database backup created: {backup_file}")
 
@@ -52,6 +149,17 @@ def create_backup(backup_dir: str = "backups", keep_count: int = 30) -> Optional
         return None
 
 
+def _is_backup(name: str) -> bool:
+    """Whether a file name is one of our timestamped backups (plain string checks, no glob)"""
+    return name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX)
+
+
+def _scan_backups(backup_dir: Path) -> List[os.DirEntry]:
+    """Backup files in backup_dir as DirEntry objects (their stat() is cached per entry)"""
+    with os.scandir(backup_dir) as entries:
+        return [entry for entry in entries if _is_backup(entry.name)]
+
+
 def cleanup_old_backups(backup_dir: Path, keep_count: int = 30) -> int:
     """
     Remove old backup files, keeping only the most recent ones
@@ -64,17 +172,15 @@ def cleanup_old_backups(backup_dir: Path, keep_count: int = 30) -> int:
         Number of files deleted
     """
     try:
-        # Get all backup files sorted by modification time (newest first)
-        backups = sorted(
-            backup_dir.glob("battery_mes_backup_*.db"),
-            key=lambda x: x.stat().st_mtime,
-            reverse=True
-        )
+        # Get all backup files, newest first. The names carry the creation timestamp
+        # (same order as list_backups), so no file needs a stat() to be ranked and
+        # the backup create_backup just wrote always sorts first
+        backups = sorted(_scan_backups(backup_dir), key=lambda entry: entry.name, reverse=True)
 
         # Delete old backups
         deleted_count = 0
         for old_backup in backups[keep_count:]:
-            old_backup.unlink()
+            os.unlink(old_backup.path)
             deleted_count += 1
             logger.debug(f"Deleted old backup: {old_backup.name}")
 
@@ -103,15 +209,17 @@ def list_backups(backup_dir: str = "backups") -> List[dict]:
         if not backup_path.exists():
             return []
 
+        now = time.time()
         backups = []
-        for backup_file in sorted(backup_path.glob("battery_mes_backup_*.db"), reverse=True):
+        for backup_file in sorted(_scan_backups(backup_path), key=lambda entry: entry.name, reverse=True):
             stat = backup_file.stat()
+            created = datetime.fromtimestamp(stat.st_mtime)
             backups.append({
                 'filename': backup_file.name,
-                'path': str(backup_file),
-                'size_mb': round(stat.st_size / (1024 * 1024), 2),
-                'created': datetime.fromtimestamp(stat.st_mtime),
-                'age_days': (datetime.now() - datetime.fromtimestamp(stat.st_mtime)).days
+                'path': backup_file.path,
+                'size_mb': round(stat.st_size / BYTES_PER_MB, 2),
+                'created': created,
+                'age_days': int((now - stat.st_mtime) // SECONDS_PER_DAY)
             })
 
         return backups
@@ -139,14 +247,30 @@ def restore_backup(backup_file: Path, target_db: str = "battery_mes.db") -> bool
 
         target_path = Path(target_db)
 
-        # Create backup of current database before overwriting
-        if target_path.exists():
-            current_backup = Path(f"{target_db}.before_restore")
-            shutil.copy(target_path, current_backup)
-            logger.info(f"Current database backed up to: {current_backup}")
-
-        # Restore from backup
-        shutil.copy(backup_file, target_path)
+        # Copy the backup next to the target first; the live database is only
+        # swapped out (one atomic rename) once the copy is complete
+        restore_tmp = Path(f"{target_db}.restore_tmp")
+        try:
+            _fast_copy(backup_file, restore_tmp)
+
+            # Keep the current database before overwriting: a hard link to it
+            # costs no copy, since os.replace below leaves that file untouched
+            if target_path.exists():
+                current_backup = Path(f"{target_db}.before_restore")
+                if current_backup.exists():
+                    current_backup.unlink()
+                try:
+                    os.link(target_path, current_backup)
+                except OSError:
+                    # Filesystem without hard links
+                    _fast_copy(target_path, current_backup)
+                logger.info(f"Current database backed up to: {current_backup}")
+
+            # Restore from backup
+            os.replace(restore_tmp, target_path)
+        finally:
+            if restore_tmp.exists():
+                restore_tmp.unlink()
 
         logger.info(f"Database restored from: {backup_file}")
         return True
@@ -164,12 +288,11 @@ def get_database_size() -> float:
         Size in megabytes
     """
     try:
-        db_path = Path("battery_mes.db")
-        if not db_path.exists():
-            return 0.0
-
-        return round(db_path.stat().st_size / (1024 * 1024), 2)
+        # One stat() call; a missing file is the "no database yet" case
+        return round(Path("battery_mes.db").stat().st_size / BYTES_PER_MB, 2)
 
+    except FileNotFoundError:
+        return 0.0
     except Exception as e:
         logger.error(f"Error getting database size: {e}")
         return 0.0
@@ -186,23 +309,22 @@ def verify_backup(backup_file: Path) -> bool:
         True if valid, False otherwise
     """
     try:
-        import sqlite3
-
         if not backup_file.exists():
             return False
 
-        # Try to open and query the backup
-        conn = sqlite3.connect(str(backup_file))
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = cursor.fetchall()
-        conn.close()
+        # Backups are never written after creation: open them immutable, so SQLite
+        # skips locking and journal setup entirely
+        with closing(sqlite3.connect(f"file:{backup_file}?mode=ro&immutable=1", uri=True)) as conn:
+            # B-tree structure check at native speed (stops at the first problem)
+            if conn.execute("PRAGMA quick_check(1)").fetchone()[0] != "ok":
+                return False
 
-        # Should have at least battery_packs and qc_checks tables
-        table_names = [t[0] for t in tables]
-        has_required_tables = 'battery_packs' in table_names and 'qc_checks' in table_names
+            # Should have at least battery_packs and qc_checks tables
+            required_tables = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name IN ('battery_packs', 'qc_checks')"
+            ).fetchall()
 
-        return has_required_tables
+        return len(required_tables) == 2
 
     except Exception as e:
         logger.error(f"Backup verification failed: {e}")
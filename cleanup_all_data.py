@@ -13,10 +13,138 @@ SAFETY FEATURES:
 
 import sqlite3
 import os
+import re
+import posixpath
 from pathlib import Path
 import sys
-import openpyxl
-import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
+
+SPREADSHEETML_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIPS_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+# Package parts edited when sheets are dropped from an .xlsx
+WORKBOOK_PART = "xl/workbook.xml"
+WORKBOOK_RELS_PART = "xl/_rels/workbook.xml.rels"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+CALC_CHAIN_PART = "xl/calcChain.xml"
+
+# Empty XML elements (<sheet .../>, <Relationship .../>, <Override .../>) and their attributes
+EMPTY_ELEMENT_RE = r'<(?:\w+:)?{tag}\b[^>]*/>'
+XML_ATTRIBUTE_RE = re.compile(r'([\w:]+)="([^"]*)"')
+# Row counts of both tables in one round-trip
+COUNT_RECORDS_SQL = "SELECT (SELECT COUNT(*) FROM battery_packs), (SELECT COUNT(*) FROM qc_checks)"
+
+# Sheet-scoped defined names (print areas, filters) refer to sheets by position
+SHEET_DEFINED_NAME_RE = re.compile(r'<((?:\w+:)?)definedName\b[^>]*\blocalSheetId="(?!0")\d+"[^>]*>.*?</\1definedName>', re.S)
+
+# Threads issuing unlink() calls when deleting generated files
+DELETE_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+def read_sheet_names(xlsx_path):
+    """Sheet names of an .xlsx, read from xl/workbook.xml without loading the workbook"""
+    with zipfile.ZipFile(xlsx_path) as archive:
+        root = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    return [sheet.get("name") for sheet in root.iter(f"{SPREADSHEETML_NS}sheet")]
+
+
+def _remove_empty_elements(xml, tag, should_remove):
+    """Drop <tag .../> elements whose attribute dict matches should_remove, leaving the
+    rest of the document byte-for-byte as it was"""
+    return re.sub(EMPTY_ELEMENT_RE.format(tag=tag),
+                  lambda match: '' if should_remove(dict(XML_ATTRIBUTE_RE.findall(match.group(0)))) else match.group(0),
+                  xml)
+
+
+def keep_first_sheet_only(xlsx_path):
+    """
+    Remove every sheet but the first (the template) from an .xlsx by rewriting the
+    package directly: the dropped worksheet parts are simply not copied, and only
+    workbook.xml, its relationships and [Content_Types].xml are edited.
+
+    Returns:
+        Number of sheets removed
+    """
+    with zipfile.ZipFile(xlsx_path) as source:
+        workbook_xml = source.read(WORKBOOK_PART).decode("utf-8")
+        rels_xml = source.read(WORKBOOK_RELS_PART).decode("utf-8")
+        content_types_xml = source.read(CONTENT_TYPES_PART).decode("utf-8")
+
+        sheet_rel_ids = [sheet.get(f"{RELATIONSHIPS_NS}id")
+                         for sheet in ElementTree.fromstring(workbook_xml).iter(f"{SPREADSHEETML_NS}sheet")]
+        removed_rel_ids = set(sheet_rel_ids[1:])
+        if not removed_rel_ids:
+            return 0
+
+        # Worksheet part of each dropped sheet, plus its own relationships part
+        removed_parts = set()
+        for relationship in ElementTree.fromstring(rels_xml):
+            if relationship.get("Id") in removed_rel_ids:
+                target = relationship.get("Target")
+                part = target.lstrip("/") if target.startswith("/") else posixpath.normpath(f"xl/{target}")
+                folder, name = posixpath.split(part)
+                removed_parts.update((part, f"{folder}/_rels/{name}.rels"))
+        # The calculation chain refers to sheets by position; Excel rebuilds it when missing
+        removed_parts.add(CALC_CHAIN_PART)
+
+        sheet_elements = re.findall(EMPTY_ELEMENT_RE.format(tag="sheet"), workbook_xml)
+        if len(sheet_elements) != len(sheet_rel_ids):
+            raise ValueError("Unexpected <sheet> markup in xl/workbook.xml")
+        for sheet_element in sheet_elements[1:]:
+            workbook_xml = workbook_xml.replace(sheet_element, '', 1)
+        workbook_xml = SHEET_DEFINED_NAME_RE.sub('', workbook_xml)
+        workbook_xml = re.sub(r'\b(activeTab|firstSheet)="\d+"', r'\1="0"', workbook_xml)
+
+        rels_xml = _remove_empty_elements(
+            rels_xml, "Relationship",
+            lambda attrs: attrs.get("Id") in removed_rel_ids or attrs.get("Target", "").endswith("calcChain.xml"))
+        content_types_xml = _remove_empty_elements(
+            content_types_xml, "Override", lambda attrs: attrs.get("PartName", "").lstrip("/") in removed_parts)
+
+        edited_parts = {WORKBOOK_PART: workbook_xml, WORKBOOK_RELS_PART: rels_xml,
+                        CONTENT_TYPES_PART: content_types_xml}
+
+        # Write next to the original and swap it in only once complete
+        temp_path = xlsx_path.with_name(f"{xlsx_path.name}.tmp")
+        try:
+            with zipfile.ZipFile(temp_path, "w", zipfile.ZIP_DEFLATED) as target:
+                for info in source.infolist():
+                    if info.filename in removed_parts:
+                        continue
+                    if info.filename in edited_parts:
+                        target.writestr(info, edited_parts[info.filename].encode("utf-8"))
+                    else:
+                        target.writestr(info, source.read(info))
+        except Exception:
+            if temp_path.exists():
+                temp_path.unlink()
+            raise
+
+    os.replace(temp_path, xlsx_path)
+    return len(removed_rel_ids)
+
+
+def safe_unlink(file_path):
+    """Delete one file; returns the error message instead of raising"""
+    try:
+        file_path.unlink()
+        return None
+    except Exception as e:
+        return str(e)
+
+
+def delete_files(files):
+    """Delete files concurrently, printing a warning per failure; returns the number deleted"""
+    with ThreadPoolExecutor(max_workers=DELETE_WORKERS) as executor:
+        errors = list(executor.map(safe_unlink, files))
+
+    for file_path, error in zip(files, errors):
+        if error is not None:
+            print(f"  [WARNING] Could not delete {file_path.name}: {error}")
+    return errors.count(None)
+
 
 def main():
     print("=" * 70)
@@ -46,11 +174,7 @@ def main():
 
     # Count current records
     try:
-        cursor.execute("SELECT COUNT(*) FROM battery_packs")
-        pack_count = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(*) FROM qc_checks")
-        check_count = cursor.fetchone()[0]
+        pack_count, check_count = cursor.execute(COUNT_RECORDS_SQL).fetchone()
     except Exception as e:
         print(f"\n[ERROR] Error reading database: {str(e)}")
         conn.close()
@@ -113,7 +237,9 @@ def main():
         # Enable foreign keys (needed for cascade to work in SQLite)
         cursor.execute("PRAGMA foreign_keys = ON")
 
-        # Delete from database - delete QC checks first, then battery packs
+        # Delete from database - delete QC checks first, then battery packs,
+        # in one write transaction (takes the write lock up front)
+        cursor.execute("BEGIN IMMEDIATE")
         if check_count > 0:
             cursor.execute("DELETE FROM qc_checks")
             print(f"  [OK] Deleted {check_count} QC check records")
@@ -126,79 +252,52 @@ def main():
 
         conn.commit()
 
+        # Give the freed pages back to the filesystem and empty the WAL
+        try:
+            cursor.execute("VACUUM")
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error as e:
+            print(f"  [WARNING] Could not compact database: {str(e)}")
+
         # Delete QR code files (preserve .gitkeep)
-        for qr_file in qr_files:
-            try:
-                qr_file.unlink()
-                deleted_items['qr_files'] += 1
-            except Exception as e:
-                print(f"  [WARNING] Could not delete {qr_file.name}: {str(e)}")
+        deleted_items['qr_files'] = delete_files(qr_files)
 
         if deleted_items['qr_files'] > 0:
             print(f"  [OK] Deleted {deleted_items['qr_files']} QR code files")
 
         # Delete Excel report files (preserve .gitkeep, DON'T touch sample.xlsx)
-        for excel_file in excel_files:
-            try:
-                # Extra safety check - never delete sample.xlsx
-                if excel_file.name == "sample.xlsx":
-                    continue
-                excel_file.unlink()
-                deleted_items['excel_files'] += 1
-            except Exception as e:
-                print(f"  [WARNING] Could not delete {excel_file.name}: {str(e)}")
+        # Extra safety check - never delete sample.xlsx
+        deleted_items['excel_files'] = delete_files(
+            [excel_file for excel_file in excel_files if excel_file.name != "sample.xlsx"])
 
         if deleted_items['excel_files'] > 0:
             print(f"  [OK] Deleted {deleted_items['excel_files']} Excel report files")
 
-        # Clean sample.xlsx (remove all battery pack sheets, keep template structure)
+        # Clean sample.xlsx (remove all battery pack sheets, keep template structure).
+        # The sheet list comes from the zip directly; a template with only its own
+        # sheet is left alone instead of being rewritten.
+        sample_sheet_count = 0
         if sample_file.exists():
             try:
-                # Backup sample.xlsx first
-                backup_file = script_dir / "sample.xlsx.backup"
-                shutil.copy2(sample_file, backup_file)
-
-                wb = openpyxl.load_workbook(sample_file)
-                original_sheets = len(wb.sheetnames)
-                sheets_removed = 0
-
-                # Remove all sheets except the first one (template)
-                # Keep the first sheet as template
-                sheets_to_remove = wb.sheetnames[1:]  # All sheets except first
-
-                for sheet_name in sheets_to_remove:
-                    try:
-                        wb.remove(wb[sheet_name])
-                        sheets_removed += 1
-                    except:
-                        pass
+                sample_sheet_count = len(read_sheet_names(sample_file))
+            except Exception as e:
+                print(f"  [WARNING] Could not read sample.xlsx: {str(e)}")
 
-                # Save cleaned sample.xlsx
-                wb.save(sample_file)
-                wb.close()
+        if sample_sheet_count > 1:
+            try:
+                # Keep the first sheet as template; the rewrite only replaces
+                # sample.xlsx once the new file is complete
+                sheets_removed = keep_first_sheet_only(sample_file)
 
                 if sheets_removed > 0:
                     print(f"  [OK] Cleaned sample.xlsx: removed {sheets_removed} battery pack sheets")
                     print(f"       (Template structure preserved)")
 
-                # Remove backup if everything went well
-                if backup_file.exists():
-                    backup_file.unlink()
-
             except Exception as e:
                 print(f"  [WARNING] Could not clean sample.xlsx: {str(e)}")
-                # Restore from backup if error occurred
-                if backup_file.exists():
-                    shutil.copy2(backup_file, sample_file)
-                    backup_file.unlink()
-                    print(f"  [OK] Restored sample.xlsx from backup")
 
         # Verify database cleanup
-        cursor.execute("SELECT COUNT(*) FROM battery_packs")
-        remaining_packs = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(*) FROM qc_checks")
-        remaining_checks = cursor.fetchone()[0]
+        remaining_packs, remaining_checks = cursor.execute(COUNT_RECORDS_SQL).fetchone()
 
         print("\n" + "=" * 70)
         print("[SUCCESS] CLEANUP COMPLETE!")
@@ -7,11 +7,19 @@ Enhanced for multiple simultaneous users
 
 import os
 import time
+import queue
+import random
 import logging
+import threading
 from typing import List, Dict, Optional
 from datetime import datetime
 from pathlib import Path
 
+try:
+    from psycopg2.extras import RealDictCursor  # PostgreSQL rows as dicts
+except ImportError:
+    RealDictCursor = None  # SQLite-only install
+
 logger = logging.getLogger(__name__)
 
 # Get the directory where this script is located (for absolute database path)
@@ -19,12 +27,48 @@ SCRIPT_DIR = Path(__file__).parent
 DB_PATH = SCRIPT_DIR / 'battery_mes.db'
 
 # Database connection handling
+# PostgreSQL: psycopg2 ThreadedConnectionPool, created on first use, so calls borrow
+# an open connection instead of paying the connect/auth handshake every time
 _connection_pool = None
+_connection_pool_lock = threading.Lock()
+PG_POOL_MIN_CONN = 2
+PG_POOL_MAX_CONN = 20
+
+# SQLite: one long-lived connection per process, shared by all sessions/threads.
+# The RLock serialises use of it (re-entrant, so a helper called while it is held
+# can take it again) and sqlite3's per-connection statement cache keeps the
+# prepared SQL across calls instead of re-parsing it on every new connection.
+_sqlite_conn = None
+_sqlite_lock = threading.RLock()
+_sqlite_depth = 0  # nesting level of the current holder of _sqlite_lock
+
+# SQLite readers: a small pool of read-only connections for the SELECT-only helpers.
+# Under WAL readers never wait for the writer, so dashboard/report queries don't
+# queue behind a save holding _sqlite_lock.
+SQLITE_READ_POOL_SIZE = min(8, os.cpu_count() or 1)
+_sqlite_readers = queue.LifoQueue()  # idle reader connections (most recently used first)
+_sqlite_reader_conns = set()  # every reader opened, to recognise them in release_connection()
+_sqlite_reader_slots = threading.BoundedSemaphore(SQLITE_READ_POOL_SIZE)
 
 # Concurrent access configuration
-MAX_RETRIES = 10
-RETRY_DELAY = 0.1  # 100ms initial delay
-MAX_RETRY_DELAY = 2.0  # 2 seconds max delay
+# SQLite already waits for the writer lock itself (busy_timeout), so these retries
+# are only a safety net for lock errors it can't wait out (e.g. SQLITE_BUSY_SNAPSHOT)
+MAX_RETRIES = 3
+RETRY_DELAY = 0.05  # 50ms initial backoff cap
+MAX_RETRY_DELAY = 2.0  # 2 seconds max backoff cap
+
+# SQLite tuning (applied per connection; journal_mode=WAL is persistent and set in init_database)
+SQLITE_BUSY_TIMEOUT_MS = 30000  # wait for the writer lock inside SQLite before raising "locked"
+SQLITE_CACHE_SIZE_KB = 20000  # 20MB page cache
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # read pages through a memory map instead of read() calls
+SQLITE_WAL_AUTOCHECKPOINT = 1000  # pages
+SQLITE_JOURNAL_SIZE_LIMIT = 64 * 1024 * 1024  # truncate the WAL file back to this after a checkpoint
+SQLITE_PAGE_SIZE = 8192  # only takes effect for a new database (set in init_database)
+SQLITE_STATEMENT_CACHE_SIZE = 256  # prepared statements kept on the shared connection
+SQLITE_BUSY = 5  # primary result codes for lock errors (extended codes keep them in the low byte)
+SQLITE_LOCKED = 6
+
+PROCESS_NAME_SEPARATOR = '\x1f'  # joins process names aggregated in SQL (get_dashboard_status)
 
 
 def get_database_url():
@@ -32,48 +76,166 @@ def get_database_url():
     return os.getenv('DATABASE_URL', 'sqlite:///battery_mes.db')
 
 
+# SQL dialect, resolved once per process (the app loads .env before importing this
+# module): PostgreSQL and SQLite statements differ mostly in the parameter placeholder
+IS_POSTGRES = get_database_url().startswith('postgres')
+PH = '%s' if IS_POSTGRES else '?'
+
+
 def get_connection():
     """Get database connection (PostgreSQL or SQLite) with concurrent access support"""
-    db_url = get_database_url()
+    global _sqlite_conn, _sqlite_depth
 
-    if db_url.startswith('postgres'):
-        # PostgreSQL
-        import psycopg2
-        return psycopg2.connect(db_url)
+    if IS_POSTGRES:
+        # PostgreSQL: borrow from the pool, handed back by release_connection()
+        return _get_connection_pool(get_database_url()).getconn()
     else:
-        # SQLite with optimizations for concurrent access
-        import sqlite3
+        # Shared SQLite connection, held by this thread until release_connection()
+        _sqlite_lock.acquire()
+        try:
+            if _sqlite_conn is None:
+                _sqlite_conn = _open_sqlite_connection()
+        except Exception:
+            _sqlite_lock.release()
+            raise
+        _sqlite_depth += 1
+        return _sqlite_conn
+
+
+def get_read_connection():
+    """Get a connection for read-only queries (hand back with release_connection()).
+    SQLite: a pooled read-only connection; PostgreSQL: the normal pool."""
+    if IS_POSTGRES:
+        return get_connection()
+
+    _sqlite_reader_slots.acquire()
+    try:
+        return _sqlite_readers.get_nowait()
+    except queue.Empty:
+        pass
+    try:
+        conn = _open_sqlite_reader()
+    except Exception:
+        _sqlite_reader_slots.release()
+        raise
+    _sqlite_reader_conns.add(conn)
+    return conn
 
-        # Increased timeout for concurrent writes (30 seconds)
-        # Use absolute path to ensure correct database file regardless of working directory
-        conn = sqlite3.connect(str(DB_PATH), timeout=30.0, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
 
-        # Enable WAL mode for better concurrent access
-        # WAL allows multiple readers and one writer at the same time
-        conn.execute('PRAGMA journal_mode=WAL')
+def _get_connection_pool(db_url: str):
+    """The process-wide PostgreSQL connection pool (created once, thread-safe)"""
+    global _connection_pool
+    if _connection_pool is None:
+        with _connection_pool_lock:
+            if _connection_pool is None:
+                from psycopg2.pool import ThreadedConnectionPool
+                _connection_pool = ThreadedConnectionPool(PG_POOL_MIN_CONN, PG_POOL_MAX_CONN, dsn=db_url)
+    return _connection_pool
+
+
+def _open_sqlite_connection():
+    """Open the process-wide SQLite connection and apply the per-connection PRAGMAs once"""
+    # SQLite with optimizations for concurrent access
+    import sqlite3
+
+    # Increased timeout for concurrent writes (30 seconds)
+    # Use absolute path to ensure correct database file regardless of working directory
+    conn = sqlite3.connect(str(DB_PATH), timeout=30.0, check_same_thread=False,
+                           cached_statements=SQLITE_STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row
+
+    # Manual transaction control: writers open their own BEGIN IMMEDIATE instead
+    # of relying on the driver's implicit (deferred) BEGIN
+    conn.isolation_level = None
+
+    # WAL mode is stored in the database file itself (set once in init_database),
+    # so only the per-connection PRAGMAs are applied here.
+
+    # Set synchronous mode to NORMAL for better performance while maintaining safety
+    # (safe under WAL: only the checkpoint fsyncs, not every commit)
+    conn.execute('PRAGMA synchronous=NORMAL')
+
+    # Let SQLite wait for the writer lock instead of failing immediately
+    conn.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+
+    # Keep temp tables/indices (ORDER BY, DISTINCT) in memory
+    conn.execute('PRAGMA temp_store=MEMORY')
+
+    # Enable auto-checkpoint, and keep the WAL file from staying large after a burst
+    conn.execute(f'PRAGMA wal_autocheckpoint={SQLITE_WAL_AUTOCHECKPOINT}')
+    conn.execute(f'PRAGMA journal_size_limit={SQLITE_JOURNAL_SIZE_LIMIT}')
+
+    # Increase cache size for better performance
+    conn.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}')
+
+    # Memory-map the database file for reads
+    conn.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+
+    return conn
 
-        # Set synchronous mode to NORMAL for better performance while maintaining safety
-        conn.execute('PRAGMA synchronous=NORMAL')
 
-        # Enable auto-checkpoint at 1000 pages
-        conn.execute('PRAGMA wal_autocheckpoint=1000')
+def _open_sqlite_reader():
+    """Open a read-only SQLite connection for the reader pool"""
+    import sqlite3
 
-        # Increase cache size for better performance (10MB)
-        conn.execute('PRAGMA cache_size=-10000')
+    conn = sqlite3.connect(f"{DB_PATH.resolve().as_uri()}?mode=ro", uri=True, timeout=30.0,
+                           check_same_thread=False, cached_statements=SQLITE_STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row
 
-        return conn
+    # Same read-side tuning as the shared connection; query_only guards against
+    # a write ever being routed here
+    conn.execute('PRAGMA query_only=ON')
+    conn.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+
+    return conn
 
 
 def release_connection(conn):
-    """Close connection"""
-    conn.close()
+    """Hand a connection back: to the PostgreSQL pool, the SQLite reader pool,
+    or the shared SQLite connection's lock"""
+    global _sqlite_depth
+    if conn in _sqlite_reader_conns:
+        _sqlite_readers.put(conn)
+        _sqlite_reader_slots.release()
+        return
+
+    if conn is not _sqlite_conn:
+        # Never pool a half-finished transaction (a no-op when none is open);
+        # connections that broke are discarded instead of reused
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        _connection_pool.putconn(conn, close=bool(conn.closed))
+        return
+
+    try:
+        _sqlite_depth -= 1
+        # Never hand over a half-finished transaction to the next user
+        # (nested callers leave the outer one alone)
+        if _sqlite_depth == 0 and conn.in_transaction:
+            conn.rollback()
+    finally:
+        _sqlite_lock.release()
+
+
+def _is_sqlite_lock_error(e) -> bool:
+    """True for SQLITE_BUSY/SQLITE_LOCKED errors (and their extended codes)"""
+    code = getattr(e, 'sqlite_errorcode', None)  # Python 3.11+
+    if code is not None:
+        return code & 0xff in (SQLITE_BUSY, SQLITE_LOCKED)
+    error_msg = str(e).lower()
+    return 'locked' in error_msg or 'busy' in error_msg
 
 
 def retry_on_db_lock(func):
     """
     Decorator to retry database operations on lock/busy errors
-    Essential for concurrent access with SQLite
+    Fallback for concurrent access with SQLite: busy_timeout handles normal lock waits
     """
     def wrapper(*args, **kwargs):
         import sqlite3
@@ -84,15 +246,14 @@ def retry_on_db_lock(func):
                 return func(*args, **kwargs)
 
             except sqlite3.OperationalError as e:
-                error_msg = str(e).lower()
-
                 # Retry only on database locked/busy errors
-                if 'locked' in error_msg or 'busy' in error_msg:
+                if _is_sqlite_lock_error(e):
                     if attempt < MAX_RETRIES - 1:
-                        logger.warning(f"Database locked on attempt {attempt + 1}, retrying in {delay}s...")
-                        time.sleep(delay)
-
-                        # Exponential backoff with jitter
+                        # Exponential backoff with full jitter, so threads that hit the
+                        # lock together don't all retry at the same moment
+                        sleep_time = random.uniform(0, delay)
+                        logger.warning(f"Database locked on attempt {attempt + 1}, retrying in {sleep_time:.3f}s...")
+                        time.sleep(sleep_time)
                         delay = min(delay * 2, MAX_RETRY_DELAY)
                         continue
                     else:
@@ -108,7 +269,7 @@ def retry_on_db_lock(func):
                 if 'serialization' in error_msg or 'deadlock' in error_msg:
                     if attempt < MAX_RETRIES - 1:
                         logger.warning(f"Serialization error on attempt {attempt + 1}, retrying...")
-                        time.sleep(delay)
+                        time.sleep(random.uniform(0, delay))
                         delay = min(delay * 2, MAX_RETRY_DELAY)
                         continue
 
@@ -124,73 +285,52 @@ def retry_on_db_lock(func):
 def init_database():
     """Create database tables if they don't exist"""
     conn = get_connection()
-    db_url = get_database_url()
-    is_postgres = db_url.startswith('postgres')
+    # Auto-increment primary key is the only per-dialect difference in the schema
+    id_column = 'SERIAL PRIMARY KEY' if IS_POSTGRES else 'INTEGER PRIMARY KEY AUTOINCREMENT'
 
     try:
         cur = conn.cursor()
 
+        # Enable WAL mode for better concurrent access
+        # WAL allows multiple readers and one writer at the same time.
+        # The setting is persistent, so it only needs to be applied once here.
+        if not IS_POSTGRES:
+            # Page size can only be chosen before the file has any pages (new database)
+            if cur.execute('PRAGMA page_count').fetchone()[0] == 0:
+                cur.execute(f'PRAGMA page_size={SQLITE_PAGE_SIZE}')
+            cur.execute('PRAGMA journal_mode=WAL')
+            cur.execute('BEGIN IMMEDIATE')
+
         # Battery packs table
-        if is_postgres:
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS battery_packs (
-                    id SERIAL PRIMARY KEY,
-                    pack_id VARCHAR(100) UNIQUE NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    status VARCHAR(50)
-                )
-            """)
-        else:
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS battery_packs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    pack_id VARCHAR(100) UNIQUE NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    status VARCHAR(50)
-                )
-            """)
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS battery_packs (
+                id {id_column},
+                pack_id VARCHAR(100) UNIQUE NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                status VARCHAR(50)
+            )
+        """)
 
         # QC checks table
-        if is_postgres:
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS qc_checks (
-                    id SERIAL PRIMARY KEY,
-                    pack_id VARCHAR(100) NOT NULL,
-                    process_name VARCHAR(100) NOT NULL,
-                    check_name TEXT,
-                    module_x VARCHAR(20),
-                    module_y VARCHAR(20),
-                    technician_name VARCHAR(100),
-                    qc_name VARCHAR(100),
-                    remarks TEXT,
-                    start_date TIMESTAMP,
-                    end_date TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (pack_id) REFERENCES battery_packs(pack_id) ON DELETE CASCADE
-                )
-            """)
-        else:
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS qc_checks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    pack_id VARCHAR(100) NOT NULL,
-                    process_name VARCHAR(100) NOT NULL,
-                    check_name TEXT,
-                    module_x VARCHAR(20),
-                    module_y VARCHAR(20),
-                    technician_name VARCHAR(100),
-                    qc_name VARCHAR(100),
-                    remarks TEXT,
-                    start_date TIMESTAMP,
-                    end_date TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (pack_id) REFERENCES battery_packs(pack_id) ON DELETE CASCADE
-                )
-            """)
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS qc_checks (
+                id {id_column},
+                pack_id VARCHAR(100) NOT NULL,
+                process_name VARCHAR(100) NOT NULL,
+                check_name TEXT,
+                module_x VARCHAR(20),
+                module_y VARCHAR(20),
+                technician_name VARCHAR(100),
+                qc_name VARCHAR(100),
+                remarks TEXT,
+                start_date TIMESTAMP,
+                end_date TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (pack_id) REFERENCES battery_packs(pack_id) ON DELETE CASCADE
+            )
+        """)
 
         # Create indexes
         cur.execute("""
@@ -199,23 +339,30 @@ def init_database():
         cur.execute("""
             CREATE INDEX IF NOT EXISTS idx_qc_pack_process ON qc_checks(pack_id, process_name)
         """)
+        # Partial index holding only the NOT OK results (get_not_ok_checks)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_qc_not_ok ON qc_checks(pack_id, process_name)
+            WHERE module_x = 'NOT OK' OR module_y = 'NOT OK'
+        """)
 
         # Migration: add module_sn1/sn2 columns to battery_packs if not already present
-        if is_postgres:
-            for col in ['module_sn1', 'module_sn2']:
-                try:
-                    cur.execute(f"ALTER TABLE battery_packs ADD COLUMN {col} VARCHAR(100) DEFAULT ''")
-                except Exception:
-                    pass  # column already exists
-        else:
-            for col in ['module_sn1', 'module_sn2']:
+        # (PostgreSQL aborts the whole transaction on a failed statement, so it must
+        # not rely on the "column already exists" error like SQLite does)
+        for col in ['module_sn1', 'module_sn2']:
+            if IS_POSTGRES:
+                cur.execute(f"ALTER TABLE battery_packs ADD COLUMN IF NOT EXISTS {col} VARCHAR(100) DEFAULT ''")
+            else:
                 try:
                     cur.execute(f"ALTER TABLE battery_packs ADD COLUMN {col} VARCHAR(100) DEFAULT ''")
                 except Exception:
                     pass  # column already exists
 
         conn.commit()
-        logger.info(f"Database initialized ({'PostgreSQL' if is_postgres else 'SQLite'})")
+
+        # One-off migration in its own transaction, after the schema above is committed
+        _migrate_qc_unique_index(conn)
+
+        logger.info(f"Database initialized ({'PostgreSQL' if IS_POSTGRES else 'SQLite'})")
 
     except Exception as e:
         logger.error(f"Database initialization error: {e}")
@@ -225,19 +372,65 @@ def init_database():
         release_connection(conn)
 
 
+def _migrate_qc_unique_index(conn):
+    """Create ux_qc_pack_process_check (one row per pack, process and check, which the
+    save_qc_checks UPSERT relies on) if it doesn't exist yet. Duplicate rows left by
+    concurrent inserts before the index existed are removed first; saves have always
+    updated the first row of a check, so the lowest id is kept. SQLite is backed up
+    before anything is deleted."""
+    cur = conn.cursor()
+    if IS_POSTGRES:
+        cur.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s", ('ux_qc_pack_process_check',))
+    else:
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+                    ('ux_qc_pack_process_check',))
+    if cur.fetchone():
+        return
+
+    cur.execute("""
+        SELECT id FROM qc_checks WHERE id NOT IN (
+            SELECT MIN(id) FROM qc_checks GROUP BY pack_id, process_name, check_name
+        )
+        ORDER BY id
+    """)
+    duplicate_ids = [row[0] for row in cur.fetchall()]
+    conn.commit()  # end PostgreSQL's implicit transaction before the migration's own
+
+    if duplicate_ids and not IS_POSTGRES:
+        from backup_manager import create_backup
+        backup_file = create_backup()
+        if backup_file is None:
+            raise RuntimeError("Backup failed; not removing duplicate QC check rows")
+        logger.warning(f"Backed up database to {backup_file} before removing duplicate QC check rows")
+
+    try:
+        if not IS_POSTGRES:
+            cur.execute('BEGIN IMMEDIATE')
+        if duplicate_ids:
+            cur.executemany(f"DELETE FROM qc_checks WHERE id = {PH}", [(row_id,) for row_id in duplicate_ids])
+            logger.warning(f"Removed {len(duplicate_ids)} duplicate QC check rows (ids: {duplicate_ids})")
+        cur.execute("""
+            CREATE UNIQUE INDEX ux_qc_pack_process_check
+            ON qc_checks(pack_id, process_name, check_name)
+        """)
+        conn.commit()
+        logger.info("Created unique index ux_qc_pack_process_check")
+    except Exception:
+        conn.rollback()
+        raise
+
+
 @retry_on_db_lock
 def save_battery_pack(pack_id: str, module_sn1: str = '', module_sn2: str = '') -> bool:
     """Create or update battery pack record with retry on lock.
     module_sn1/sn2 are only updated when non-empty (merge logic)."""
     conn = get_connection()
-    db_url = get_database_url()
-    is_postgres = db_url.startswith('postgres')
 
     try:
         cur = conn.cursor()
         timestamp = datetime.now()
 
-        if is_postgres:
+        if IS_POSTGRES:
             cur.execute("""
                 INSERT INTO battery_packs (pack_id, module_sn1, module_sn2, created_at, updated_at)
                 VALUES (%s, %s, %s, %s, %s)
@@ -250,6 +443,8 @@ def save_battery_pack(pack_id: str, module_sn1: str = '', module_sn2: str = '')
                   timestamp, module_sn1, module_sn1, module_sn2, module_sn2))
         else:
             # SQLite: INSERT OR IGNORE to create if new, then UPDATE SNs if provided
+            # (one write transaction, taking the write lock up front)
+            cur.execute('BEGIN IMMEDIATE')
             cur.execute("""
                 INSERT OR IGNORE INTO battery_packs (pack_id, module_sn1, module_sn2, created_at, updated_at)
                 VALUES (?, ?, ?, ?, ?)
@@ -280,21 +475,13 @@ def save_battery_pack(pack_id: str, module_sn1: str = '', module_sn2: str = '')
 
 def get_battery_pack_info(pack_id: str) -> dict:
     """Return battery pack info including module serial numbers."""
-    conn = get_connection()
-    db_url = get_database_url()
-    is_postgres = db_url.startswith('postgres')
+    conn = get_read_connection()
     try:
         cur = conn.cursor()
-        if is_postgres:
-            cur.execute(
-                "SELECT pack_id, module_sn1, module_sn2 FROM battery_packs WHERE pack_id = %s LIMIT 1",
-                (pack_id,)
-            )
-        else:
-            cur.execute(
-                "SELECT pack_id, module_sn1, module_sn2 FROM battery_packs WHERE pack_id = ? LIMIT 1",
-                (pack_id,)
-            )
+        cur.execute(
+            f"SELECT pack_id, module_sn1, module_sn2 FROM battery_packs WHERE pack_id = {PH} LIMIT 1",
+            (pack_id,)
+        )
         row = cur.fetchone()
         if row:
             return {'pack_id': row[0], 'module_sn1': row[1] or '', 'module_sn2': row[2] or ''}
@@ -317,24 +504,29 @@ def save_qc_checks(pack_id: str, process_name: str, technician_name: str,
     - Both modules' data are preserved!
     """
     conn = get_connection()
-    db_url = get_database_url()
-    is_postgres = db_url.startswith('postgres')
 
     try:
         cur = conn.cursor()
 
-        # Ensure battery pack exists
-        save_battery_pack(pack_id)
-
         # Use immediate transaction for write lock (SQLite)
-        if not is_postgres:
-            conn.isolation_level = 'IMMEDIATE'
+        if not IS_POSTGRES:
+            cur.execute('BEGIN IMMEDIATE')
 
         timestamp = datetime.now()
 
-        # MERGE strategy: Update or Insert each check
+        # Ensure battery pack exists (and mark it updated), in the same transaction
+        cur.execute(f"""
+            INSERT INTO battery_packs (pack_id, created_at, updated_at)
+            VALUES ({PH}, {PH}, {PH})
+            ON CONFLICT (pack_id) DO UPDATE SET updated_at = excluded.updated_at
+        """, (pack_id, timestamp, timestamp))
+
+        # MERGE strategy, one UPSERT per check (all sent with one executemany):
+        # new rows are inserted as-is; for an existing row an empty module value
+        # keeps the saved one, and end_date is set when both modules end up filled
+        # and cleared when either is empty
+        upsert_params = []
         for check in checks:
-            check_name = check.get('check_name', '')
             module_x_value = check.get('module_x', '')
             module_y_value = check.get('module_y', '')
             # Per-check technician/QC names, falling back to process-level params
@@ -343,86 +535,34 @@ def save_qc_checks(pack_id: str, process_name: str, technician_name: str,
             # Per-check remarks, falling back to process-level remarks param
             check_remarks = check.get('remarks', '') or remarks
 
-            # Check if this check already exists
-            if is_postgres:
-                cur.execute("""
-                    SELECT id, module_x, module_y FROM qc_checks
-                    WHERE pack_id = %s AND process_name = %s AND check_name = %s
-                    LIMIT 1
-                """, (pack_id, process_name, check_name))
-            else:
-                cur.execute("""
-                    SELECT id, module_x, module_y FROM qc_checks
-                    WHERE pack_id = ? AND process_name = ? AND check_name = ?
-                    LIMIT 1
-                """, (pack_id, process_name, check_name))
-
-            existing_row = cur.fetchone()
-
-            if existing_row:
-                # Row exists - UPDATE only fields that have data
-                row_id = existing_row[0]
-                existing_module_x = existing_row[1] if len(existing_row) > 1 else ''
-                existing_module_y = existing_row[2] if len(existing_row) > 2 else ''
-
-                # Merge logic: Keep existing data if new data is empty
-                final_module_x = module_x_value if module_x_value else existing_module_x
-                final_module_y = module_y_value if module_y_value else existing_module_y
-
-                # Auto-complete: set end_date when both modules filled, clear it if either is empty
-                check_is_complete = bool(final_module_x) and bool(final_module_y)
-                check_end_date = timestamp if check_is_complete else None
-
-                # Update the row with merged data
-                if is_postgres:
-                    cur.execute("""
-                        UPDATE qc_checks
-                        SET module_x = %s, module_y = %s,
-                            technician_name = %s, qc_name = %s, remarks = %s,
-                            end_date = %s, updated_at = %s
-                        WHERE id = %s
-                    """, (final_module_x, final_module_y, check_technician, check_qc,
-                          check_remarks, check_end_date, timestamp, row_id))
-                else:
-                    cur.execute("""
-                        UPDATE qc_checks
-                        SET module_x = ?, module_y = ?,
-                            technician_name = ?, qc_name = ?, remarks = ?,
-                            end_date = ?, updated_at = ?
-                        WHERE id = ?
-                    """, (final_module_x, final_module_y, check_technician, check_qc,
-                          check_remarks, check_end_date, timestamp, row_id))
-
-                logger.debug(f"Updated check '{check_name}' - Module X: '{final_module_x}', Module Y: '{final_module_y}', auto-complete: {check_is_complete}")
-
-            else:
-                # Row doesn't exist - INSERT new row
-                # Auto-complete: set end_date immediately if both modules are filled on insert
-                check_is_complete = bool(module_x_value) and bool(module_y_value)
-                check_end_date = timestamp if check_is_complete else None
-
-                if is_postgres:
-                    cur.execute("""
-                        INSERT INTO qc_checks
-                        (pack_id, process_name, check_name, module_x, module_y,
-                         technician_name, qc_name, remarks, start_date, end_date, created_at, updated_at)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (pack_id, process_name, check_name,
-                          module_x_value, module_y_value,
-                          check_technician, check_qc, check_remarks,
-                          timestamp, check_end_date, timestamp, timestamp))
-                else:
-                    cur.execute("""
-                        INSERT INTO qc_checks
-                        (pack_id, process_name, check_name, module_x, module_y,
-                         technician_name, qc_name, remarks, start_date, end_date, created_at, updated_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (pack_id, process_name, check_name,
-                          module_x_value, module_y_value,
-                          check_technician, check_qc, check_remarks,
-                          timestamp, check_end_date, timestamp, timestamp))
-
-                logger.debug(f"Inserted new check '{check_name}' - Module X: '{module_x_value}', Module Y: '{module_y_value}', auto-complete: {check_is_complete}")
+            # Auto-complete on insert: set end_date immediately if both modules are filled
+            check_end_date = timestamp if module_x_value and module_y_value else None
+
+            upsert_params.append((pack_id, process_name, check.get('check_name', ''),
+                                  module_x_value, module_y_value,
+                                  check_technician, check_qc, check_remarks,
+                                  timestamp, check_end_date, timestamp, timestamp))
+
+        if upsert_params:
+            placeholders = ', '.join([PH] * 12)
+            cur.executemany(f"""
+                INSERT INTO qc_checks
+                (pack_id, process_name, check_name, module_x, module_y,
+                 technician_name, qc_name, remarks, start_date, end_date, created_at, updated_at)
+                VALUES ({placeholders})
+                ON CONFLICT (pack_id, process_name, check_name) DO UPDATE SET
+                    module_x = COALESCE(NULLIF(excluded.module_x, ''), qc_checks.module_x),
+                    module_y = COALESCE(NULLIF(excluded.module_y, ''), qc_checks.module_y),
+                    technician_name = excluded.technician_name,
+                    qc_name = excluded.qc_name,
+                    remarks = excluded.remarks,
+                    end_date = CASE
+                        WHEN COALESCE(NULLIF(excluded.module_x, ''), qc_checks.module_x, '') <> ''
+                         AND COALESCE(NULLIF(excluded.module_y, ''), qc_checks.module_y, '') <> ''
+                        THEN excluded.updated_at
+                    END,
+                    updated_at = excluded.updated_at
+            """, upsert_params)
 
         conn.commit()
         logger.info(f"Saved/merged {len(checks)} QC checks for {pack_id} - {process_name}")
@@ -438,30 +578,28 @@ def save_qc_checks(pack_id: str, process_name: str, technician_name: str,
 
 @retry_on_db_lock
 def update_process_completion(pack_id: str, process_name: str) -> bool:
-    """Update end_date for a process with retry on lock (handles concurrent updates)"""
+    """Update end_date for a process with retry on lock (handles concurrent updates)
+    Rows that already have an end_date are left alone, so repeating the call
+    (double-click, rerun) writes nothing once the process is complete."""
     conn = get_connection()
-    db_url = get_database_url()
-    is_postgres = db_url.startswith('postgres')
 
     try:
         cur = conn.cursor()
         timestamp = datetime.now()
 
-        if is_postgres:
-            cur.execute("""
-                UPDATE qc_checks SET end_date = %s, updated_at = %s
-                WHERE pack_id = %s AND process_name = %s
-            """, (timestamp, timestamp, pack_id, process_name))
-        else:
+        if not IS_POSTGRES:
             # Use immediate transaction for write lock
-            conn.isolation_level = 'IMMEDIATE'
-            cur.execute("""
-                UPDATE qc_checks SET end_date = ?, updated_at = ?
-                WHERE pack_id = ? AND process_name = ?
-            """, (timestamp, timestamp, pack_id, process_name))
+            cur.execute('BEGIN IMMEDIATE')
+        cur.execute(f"""
+            UPDATE qc_checks SET end_date = {PH}, updated_at = {PH}
+            WHERE pack_id = {PH} AND process_name = {PH} AND end_date IS NULL
+        """, (timestamp, timestamp, pack_id, process_name))
 
         conn.commit()
-        logger.info(f"Completed process {process_name} for {pack_id}")
+        if cur.rowcount == 0:
+            logger.info(f"Process {process_name} for {pack_id} already complete, nothing to update")
+        else:
+            logger.info(f"Completed process {process_name} for {pack_id}")
         return True
 
     except Exception as e:
@@ -474,54 +612,30 @@ def update_process_completion(pack_id: str, process_name: str) -> bool:
 
 def get_qc_checks(pack_id: str, process_name: str = None) -> List[Dict]:
     """Get QC check data from database"""
-    conn = get_connection()
-    db_url = get_database_url()
-    is_postgres = db_url.startswith('postgres')
+    conn = get_read_connection()
 
     try:
-        cur = conn.cursor()
+        cur = conn.cursor(cursor_factory=RealDictCursor) if IS_POSTGRES else conn.cursor()
 
         if process_name:
-            if is_postgres:
-                cur.execute("""
-                    SELECT * FROM qc_checks
-                    WHERE pack_id = %s AND process_name = %s
-                    ORDER BY created_at ASC
-                """, (pack_id, process_name))
-            else:
-                cur.execute("""
-                    SELECT * FROM qc_checks
-                    WHERE pack_id = ? AND process_name = ?
-                    ORDER BY created_at ASC
-                """, (pack_id, process_name))
+            cur.execute(f"""
+                SELECT * FROM qc_checks
+                WHERE pack_id = {PH} AND process_name = {PH}
+                ORDER BY created_at ASC
+            """, (pack_id, process_name))
         else:
-            if is_postgres:
-                cur.execute("""
-                    SELECT * FROM qc_checks
-                    WHERE pack_id = %s
-                    ORDER BY process_name, created_at ASC
-                """, (pack_id,))
-            else:
-                cur.execute("""
-                    SELECT * FROM qc_checks
-                    WHERE pack_id = ?
-                    ORDER BY process_name, created_at ASC
-                """, (pack_id,))
+            cur.execute(f"""
+                SELECT * FROM qc_checks
+                WHERE pack_id = {PH}
+                ORDER BY process_name, created_at ASC
+            """, (pack_id,))
 
         rows = cur.fetchall()
 
-        # Convert rows to dicts (works for both PostgreSQL and SQLite)
-        result = []
-        for row in rows:
-            if is_postgres:
-                # PostgreSQL with RealDictCursor
-                from psycopg2.extras import RealDictCursor
-                result.append(dict(row))
-            else:
-                # SQLite with Row factory
-                result.append(dict(row))
-
-        return result
+        # RealDictCursor rows already are dicts; SQLite Rows are converted
+        if IS_POSTGRES:
+            return rows
+        return [dict(row) for row in rows]
 
     except Exception as e:
         logger.error(f"Error fetching QC checks: {e}")
@@ -532,7 +646,7 @@ def get_qc_checks(pack_id: str, process_name: str = None) -> List[Dict]:
 
 def get_all_battery_packs() -> List[str]:
     """Get list of all battery pack IDs"""
-    conn = get_connection()
+    conn = get_read_connection()
 
     try:
         cur = conn.cursor()
@@ -547,38 +661,100 @@ def get_all_battery_packs() -> List[str]:
         release_connection(conn)
 
 
+def get_all_battery_pack_info() -> Dict[str, Dict]:
+    """Get {pack_id: info} for every battery pack in one query, ordered by pack ID
+    (bulk counterpart of get_battery_pack_info for the all-packs reports)"""
+    conn = get_read_connection()
+
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT pack_id, module_sn1, module_sn2 FROM battery_packs ORDER BY pack_id")
+        return {
+            row[0]: {'pack_id': row[0], 'module_sn1': row[1] or '', 'module_sn2': row[2] or ''}
+            for row in cur.fetchall()
+        }
+
+    except Exception as e:
+        logger.error(f"Error fetching battery pack info: {e}")
+        return {}
+    finally:
+        release_connection(conn)
+
+
+def get_all_qc_checks_by_pack() -> Dict[str, List[Dict]]:
+    """Get every QC check grouped by pack ID in one query (bulk counterpart of
+    get_qc_checks; rows per pack keep its process_name, created_at order)"""
+    conn = get_read_connection()
+
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor) if IS_POSTGRES else conn.cursor()
+        cur.execute("""
+            SELECT * FROM qc_checks
+            ORDER BY pack_id, process_name, created_at ASC, id
+        """)
+
+        checks_by_pack = {}
+        for row in cur.fetchall():
+            check = dict(row)
+            checks_by_pack.setdefault(check['pack_id'], []).append(check)
+        return checks_by_pack
+
+    except Exception as e:
+        logger.error(f"Error fetching QC checks: {e}")
+        return {}
+    finally:
+        release_connection(conn)
+
+
+def get_qc_checks_export_rows() -> List[tuple]:
+    """Get every QC check as a (pack_id, process_name, check_name, module_x,
+    module_y, technician_name, qc_name, remarks, start_date, end_date) tuple in
+    one query, ordered by pack then process (for the CSV export)"""
+    conn = get_read_connection()
+
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT pack_id, process_name, check_name, module_x, module_y,
+                   technician_name, qc_name, remarks, start_date, end_date
+            FROM qc_checks
+            ORDER BY pack_id, process_name, created_at ASC, id
+        """)
+        return [tuple(row) for row in cur.fetchall()]
+
+    except Exception as e:
+        logger.error(f"Error fetching QC checks for export: {e}")
+        return []
+    finally:
+        release_connection(conn)
+
+
 def get_dashboard_status() -> List[Dict]:
     """
     Get dashboard status for all battery packs with process completion
     Returns list of dicts with pack_id and process status
     """
-    conn = get_connection()
+    conn = get_read_connection()
 
     try:
         cur = conn.cursor()
 
-        # Get all battery packs and their processes
-        cur.execute("""
-            SELECT DISTINCT pack_id, process_name
-            FROM qc_checks
-            ORDER BY pack_id, process_name
-        """)
-        rows = cur.fetchall()
-
-        # Group by pack_id
-        pack_statuses = {}
-        for pack_id, process_name in rows:
-            if pack_id not in pack_statuses:
-                pack_statuses[pack_id] = {}
-            pack_statuses[pack_id][process_name] = "QC OK"  # If data exists, mark as OK
-
-        # Convert to list format
-        result = []
-        for pack_id, processes in pack_statuses.items():
-            result.append({
-                'pack_id': pack_id,
-                'processes': processes
-            })
+        # One row per pack with its distinct processes joined into a single string
+        # (unit separator, which can't appear in a process name)
+        group_concat = 'STRING_AGG' if IS_POSTGRES else 'GROUP_CONCAT'
+        cur.execute(f"""
+            SELECT pack_id, {group_concat}(process_name, {PH})
+            FROM (SELECT DISTINCT pack_id, process_name FROM qc_checks) AS pack_processes
+            GROUP BY pack_id
+            ORDER BY pack_id
+        """, (PROCESS_NAME_SEPARATOR,))
+
+        # If data exists for a process, mark it as OK
+        result = [
+            {'pack_id': pack_id,
+             'processes': {name: "QC OK" for name in sorted(processes.split(PROCESS_NAME_SEPARATOR))}}
+            for pack_id, processes in cur.fetchall()
+        ]
 
         return result
 
@@ -589,6 +765,27 @@ def get_dashboard_status() -> List[Dict]:
         release_connection(conn)
 
 
+def _process_counters(pack_id: str, process_name: str) -> tuple:
+    """Aggregate a process's saved checks in one query: (total rows, rows with an
+    end_date, rows with a module X value, rows with a module Y value, any start_date)"""
+    conn = get_read_connection()
+
+    try:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT COUNT(*),
+                   COALESCE(SUM(CASE WHEN end_date IS NOT NULL THEN 1 ELSE 0 END), 0),
+                   COALESCE(SUM(CASE WHEN COALESCE(TRIM(module_x), '') <> '' THEN 1 ELSE 0 END), 0),
+                   COALESCE(SUM(CASE WHEN COALESCE(TRIM(module_y), '') <> '' THEN 1 ELSE 0 END), 0),
+                   MAX(start_date) IS NOT NULL
+            FROM qc_checks
+            WHERE pack_id = {PH} AND process_name = {PH}
+        """, (pack_id, process_name))
+        return tuple(cur.fetchone())
+    finally:
+        release_connection(conn)
+
+
 def check_process_status(pack_id: str, process_name: str) -> Dict:
     """
     Check if process has data and completion status
@@ -608,45 +805,32 @@ def check_process_status(pack_id: str, process_name: str) -> Dict:
     }
 
     try:
-        from app_unified_db import PROCESS_ROW_MAPPING, PROCESS_DEFINITIONS
+        from process_definitions import PROCESS_ROW_MAPPING, PROCESS_CHECKS
         process_info = PROCESS_ROW_MAPPING.get(process_name)
         if not process_info:
             return result
 
-        result['process_type'] = process_info['type']
-        checks = get_qc_checks(pack_id, process_name)
+        result['process_type'] = process_info.kind
+        total_rows, completed_checks, module_x_count, module_y_count, has_start = \
+            _process_counters(pack_id, process_name)
 
-        # Total expected checks comes from PROCESS_DEFINITIONS, not just DB rows.
+        # Total expected checks comes from the process definitions, not just DB rows.
         # This ensures completion is only True when every defined check has been saved.
-        expected_checks = PROCESS_DEFINITIONS.get(process_name, {}).get('qc_checks', [])
-        expected_total = len(expected_checks) if expected_checks else len(checks)
+        expected_checks = PROCESS_CHECKS.get(process_name, ())
+        expected_total = len(expected_checks) if expected_checks else total_rows
 
-        if checks:
+        if total_rows:
             result['exists'] = True
             result['has_any_data'] = True
-            result['started'] = any(check.get('start_date') for check in checks)
+            result['started'] = bool(has_start)
 
             # Process is complete only when ALL defined checks have their individual end_date set
-            completed_checks = sum(1 for c in checks if c.get('end_date'))
             result['completed'] = (completed_checks == expected_total) and expected_total > 0
             result['completed_checks'] = completed_checks
             result['total_checks'] = expected_total
 
-            # Check if both modules are complete (all non-empty; N/A counts as a valid deliberate entry)
-            module_x_count = 0
-            module_y_count = 0
-
-            for check in checks:
-                module_x = check.get('module_x', '').strip()
-                module_y = check.get('module_y', '').strip()
-
-                # Any non-empty value counts (OK, NOT OK, N/A are all deliberate choices)
-                if module_x:
-                    module_x_count += 1
-                if module_y:
-                    module_y_count += 1
-
-            # Module is complete if all checks have data
+            # Module is complete if all checks have data (any non-empty value counts:
+            # OK, NOT OK, N/A are all deliberate choices)
             result['module_x_complete'] = module_x_count == expected_total
             result['module_y_complete'] = module_y_count == expected_total
             result['both_modules_complete'] = result['module_x_complete'] and result['module_y_complete']
@@ -665,17 +849,12 @@ def check_process_status(pack_id: str, process_name: str) -> Dict:
 
 def battery_pack_exists(pack_id: str) -> bool:
     """Check if battery pack exists in database"""
-    conn = get_connection()
-    db_url = get_database_url()
-    is_postgres = db_url.startswith('postgres')
+    conn = get_read_connection()
 
     try:
         cur = conn.cursor()
 
-        if is_postgres:
-            cur.execute("SELECT COUNT(*) FROM battery_packs WHERE pack_id = %s", (pack_id,))
-        else:
-            cur.execute("SELECT COUNT(*) FROM battery_packs WHERE pack_id = ?", (pack_id,))
+        cur.execute(f"SELECT COUNT(*) FROM battery_packs WHERE pack_id = {PH}", (pack_id,))
 
         count = cur.fetchone()[0]
         return count > 0
@@ -695,53 +874,29 @@ def get_not_ok_checks(pack_id: str, process_names: list) -> list:
     if not process_names:
         return []
 
-    conn = get_connection()
-    db_url = get_database_url()
-    is_postgres = db_url.startswith('postgres')
+    conn = get_read_connection()
 
     try:
         cur = conn.cursor()
-        results = []
 
-        if is_postgres:
-            placeholders = ','.join(['%s'] * len(process_names))
-            cur.execute(f"""
-                SELECT process_name, check_name, module_x, module_y
-                FROM qc_checks
-                WHERE pack_id = %s AND process_name IN ({placeholders})
-                ORDER BY process_name, created_at ASC
-            """, [pack_id] + process_names)
-        else:
-            placeholders = ','.join(['?'] * len(process_names))
-            cur.execute(f"""
-                SELECT process_name, check_name, module_x, module_y
-                FROM qc_checks
-                WHERE pack_id = ? AND process_name IN ({placeholders})
-                ORDER BY process_name, created_at ASC
-            """, [pack_id] + process_names)
-
-        rows = cur.fetchall()
-
-        for row in rows:
-            process_name = row[0]
-            check_name = row[1]
-            module_x = row[2] or ''
-            module_y = row[3] or ''
-
-            if module_x == 'NOT OK':
-                results.append({
-                    'process_name': process_name,
-                    'check_name': check_name,
-                    'module': 'Module X'
-                })
-            if module_y == 'NOT OK':
-                results.append({
-                    'process_name': process_name,
-                    'check_name': check_name,
-                    'module': 'Module Y'
-                })
-
-        return results
+        # One branch per module, ordered by process, then in save order (checks saved
+        # together share created_at, so row id keeps them in form order), Module X before Module Y
+        placeholders = ','.join([PH] * len(process_names))
+        cur.execute(f"""
+            SELECT process_name, check_name, 'Module X' AS module, created_at, id
+            FROM qc_checks
+            WHERE pack_id = {PH} AND process_name IN ({placeholders}) AND module_x = 'NOT OK'
+            UNION ALL
+            SELECT process_name, check_name, 'Module Y' AS module, created_at, id
+            FROM qc_checks
+            WHERE pack_id = {PH} AND process_name IN ({placeholders}) AND module_y = 'NOT OK'
+            ORDER BY process_name, created_at, id, module
+        """, [pack_id] + process_names + [pack_id] + process_names)
+
+        return [
+            {'process_name': row[0], 'check_name': row[1], 'module': row[2]}
+            for row in cur.fetchall()
+        ]
 
     except Exception as e:
         logger.error(f"Error checking NOT OK status: {e}")
@@ -5,115 +5,64 @@ CRITICAL: Format and data mapping must remain identical
 """
 
 import openpyxl
-from openpyxl.cell.cell import MergedCell
 from openpyxl.styles import Font
 from pathlib import Path
 from datetime import datetime
 import logging
-from typing import Optional
+import pickle
+import threading
+import weakref
+from typing import Dict, List, Optional
 import io
-from database import get_qc_checks, get_all_battery_packs, get_battery_pack_info
+from database import (
+    get_qc_checks, get_battery_pack_info, get_all_battery_pack_info, get_all_qc_checks_by_pack
+)
+from process_definitions import PROCESS_ROW_MAPPING, PROCESS_CHECKS
 
 # Standard font to override Wingdings in template (columns L/M use Wingdings which breaks WPS Office)
 STANDARD_FONT = Font(name='Arial', size=10)
 
 logger = logging.getLogger(__name__)
 
+# NOTE: every output sheet is a styled copy of the template (merged cells, borders),
+# so openpyxl's write-only mode cannot be used here. With lxml installed (see
+# requirements) openpyxl automatically switches to lxml's incremental C writer,
+# which is what makes the master/all-reports saves fast.
+if not openpyxl.LXML:
+    logger.info("lxml not installed - openpyxl will use the slower pure-Python XML writer")
+
 # CRITICAL: Use a dedicated template file that is NEVER overwritten
 # template.xlsx = clean original template (read-only, never modified)
 # sample.xlsx = master output file (regenerated from template + DB data)
 TEMPLATE_PATH = Path(__file__).parent / "template.xlsx"
 MASTER_OUTPUT_PATH = Path(__file__).parent / "sample.xlsx"
 
-# Row mapping for Excel sheet - Duplicated here to avoid circular import
-PROCESS_ROW_MAPPING = {
-    "Cell Sorting": {"start_row": 8, "type": "standard"},
-    "Module Assembly": {"start_row": 12, "type": "standard"},
-    "Encapsulation & Soldering - Phase 1": {"start_row": 29, "type": "standard"},
-    "Wire Bonding": {"start_row": 34, "type": "standard"},
-    "Encapsulation Phase II (100%)": {"start_row": 35, "type": "standard"},
-    "Module QC Checks": {"start_row": 37, "type": "standard"},
-    "EOL Testing": {"start_row": 38, "type": "standard"},
-    "Pack Assembly": {"start_row": 40, "type": "pack"},
-    "Ready for Dispatch": {"start_row": 62, "type": "dispatch"}
-}
-
 # Canonical check order per process — ensures correct Excel row offsets
 # regardless of the order checks were saved to DB (which is by created_at).
-QC_CHECKS_ORDER = {
-    "Cell Sorting": [
-        "1.1.1 Acceptable range Voltage : 3.58 to 3.6 V, IR : 11.5 to 12.5 mΩ",
-        "1.2.1 Jig setup on the flat surface",
-        "1.2.2 Visual & spacing inspection",
-        "1.2.3 No moisture, dust on the cell surface (no contaminations) - IP clean",
-    ],
-    "Module Assembly": [
-        "2.1.1 Proper fitment to the Base plate fixture and base plate orientation",
-        "2.1.2 Clinch/all rivets perpendicular to the plate & proper clinch",
-        "2.2.1 Volume consistency",
-        "2.2.2 Coverage in space/gap",
-        "2.2.3 Jig alignment correction",
-        "2.2.4 Cure and bond integrity - 2 hrs. adhesive curing after cell flip",
-        "2.3.1 Cell continuity check & visual check on cell fitment, Cell Height (72.6 mm) from base plate after dismantling fixture",
-        "2.3.2 Cleanliness inspection",
-        "2.4.1 Even fix of sidewall (PC sheets) on all four sides without gaps, proper dimension 72.5 mm × 239.4 mm",
-        "2.5.1 Placement as per drawing & wire routings (Thermistor - 7 nos / Voltage harness - 14 nos)",
-        "2.5.2 Secure adhesion & positioning with thermal adhesive",
-        "2.5.3 No insulation damage or routing faults (Visual + routing diagram comparison)",
-        "2.6.1 Busbar fitment as per drawings, Curing time 1 hr.",
-        "2.6.2 Busbar placement & defect absence",
-        "2.6.3 Adhesive coverage - Ensure full bond",
-        "2.6.4 Adhesion strength",
-        "2.6.5 Busbar and CPT sub-assembly dim (Ht 22.2 mm from the base)",
-    ],
-    "Encapsulation & Soldering - Phase 1": [
-        "3.1.1 No encapsulant leakage from sidewalls. Curing time 2 hr @ room temperature ~25°C",
-        "3.1.2 Dimensions: L 410.3 × W 239.4 mm",
-        "3.2.1 Busbar + CPT module assembly dim (Ht 78 mm from the base)",
-        "3.2.2 Soldering check & Voltage of module level (soft soldering of voltage taps on cell positive surface)",
-        "3.3.1 Proper Stripping, crimping & connector insertion for voltage tap and thermistor",
-    ],
-    "Wire Bonding": [
-        "4.1.1 The 4 bonds on each cell as per the drawing, module voltage & continuity (no continuity present)",
-    ],
-    "Encapsulation Phase II (100%)": [
-        "5.1.1 Equal distribution of encapsulant on the module (4 hrs. curing)",
-        "5.2.1 Dimensions: H 78.6 × L 410.3 × W 239.4 mm",
-    ],
-    "Module QC Checks": [
-        "6.1.1 Check for Spec: a) Weight 17 Kg  b) Module Voltage 50 V  c) Continuity: Not present  d) Module Height: 78.6 mm. Encapsulation & Final module visual checks, Floating Voltage & Isolation",
-    ],
-    "EOL Testing": [
-        "7.1.1 Check for Abnormal temp & voltages and cell imbalance, Isolation resistance (EOL: 300 amp charge and discharge)",
-    ],
-    "Pack Assembly": [
-        "8.1.1 Check whether PRV nut interfering",
-        "8.2.1 Check sealant applied uniformly & MSM gap maintained between two modules (11.2 mm)",
-        "8.3.1 Check sealant application and side foam in fire arrestor. Check width 168.4 mm & leak check",
-        "8.4.1 Torque check @ M4 Allen head",
-        "8.5.1 No gaps allowed / proper fitment check. PRV: M5 - 1 Nm",
-        "8.6.1 Terminal Placement verification with Jig",
-        "8.6.2 PCB Placement verification with Jig",
-        "8.6.3 Stud Placement and weld check with Jig",
-        "8.6.4 Mounting point alignment (Heatsink) with Jig",
-        "8.6.5 Pack dimensions (430 × 168.4 × 301.35 mm) check",
-        "8.6.6 Torque checks & torque marking",
-        "8.6.7 Flatness ≤ 0.5 mm",
-        "8.6.8 Sealing - PCB, Overall Pack Body & Terminals",
-        "8.6.9 Overall aesthetics/cleanliness of the pack",
-        "8.6.10 Top casing torque check and paint marking (M4 socket head)",
-        "8.6.11 Leak test / Pressure test (Passed/Failed)",
-        "8.6.12 Pack weight (CAD Wt.: 38 Kg)",
-        "8.7.1 Pack voltage: 100 V Nominal",
-        "8.7.2 Isolation resistance: Min in MΩ",
-        "8.7.3 Hard leakage to body - Shouldn't present",
-        "8.7.4 Voltage taps and thermistor readings with respect to PRAVAIG BMS (PCB communications: voltage + temperature)",
-        "8.7.5 Hard leakage to body - Shouldn't present (after bench drop test ~20°)",
-    ],
-    "Ready for Dispatch": [
-        "9.1 Overall pack visual inspection: No defects/no dents/no stains. HV terminals covered with Kapton, PCB covered, PRV placed and covered, product labels, warning labels, +ve & -ve terminal labels, manufacturing date and QC decals placed. (SOC % before dispatch ≤30%)",
-    ],
-}
+QC_CHECKS_ORDER = PROCESS_CHECKS
+
+
+# Parsed template snapshot: (template mtime, pickled Workbook)
+_template_snapshot = None
+_template_lock = threading.Lock()
+
+
+def load_template_workbook():
+    """
+    Return a fresh, independent copy of the template workbook.
+    The template XML is parsed once per process (and again only if the file
+    changes); each call unpickles that snapshot, which takes milliseconds
+    instead of re-parsing styles and merged-cell borders from disk.
+    """
+    global _template_snapshot
+    template_mtime = TEMPLATE_PATH.stat().st_mtime_ns
+    with _template_lock:
+        if _template_snapshot is None or _template_snapshot[0] != template_mtime:
+            wb = openpyxl.load_workbook(TEMPLATE_PATH)
+            _template_snapshot = (template_mtime, pickle.dumps(wb, protocol=pickle.HIGHEST_PROTOCOL))
+            logger.info(f"Parsed Excel template {TEMPLATE_PATH}")
+        snapshot = _template_snapshot[1]
+    return pickle.loads(snapshot)
 
 
 def _split_names(combined: str) -> list:
@@ -159,33 +108,189 @@ def format_date_str(date_val) -> str:
     return date_val.strftime("%Y-%m-%d %H:%M:%S")
 
 
-def safe_write_cell(ws, row: int, column: int, value, font=None):
-    """Safely write to a cell, handling merged cells. Optionally override font."""
+def build_merged_index(ws) -> dict:
+    """Map every cell inside a merged range to that range's top-left (row, column)."""
+    merged_index = {}
+    for merged_range in ws.merged_cells.ranges:
+        top_left = (merged_range.min_row, merged_range.min_col)
+        for row in range(merged_range.min_row, merged_range.max_row + 1):
+            for column in range(merged_range.min_col, merged_range.max_col + 1):
+                merged_index[(row, column)] = top_left
+    return merged_index
+
+
+# Merged-cell index per worksheet, built on first write and dropped with the worksheet
+_merged_index_cache = weakref.WeakKeyDictionary()
+
+
+def get_merged_index(ws) -> dict:
+    """Return the cached merged-cell index for a worksheet, building it once."""
+    merged_index = _merged_index_cache.get(ws)
+    if merged_index is None:
+        merged_index = _merged_index_cache[ws] = build_merged_index(ws)
+    return merged_index
+
+
+def safe_write_cell(ws, row: int, column: int, value, font=None, merged_index: Optional[dict] = None):
+    """Safely write to a cell, handling merged cells. Optionally override font.
+    Merged cells are redirected to their top-left cell via an O(1) index lookup."""
     try:
-        cell = ws.cell(row=row, column=column)
-        # Check if this is a MergedCell
-        if isinstance(cell, openpyxl.cell.cell.MergedCell):
-            # Find the merged range this cell belongs to
-            for merged_range in ws.merged_cells.ranges:
-                if cell.coordinate in merged_range:
-                    # Get the top-left cell of the merged range
-                    min_row = merged_range.min_row
-                    min_col = merged_range.min_col
-                    top_left_cell = ws.cell(row=min_row, column=min_col)
-                    top_left_cell.value = value
-                    if font:
-                        top_left_cell.font = font
-                    return
-        else:
-            # Normal cell, write directly
-            cell.value = value
-            if font:
-                cell.font = font
+        if merged_index is None:
+            merged_index = get_merged_index(ws)
+        # Cells inside a merged range write to the range's top-left cell
+        target_row, target_column = merged_index.get((row, column), (row, column))
+        cell = ws.cell(row=target_row, column=target_column)
+        cell.value = value
+        if font:
+            cell.font = font
     except Exception as e:
         logger.error(f"Error writing to cell ({row}, {column}): {e}")
         raise
 
 
+# ============================================================================
+# PER-PROCESS SHEET WRITERS
+# Built once at import from PROCESS_ROW_MAPPING: each writer has its start row,
+# layout kind and check-name -> row table baked in, so filling a sheet is a
+# single dict dispatch per process instead of re-deriving the layout per check.
+# ============================================================================
+
+def _check_rows(start_row: int, order) -> tuple:
+    """Return ({check_name: row}, fallback row) for checks listed in canonical order."""
+    rows = {}
+    for idx, check_name in enumerate(order):
+        rows.setdefault(check_name, start_row + idx)
+    return rows, start_row + len(order)
+
+
+def _make_standard_writer(start_row: int, order):
+    """Processes 1-7: Cell sorting through EOL Testing.
+    Columns: L(12), M(13), N(14), O(15), P(16), Q(17), R(18)"""
+    rows, fallback_row = _check_rows(start_row, order)
+
+    def write(ws, checks, merged_index):
+        for check in checks:
+            row = rows.get(check['check_name'], fallback_row)
+
+            start_date_str = format_date_str(check.get('start_date'))
+            end_date_str = format_date_str(check.get('end_date'))
+
+            safe_write_cell(ws, row, 12, check.get('module_x', ''), STANDARD_FONT, merged_index)  # L: Module X QC Result
+            safe_write_cell(ws, row, 13, check.get('module_y', ''), STANDARD_FONT, merged_index)  # M: Module Y QC Result
+            safe_write_cell(ws, row, 14, start_date_str, None, merged_index)                      # N: Start date
+            safe_write_cell(ws, row, 15, end_date_str, None, merged_index)                        # O: End date
+            safe_write_cell(ws, row, 16, format_module_names(check.get('technician_name', '')), None, merged_index)  # P: Technician Name/sign
+            safe_write_cell(ws, row, 17, format_module_names(check.get('qc_name', '')), None, merged_index)          # Q: QC Name/Sign
+            safe_write_cell(ws, row, 18, check.get('remarks', ''), None, merged_index)            # R: Remarks
+
+    return write
+
+
+def _make_pack_writer(start_row: int, order):
+    """Process 8: Pack Assembly.
+    N and O are merged in template -> single Date cell; P and Q merged -> single Name cell.
+    Writes end_date if available, else start_date."""
+    rows, fallback_row = _check_rows(start_row, order)
+
+    def write(ws, checks, merged_index):
+        for check in checks:
+            row = rows.get(check['check_name'], fallback_row)
+
+            pack_result = check.get('module_x', '')
+            if pack_result == '' or pack_result == 'N/A':
+                pack_result = check.get('module_y', '')
+
+            date_str = format_date_str(check.get('end_date') or check.get('start_date'))
+
+            safe_write_cell(ws, row, 12, pack_result, STANDARD_FONT, merged_index)  # L: Pack QC Result
+            safe_write_cell(ws, row, 14, date_str, None, merged_index)              # N-O merged: Date
+            safe_write_cell(ws, row, 16, format_module_names(check.get('technician_name', '')), None, merged_index)  # P-Q merged: Name
+            safe_write_cell(ws, row, 18, check.get('remarks', ''), None, merged_index)  # R: Remarks
+
+    return write
+
+
+def _make_dispatch_writer(start_row: int, order):
+    """Process 9-10: Ready for Dispatch.
+    N-O merged, P-Q merged -> single Date and Name cells."""
+    def write(ws, checks, merged_index):
+        if len(checks) == 1:
+            row = start_row
+            check = checks[0]
+
+            result = check.get('module_x', '')
+            if result == '' or result == 'N/A':
+                result = check.get('module_y', '')
+
+            date_str = format_date_str(check.get('end_date') or check.get('start_date'))
+
+            safe_write_cell(ws, row, 12, result, STANDARD_FONT, merged_index)  # L: Result
+            safe_write_cell(ws, row, 14, date_str, None, merged_index)         # N-O merged: Date
+            safe_write_cell(ws, row, 16, format_module_names(check.get('technician_name', '')), None, merged_index)  # P-Q merged: Name
+            safe_write_cell(ws, row, 18, check.get('remarks', ''), None, merged_index)  # R: Remarks
+        else:
+            # Process 10: Packaging Instructions & PDIR Acceptance
+            # Special: Inspector name in F63, Date in J63
+            if checks:
+                first_check = checks[0]
+                timestamp_str = format_date_str(first_check.get('start_date'))
+
+                safe_write_cell(ws, 63, 6, first_format_module_names(first_check.get('qc_name', '')), None, merged_index)  # F63: Inspector Name
+                safe_write_cell(ws, 63, 10, timestamp_str, None, merged_index)  # J63: Date
+
+            # Data rows starting at 64
+            for idx, check in enumerate(checks):
+                row = 64 + idx
+
+                result = check.get('module_x', '')
+                if result == '' or result == 'N/A':
+                    result = check.get('module_y', '')
+
+                safe_write_cell(ws, row, 12, result, STANDARD_FONT, merged_index)  # L: Result
+                safe_write_cell(ws, row, 16, check.get('remarks', ''), None, merged_index)  # P: Comments
+
+    return write
+
+
+_WRITER_FACTORIES = {
+    "standard": _make_standard_writer,
+    "pack": _make_pack_writer,
+    "dispatch": _make_dispatch_writer,
+}
+
+# process name -> writer(ws, checks, merged_index)
+PROCESS_WRITERS = {
+    process_name: _WRITER_FACTORIES[row_cfg.kind](row_cfg.start_row, QC_CHECKS_ORDER.get(process_name, ()))
+    for process_name, row_cfg in PROCESS_ROW_MAPPING.items()
+}
+
+
+def write_pack_sheet(ws, battery_pack_id: str, pack_info: dict, all_checks: List[Dict]):
+    """Fill one template-copy worksheet with a battery pack's header and QC checks
+    (EXACT same cells for the individual, master and download workbooks)."""
+    merged_index = get_merged_index(ws)
+
+    # Write Battery Pack ID to cell J6 (exactly as before)
+    safe_write_cell(ws, 6, 10, battery_pack_id, None, merged_index)
+
+    # Write "Pack: XX  Module: SN1 & SN2" to cell P6
+    safe_write_cell(ws, 6, 16, f"Pack: {battery_pack_id}  Module: {pack_info.get('module_sn1','')} & {pack_info.get('module_sn2','')}",
+                    None, merged_index)
+
+    # Group checks by process
+    checks_by_process = {}
+    for check in all_checks:
+        checks_by_process.setdefault(check['process_name'], []).append(check)
+
+    # Write data to Excel using EXACT same logic as before
+    for process_name, checks in checks_by_process.items():
+        writer = PROCESS_WRITERS.get(process_name)
+        if writer is None:
+            logger.warning(f"Process '{process_name}' not in mapping")
+            continue
+        writer(ws, checks, merged_index)
+
+
 def generate_battery_excel(battery_pack_id: str) -> Optional[Path]:
     """
     Generate individual Excel file for a battery pack
@@ -199,115 +304,12 @@ def generate_battery_excel(battery_pack_id: str) -> Optional[Path]:
             logger.error(f"Template {TEMPLATE_PATH} not found")
             return None
 
-        wb = openpyxl.load_workbook(TEMPLATE_PATH)
+        wb = load_template_workbook()
         ws = wb.worksheets[0]  # Use first sheet as template
 
-        # Write Battery Pack ID to cell J6 (exactly as before)
-        safe_write_cell(ws, 6, 10, battery_pack_id)
-
-        # Write "Pack: XX  Module: SN1 & SN2" to cell P6
-        _pi = get_battery_pack_info(battery_pack_id)
-        safe_write_cell(ws, 6, 16, f"Pack: {battery_pack_id}  Module: {_pi.get('module_sn1','')} & {_pi.get('module_sn2','')}")
-
-        # Get all QC checks for this battery pack from database
-        all_checks = get_qc_checks(battery_pack_id)
-
-        # Group checks by process
-        checks_by_process = {}
-        for check in all_checks:
-            process_name = check['process_name']
-            if process_name not in checks_by_process:
-                checks_by_process[process_name] = []
-            checks_by_process[process_name].append(check)
-
-        # Write data to Excel using EXACT same logic as before
-        for process_name, checks in checks_by_process.items():
-            # Get process mapping (same as before)
-            if process_name not in PROCESS_ROW_MAPPING:
-                logger.warning(f"Process '{process_name}' not in mapping")
-                continue
-
-            process_info = PROCESS_ROW_MAPPING[process_name]
-            start_row = process_info["start_row"]
-            process_type = process_info["type"]
-
-            # Write data based on process type (EXACT same logic as app_unified.py)
-            if process_type == "standard":
-                # Processes 1-7: Cell sorting through EOL Testing
-                # Columns: L(12), M(13), N(14), O(15), P(16), Q(17), R(18)
-                order = QC_CHECKS_ORDER.get(process_name, [])
-                for check in checks:
-                    idx = order.index(check['check_name']) if check['check_name'] in order else len(order)
-                    row = start_row + idx
-
-                    start_date_str = format_date_str(check.get('start_date'))
-                    end_date_str = format_date_str(check.get('end_date'))
-
-                    safe_write_cell(ws, row, 12, check.get('module_x', ''), font=STANDARD_FONT)  # L: Module X QC Result
-                    safe_write_cell(ws, row, 13, check.get('module_y', ''), font=STANDARD_FONT)  # M: Module Y QC Result
-                    safe_write_cell(ws, row, 14, start_date_str)                 # N: Start date
-                    safe_write_cell(ws, row, 15, end_date_str)                   # O: End date
-                    safe_write_cell(ws, row, 16, format_module_names(check.get('technician_name', '')))  # P: Technician Name/sign
-                    safe_write_cell(ws, row, 17, format_module_names(check.get('qc_name', '')))      # Q: QC Name/Sign
-                    safe_write_cell(ws, row, 18, check.get('remarks', ''))      # R: Remarks
-
-            elif process_type == "pack":
-                # Process 8: Pack Assembly
-                # N and O are merged in template → single Date cell; P and Q merged → single Name cell
-                # Write end_date if available, else start_date
-                order = QC_CHECKS_ORDER.get(process_name, [])
-                for check in checks:
-                    idx = order.index(check['check_name']) if check['check_name'] in order else len(order)
-                    row = start_row + idx
-
-                    pack_result = check.get('module_x', '')
-                    if pack_result == '' or pack_result == 'N/A':
-                        pack_result = check.get('module_y', '')
-
-                    date_str = format_date_str(check.get('end_date') or check.get('start_date'))
-
-                    safe_write_cell(ws, row, 12, pack_result, font=STANDARD_FONT)   # L: Pack QC Result
-                    safe_write_cell(ws, row, 14, date_str)                          # N-O merged: Date
-                    safe_write_cell(ws, row, 16, format_module_names(check.get('technician_name', '')))  # P-Q merged: Name
-                    safe_write_cell(ws, row, 18, check.get('remarks', ''))          # R: Remarks
-
-            elif process_type == "dispatch":
-                # Process 9-10: Ready for Dispatch
-                # N-O merged, P-Q merged → single Date and Name cells
-                if len(checks) == 1:
-                    row = 62
-                    check = checks[0]
-
-                    result = check.get('module_x', '')
-                    if result == '' or result == 'N/A':
-                        result = check.get('module_y', '')
-
-                    date_str = format_date_str(check.get('end_date') or check.get('start_date'))
-
-                    safe_write_cell(ws, row, 12, result, font=STANDARD_FONT)        # L: Result
-                    safe_write_cell(ws, row, 14, date_str)                          # N-O merged: Date
-                    safe_write_cell(ws, row, 16, format_module_names(check.get('technician_name', '')))  # P-Q merged: Name
-                    safe_write_cell(ws, row, 18, check.get('remarks', ''))          # R: Remarks
-                else:
-                    # Process 10: Packaging Instructions & PDIR Acceptance
-                    # Special: Inspector name in F63, Date in J63
-                    if checks:
-                        first_check = checks[0]
-                        timestamp_str = format_date_str(first_check.get('start_date'))
-
-                        safe_write_cell(ws, 63, 6, first_format_module_names(first_check.get('qc_name', '')))  # F63: Inspector Name
-                        safe_write_cell(ws, 63, 10, timestamp_str)                  # J63: Date
-
-                    # Data rows starting at 64
-                    for idx, check in enumerate(checks):
-                        row = 64 + idx
-
-                        result = check.get('module_x', '')
-                        if result == '' or result == 'N/A':
-                            result = check.get('module_y', '')
-
-                        safe_write_cell(ws, row, 12, result, font=STANDARD_FONT)    # L: Result
-                        safe_write_cell(ws, row, 16, check.get('remarks', ''))      # P: Comments
+        # Fill the sheet from the database (header + all QC checks)
+        write_pack_sheet(ws, battery_pack_id, get_battery_pack_info(battery_pack_id),
+                         get_qc_checks(battery_pack_id))
 
         # Save to individual file
         output_dir = Path("excel_reports")
@@ -337,10 +339,12 @@ def generate_master_excel() -> Optional[Path]:
             return None
 
         # Load clean template (NEVER modified)
-        wb = openpyxl.load_workbook(TEMPLATE_PATH)
+        wb = load_template_workbook()
 
-        # Get all battery pack IDs from database
-        battery_ids = get_all_battery_packs()
+        # Load every pack's info and QC checks up front (two queries instead of two per pack)
+        pack_info = get_all_battery_pack_info()
+        battery_ids = list(pack_info)
+        checks_by_pack = get_all_qc_checks_by_pack()
 
         if not battery_ids:
             logger.info("No battery packs in database yet")
@@ -357,92 +361,8 @@ def generate_master_excel() -> Optional[Path]:
             ws = wb.copy_worksheet(template_sheet)
             ws.title = battery_id
 
-            # Write Battery Pack ID
-            safe_write_cell(ws, 6, 10, battery_id)
-
-            # Write "Pack: XX  Module: SN1 & SN2" to cell P6
-            _pi = get_battery_pack_info(battery_id)
-            safe_write_cell(ws, 6, 16, f"Pack: {battery_id}  Module: {_pi.get('module_sn1','')} & {_pi.get('module_sn2','')}")
-
-            # Get all QC checks for this battery pack
-            all_checks = get_qc_checks(battery_id)
-
-            # Group by process
-            checks_by_process = {}
-            for check in all_checks:
-                process_name = check['process_name']
-                if process_name not in checks_by_process:
-                    checks_by_process[process_name] = []
-                checks_by_process[process_name].append(check)
-
-            # Write data (EXACT same logic as individual file)
-            for process_name, checks in checks_by_process.items():
-                if process_name not in PROCESS_ROW_MAPPING:
-                    continue
-
-                process_info = PROCESS_ROW_MAPPING[process_name]
-                start_row = process_info["start_row"]
-                process_type = process_info["type"]
-
-                # Same writing logic as generate_battery_excel (keeping code identical)
-                if process_type == "standard":
-                    order = QC_CHECKS_ORDER.get(process_name, [])
-                    for check in checks:
-                        idx = order.index(check['check_name']) if check['check_name'] in order else len(order)
-                        row = start_row + idx
-
-                        start_date_str = format_date_str(check.get('start_date'))
-                        end_date_str = format_date_str(check.get('end_date'))
-
-                        safe_write_cell(ws, row, 12, check.get('module_x', ''), font=STANDARD_FONT)
-                        safe_write_cell(ws, row, 13, check.get('module_y', ''), font=STANDARD_FONT)
-                        safe_write_cell(ws, row, 14, start_date_str)
-                        safe_write_cell(ws, row, 15, end_date_str)
-                        safe_write_cell(ws, row, 16, format_module_names(check.get('technician_name', '')))
-                        safe_write_cell(ws, row, 17, format_module_names(check.get('qc_name', '')))
-                        safe_write_cell(ws, row, 18, check.get('remarks', ''))
-
-                elif process_type == "pack":
-                    order = QC_CHECKS_ORDER.get(process_name, [])
-                    for check in checks:
-                        idx = order.index(check['check_name']) if check['check_name'] in order else len(order)
-                        row = start_row + idx
-                        pack_result = check.get('module_x', '')
-                        if pack_result == '' or pack_result == 'N/A':
-                            pack_result = check.get('module_y', '')
-
-                        safe_write_cell(ws, row, 12, pack_result, font=STANDARD_FONT)
-                        safe_write_cell(ws, row, 14, format_date_str(check.get('end_date') or check.get('start_date')))
-                        safe_write_cell(ws, row, 16, format_module_names(check.get('technician_name', '')))
-                        safe_write_cell(ws, row, 18, check.get('remarks', ''))
-
-                elif process_type == "dispatch":
-                    if len(checks) == 1:
-                        row = 62
-                        check = checks[0]
-                        result = check.get('module_x', '')
-                        if result == '' or result == 'N/A':
-                            result = check.get('module_y', '')
-
-                        safe_write_cell(ws, row, 12, result, font=STANDARD_FONT)
-                        safe_write_cell(ws, row, 14, format_date_str(check.get('end_date') or check.get('start_date')))
-                        safe_write_cell(ws, row, 16, format_module_names(check.get('technician_name', '')))
-                        safe_write_cell(ws, row, 18, check.get('remarks', ''))
-                    else:
-                        if checks:
-                            first_check = checks[0]
-                            timestamp_str = format_date_str(first_check.get('start_date'))
-
-                            safe_write_cell(ws, 63, 6, first_format_module_names(first_check.get('qc_name', '')))
-                            safe_write_cell(ws, 63, 10, timestamp_str)
-
-                        for idx, check in enumerate(checks):
-                            row = 64 + idx
-                            result = check.get('module_x', '')
-                            if result == '' or result == 'N/A':
-                                result = check.get('module_y', '')
-                            safe_write_cell(ws, row, 12, result, font=STANDARD_FONT)
-                            safe_write_cell(ws, row, 16, check.get('remarks', ''))
+            # Fill the sheet (header + all QC checks)
+            write_pack_sheet(ws, battery_id, pack_info[battery_id], checks_by_pack.get(battery_id, []))
 
         # Save master output file (NOT the template!)
         wb.save(MASTER_OUTPUT_PATH)
@@ -487,93 +407,12 @@ def generate_battery_excel_bytes(battery_pack_id: str) -> Optional[bytes]:
             logger.error(f"Template {TEMPLATE_PATH} not found")
             return None
 
-        wb = openpyxl.load_workbook(TEMPLATE_PATH)
+        wb = load_template_workbook()
         ws = wb.worksheets[0]
 
-        # Write Battery Pack ID
-        safe_write_cell(ws, 6, 10, battery_pack_id)
-
-        # Write "Pack: XX  Module: SN1 & SN2" to cell P6
-        _pi = get_battery_pack_info(battery_pack_id)
-        safe_write_cell(ws, 6, 16, f"Pack: {battery_pack_id}  Module: {_pi.get('module_sn1','')} & {_pi.get('module_sn2','')}")
-
-        # Get all QC checks for this battery pack
-        all_checks = get_qc_checks(battery_pack_id)
-
-        # Group checks by process
-        checks_by_process = {}
-        for check in all_checks:
-            process_name = check['process_name']
-            if process_name not in checks_by_process:
-                checks_by_process[process_name] = []
-            checks_by_process[process_name].append(check)
-
-        # Write data (same logic as generate_battery_excel)
-        for process_name, checks in checks_by_process.items():
-            if process_name not in PROCESS_ROW_MAPPING:
-                continue
-
-            process_info = PROCESS_ROW_MAPPING[process_name]
-            start_row = process_info["start_row"]
-            process_type = process_info["type"]
-
-            if process_type == "standard":
-                order = QC_CHECKS_ORDER.get(process_name, [])
-                for check in checks:
-                    idx = order.index(check['check_name']) if check['check_name'] in order else len(order)
-                    row = start_row + idx
-
-                    start_date_str = format_date_str(check.get('start_date'))
-                    end_date_str = format_date_str(check.get('end_date'))
-
-                    safe_write_cell(ws, row, 12, check.get('module_x', ''), font=STANDARD_FONT)
-                    safe_write_cell(ws, row, 13, check.get('module_y', ''), font=STANDARD_FONT)
-                    safe_write_cell(ws, row, 14, start_date_str)
-                    safe_write_cell(ws, row, 15, end_date_str)
-                    safe_write_cell(ws, row, 16, format_module_names(check.get('technician_name', '')))
-                    safe_write_cell(ws, row, 17, format_module_names(check.get('qc_name', '')))
-                    safe_write_cell(ws, row, 18, check.get('remarks', ''))
-
-            elif process_type == "pack":
-                order = QC_CHECKS_ORDER.get(process_name, [])
-                for check in checks:
-                    idx = order.index(check['check_name']) if check['check_name'] in order else len(order)
-                    row = start_row + idx
-                    pack_result = check.get('module_x', '')
-                    if pack_result == '' or pack_result == 'N/A':
-                        pack_result = check.get('module_y', '')
-
-                    safe_write_cell(ws, row, 12, pack_result, font=STANDARD_FONT)
-                    safe_write_cell(ws, row, 14, format_date_str(check.get('end_date') or check.get('start_date')))
-                    safe_write_cell(ws, row, 16, format_module_names(check.get('technician_name', '')))
-                    safe_write_cell(ws, row, 18, check.get('remarks', ''))
-
-            elif process_type == "dispatch":
-                if len(checks) == 1:
-                    row = 62
-                    check = checks[0]
-                    result = check.get('module_x', '')
-                    if result == '' or result == 'N/A':
-                        result = check.get('module_y', '')
-
-                    safe_write_cell(ws, row, 12, result, font=STANDARD_FONT)
-                    safe_write_cell(ws, row, 14, format_date_str(check.get('end_date') or check.get('start_date')))
-                    safe_write_cell(ws, row, 16, format_module_names(check.get('technician_name', '')))
-                    safe_write_cell(ws, row, 18, check.get('remarks', ''))
-                else:
-                    if checks:
-                        first_check = checks[0]
-                        timestamp_str = format_date_str(first_check.get('start_date'))
-                        safe_write_cell(ws, 63, 6, first_format_module_names(first_check.get('qc_name', '')))
-                        safe_write_cell(ws, 63, 10, timestamp_str)
-
-                    for idx, check in enumerate(checks):
-                        row = 64 + idx
-                        result = check.get('module_x', '')
-                        if result == '' or result == 'N/A':
-                            result = check.get('module_y', '')
-                        safe_write_cell(ws, row, 12, result, font=STANDARD_FONT)
-                        safe_write_cell(ws, row, 16, check.get('remarks', ''))
+        # Fill the sheet from the database (header + all QC checks)
+        write_pack_sheet(ws, battery_pack_id, get_battery_pack_info(battery_pack_id),
+                         get_qc_checks(battery_pack_id))
 
         # Save to bytes (in-memory)
         output = io.BytesIO()
@@ -596,10 +435,12 @@ def generate_all_reports_excel_bytes() -> Optional[bytes]:
             logger.error(f"Template {TEMPLATE_PATH} not found")
             return None
 
-        wb = openpyxl.load_workbook(TEMPLATE_PATH)
+        wb = load_template_workbook()
 
-        # Get all battery pack IDs from database
-        battery_ids = get_all_battery_packs()
+        # Load every pack's info and QC checks up front (two queries instead of two per pack)
+        pack_info = get_all_battery_pack_info()
+        battery_ids = list(pack_info)
+        checks_by_pack = get_all_qc_checks_by_pack()
 
         if not battery_ids:
             logger.info("No battery packs in database")
@@ -615,90 +456,8 @@ def generate_all_reports_excel_bytes() -> Optional[bytes]:
             ws = wb.copy_worksheet(template_sheet)
             ws.title = battery_id
 
-            # Write Battery Pack ID
-            safe_write_cell(ws, 6, 10, battery_id)
-
-            # Write "Pack: XX  Module: SN1 & SN2" to cell P6
-            _pi = get_battery_pack_info(battery_id)
-            safe_write_cell(ws, 6, 16, f"Pack: {battery_id}  Module: {_pi.get('module_sn1','')} & {_pi.get('module_sn2','')}")
-
-            # Get all QC checks for this battery pack
-            all_checks = get_qc_checks(battery_id)
-
-            # Group by process
-            checks_by_process = {}
-            for check in all_checks:
-                process_name = check['process_name']
-                if process_name not in checks_by_process:
-                    checks_by_process[process_name] = []
-                checks_by_process[process_name].append(check)
-
-            # Write data (same logic as generate_master_excel)
-            for process_name, checks in checks_by_process.items():
-                if process_name not in PROCESS_ROW_MAPPING:
-                    continue
-
-                process_info = PROCESS_ROW_MAPPING[process_name]
-                start_row = process_info["start_row"]
-                process_type = process_info["type"]
-
-                if process_type == "standard":
-                    order = QC_CHECKS_ORDER.get(process_name, [])
-                    for check in checks:
-                        idx = order.index(check['check_name']) if check['check_name'] in order else len(order)
-                        row = start_row + idx
-
-                        start_date_str = format_date_str(check.get('start_date'))
-                        end_date_str = format_date_str(check.get('end_date'))
-
-                        safe_write_cell(ws, row, 12, check.get('module_x', ''), font=STANDARD_FONT)
-                        safe_write_cell(ws, row, 13, check.get('module_y', ''), font=STANDARD_FONT)
-                        safe_write_cell(ws, row, 14, start_date_str)
-                        safe_write_cell(ws, row, 15, end_date_str)
-                        safe_write_cell(ws, row, 16, format_module_names(check.get('technician_name', '')))
-                        safe_write_cell(ws, row, 17, format_module_names(check.get('qc_name', '')))
-                        safe_write_cell(ws, row, 18, check.get('remarks', ''))
-
-                elif process_type == "pack":
-                    order = QC_CHECKS_ORDER.get(process_name, [])
-                    for check in checks:
-                        idx = order.index(check['check_name']) if check['check_name'] in order else len(order)
-                        row = start_row + idx
-                        pack_result = check.get('module_x', '')
-                        if pack_result == '' or pack_result == 'N/A':
-                            pack_result = check.get('module_y', '')
-
-                        safe_write_cell(ws, row, 12, pack_result, font=STANDARD_FONT)
-                        safe_write_cell(ws, row, 14, format_date_str(check.get('end_date') or check.get('start_date')))
-                        safe_write_cell(ws, row, 16, format_module_names(check.get('technician_name', '')))
-                        safe_write_cell(ws, row, 18, check.get('remarks', ''))
-
-                elif process_type == "dispatch":
-                    if len(checks) == 1:
-                        row = 62
-                        check = checks[0]
-                        result = check.get('module_x', '')
-                        if result == '' or result == 'N/A':
-                            result = check.get('module_y', '')
-
-                        safe_write_cell(ws, row, 12, result, font=STANDARD_FONT)
-                        safe_write_cell(ws, row, 14, format_date_str(check.get('end_date') or check.get('start_date')))
-                        safe_write_cell(ws, row, 16, format_module_names(check.get('technician_name', '')))
-                        safe_write_cell(ws, row, 18, check.get('remarks', ''))
-                    else:
-                        if checks:
-                            first_check = checks[0]
-                            timestamp_str = format_date_str(first_check.get('start_date'))
-                            safe_write_cell(ws, 63, 6, first_format_module_names(first_check.get('qc_name', '')))
-                            safe_write_cell(ws, 63, 10, timestamp_str)
-
-                        for idx, check in enumerate(checks):
-                            row = 64 + idx
-                            result = check.get('module_x', '')
-                            if result == '' or result == 'N/A':
-                                result = check.get('module_y', '')
-                            safe_write_cell(ws, row, 12, result, font=STANDARD_FONT)
-                            safe_write_cell(ws, row, 16, check.get('remarks', ''))
+            # Fill the sheet (header + all QC checks)
+            write_pack_sheet(ws, battery_id, pack_info[battery_id], checks_by_pack.get(battery_id, []))
 
         # Save to bytes (in-memory)
         output = io.BytesIO()
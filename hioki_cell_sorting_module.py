@@ -453,7 +453,6 @@ def render_hioki_cell_sorting_tab(
                 timestamp = datetime.now().isoformat()
                 if db.add_measurement(timestamp, voltage, resistance, device_name, notes):
                     st.success("✅ Measurement saved!")
-                    st.balloons()
                 else:
                     st.error("❌ Failed to save measurement — check the logs.")
         with col_info:
@@ -19,6 +19,7 @@ import io
 import socket
 import logging
 import sqlite3
+import threading
 import traceback
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -38,14 +39,20 @@ DEFAULT_PORT = 5000
 # ---------------------------------------------------------------------------
 
 class _DB:
-    """Read/write wrapper around the receiver's SQLite database."""
+    """Read/write wrapper around the receiver's SQLite database.
+
+    Holds one connection for the server process (see _get_db); the lock
+    serialises its use across Streamlit sessions.
+    """
 
     def __init__(self, db_path: str) -> None:
         self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
         self._ensure_tables()
 
     def _ensure_tables(self) -> None:
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock, self._conn as conn:
             conn.executescript('''
                 CREATE TABLE IF NOT EXISTS measurements (
                     id          INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -69,10 +76,9 @@ class _DB:
                     updated_at     DATETIME DEFAULT CURRENT_TIMESTAMP
                 );
             ''')
-            conn.commit()
 
     def get_measurements(self, days=None, limit=None, ascending=False):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock, self._conn as conn:
             q = "SELECT * FROM measurements"
             p = []
             if days:
@@ -86,7 +92,7 @@ class _DB:
 
     def get_today_stats(self):
         today = datetime.now().strftime("%Y-%m-%d")
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock, self._conn as conn:
             row = conn.execute(
                 "SELECT COUNT(*), AVG(voltage), AVG(resistance),"
                 " MIN(voltage), MAX(voltage), MIN(resistance), MAX(resistance)"
@@ -98,23 +104,22 @@ class _DB:
         return None
 
     def get_total_count(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock, self._conn as conn:
             return conn.execute("SELECT COUNT(*) FROM measurements").fetchone()[0]
 
     def add_manual(self, voltage, resistance, device_name, notes):
         ts = datetime.now().isoformat()
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock, self._conn as conn:
             conn.execute(
                 "INSERT OR IGNORE INTO measurements"
                 " (timestamp, voltage, resistance, device_name, notes)"
                 " VALUES (?, ?, ?, ?, ?)",
                 (ts, voltage, resistance, device_name, notes),
             )
-            conn.commit()
         return True
 
     def export_range(self, start, end):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock, self._conn as conn:
             return pd.read_sql_query(
                 "SELECT * FROM measurements"
                 " WHERE DATE(timestamp) BETWEEN ? AND ?"
@@ -123,10 +128,16 @@ class _DB:
             )
 
     def clear_all(self):
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock, self._conn as conn:
             conn.execute("DELETE FROM measurements")
             conn.execute("DELETE FROM daily_stats")
-            conn.commit()
+
+
+@st.cache_resource
+def _get_db(db_path: str) -> _DB:
+    """One _DB per database file for the server process, so reruns reuse its
+    connection and the CREATE TABLE check runs once."""
+    return _DB(db_path)
 
 
 # ---------------------------------------------------------------------------
@@ -246,7 +257,6 @@ def _render_add(db, on_office):
         try:
             db.add_manual(voltage, resistance, device, notes)
             st.success("Saved!")
-            st.balloons()
         except Exception as e:
             st.error(f"Save failed: {e}")
 
@@ -365,7 +375,7 @@ def render_hioki_cell_sorting_tab(
     Compatible with Streamlit 1.52+ (uses width='stretch', no nested st.tabs).
     """
     try:
-        db = _DB(db_path)
+        db = _get_db(db_path)
         on_office = _on_office_network(office_subnet)
         recv_up = _receiver_running(receiver_port)
 
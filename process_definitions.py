@@ -0,0 +1,203 @@
+"""
+Process definitions for Battery Pack MES
+Single source of truth for the production processes, their QC checks and
+the Excel row mapping. Imported once per server process (unlike the
+Streamlit script, which re-executes on every rerun), so the lookup tables
+below are built exactly once and shared read-only.
+"""
+
+from collections import namedtuple
+from types import MappingProxyType
+
+# Process definitions - Synced with template.xlsx (source of truth)
+PROCESS_DEFINITIONS = MappingProxyType({
+    "Cell Sorting": {
+        "qc_checks": [
+            "1.1.1 Acceptable range Voltage : 3.58 to 3.6 V, IR : 11.5 to 12.5 mΩ",
+            "1.2.1 Jig setup on the flat surface",
+            "1.2.2 Visual & spacing inspection",
+            "1.2.3 No moisture, dust on the cell surface (no contaminations) - IP clean",
+        ],
+        "acceptance_criteria": [
+            "Nominal Voltage within 3.58–3.6 V (20 mV) & IR : 11.5–12.5 mΩ",
+            "Flatness ≤0.2 mm. No wobble or movement during assembly",
+            "All cells aligned as per design. No dents/scratches. Adhesive thickness 400 microns, cell-to-cell gap maintained",
+            "Surfaces free from dust, fibers, particles, oil, grease, or foreign substances on cells or jig",
+        ]
+    },
+    "Module Assembly": {
+        "qc_checks": [
+            "2.1.1 Proper fitment to the Base plate fixture and base plate orientation",
+            "2.1.2 Clinch/all rivets perpendicular to the plate & proper clinch",
+            "2.2.1 Volume consistency",
+            "2.2.2 Coverage in space/gap",
+            "2.2.3 Jig alignment correction",
+            "2.2.4 Cure and bond integrity - 2 hrs. adhesive curing after cell flip",
+            "2.3.1 Cell continuity check & visual check on cell fitment, Cell Height (72.6 mm) from base plate after dismantling fixture",
+            "2.3.2 Cleanliness inspection",
+            "2.4.1 Even fix of sidewall (PC sheets) on all four sides without gaps, proper dimension 72.5 mm × 239.4 mm",
+            "2.5.1 Placement as per drawing & wire routings (Thermistor - 7 nos / Voltage harness - 14 nos)",
+            "2.5.2 Secure adhesion & positioning with thermal adhesive",
+            "2.5.3 No insulation damage or routing faults (Visual + routing diagram comparison)",
+            "2.6.1 Busbar fitment as per drawings, Curing time 1 hr.",
+            "2.6.2 Busbar placement & defect absence",
+            "2.6.3 Adhesive coverage - Ensure full bond",
+            "2.6.4 Adhesion strength",
+            "2.6.5 Busbar and CPT sub-assembly dim (Ht 22.2 mm from the base)",
+        ],
+        "acceptance_criteria": [
+            "Battery pack sits flush; no gaps or misalignment; locking features engage properly and not wobble",
+            "Rivets: no bending/cracking; rivet heads flush with surface; clinch depth meets design specs",
+            "Volume within ±10% of spec (400–600 microns); no spill/insufficient bond. Dielectric strength 19.0 kV/mm",
+            "Uniform spread & no voids",
+            "Proper jig positioning & no misalignment",
+            "No cracks, bubbles, or discoloration in cured adhesive",
+            "No continuity; cell in nominal voltage. Height 72.6 mm ± 0.15 mm from base plate (all cells)",
+            "Cell surfaces free from dust, moisture, oil, or any foreign particles",
+            "No warping/bending/uneven spacing. Dim Tol: 72.5 mm ±0.15 mm × 239.4 mm (±0.20–0.30)",
+            "Thermistors 15 mm from top of cell; Voltage Harness orientation & positioning correct",
+            "Firm fixation & no loose ends",
+            "No cuts/abrasions/exposed conductors; wires not pinched/twisted/routed over sharp edges",
+            "As per drawing; orientation & alignment correct; busbar undisturbed during curing",
+            "Busbar free from bends, warping, or surface damage",
+            "Full coverage; even thickness (200 micron); no overflow/underfill. Dielectric strength 19.0 kV/mm. Full cure in 2–3 hrs at 25°C",
+            "Manual pull/peel should not cause detachment without damaging substrate",
+            "Tolerance: 22.2 mm ± 0.10 mm",
+        ]
+    },
+    "Encapsulation & Soldering - Phase 1": {
+        "qc_checks": [
+            "3.1.1 No encapsulant leakage from sidewalls. Curing time 2 hr @ room temperature ~25°C",
+            "3.1.2 Dimensions: L 410.3 × W 239.4 mm",
+            "3.2.1 Busbar + CPT module assembly dim (Ht 78 mm from the base)",
+            "3.2.2 Soldering check & Voltage of module level (soft soldering of voltage taps on cell positive surface)",
+            "3.3.1 Proper Stripping, crimping & connector insertion for voltage tap and thermistor",
+        ],
+        "acceptance_criteria": [
+            "Encapsulant fills 75–85% of cavity height uniformly; no leakage from side walls or joints",
+            "Outer casing dimensions post-potting within ±0.50 to 1.50 mm of original",
+            "Tolerance: 78 mm ± 0.15 mm",
+            "Solder flows and wets both pad and lead; no excessive solder; each tap outputs correct voltage; no continuity present",
+            "Firmly bonded; no loose strands/misalignment/broken housing; no insulation debris; labels clearly visible; no disconnect under light pull test",
+        ]
+    },
+    "Wire Bonding": {
+        "qc_checks": [
+            "4.1.1 The 4 bonds on each cell as per the drawing, module voltage & continuity (no continuity present)",
+        ],
+        "acceptance_criteria": [
+            "Smooth loop; loop height ≤1 mm from bus bar; no bond lift/broken during normal handling; double bonds per terminal; all bonded connections pass continuity test",
+        ]
+    },
+    "Encapsulation Phase II (100%)": {
+        "qc_checks": [
+            "5.1.1 Equal distribution of encapsulant on the module (4 hrs. curing)",
+            "5.2.1 Dimensions: H 78.6 × L 410.3 × W 239.4 mm",
+        ],
+        "acceptance_criteria": [
+            "All internal components, pins, wires, and solder joints must be fully embedded",
+            "Final fill height within ±1 mm of designed enclosure height (no overfilling)",
+        ]
+    },
+    "Module QC Checks": {
+        "qc_checks": [
+            "6.1.1 Check for Spec: a) Weight 17 Kg  b) Module Voltage 50 V  c) Continuity: Not present  d) Module Height: 78.6 mm. Encapsulation & Final module visual checks, Floating Voltage & Isolation",
+        ],
+        "acceptance_criteria": [
+            "a) Weight 17 ± 0.500 Kg  b) Module Voltage difference 100–150 mV  c) Continuity: Not present  d) Module Height: 78.6 mm ± 0.15 mm. Surface level/smooth/tack-free after curing; final fill within ±1 mm; potting seals wire outlets",
+        ]
+    },
+    "EOL Testing": {
+        "qc_checks": [
+            "7.1.1 Check for Abnormal temp & voltages and cell imbalance, Isolation resistance (EOL: 300 amp charge and discharge)",
+        ],
+        "acceptance_criteria": [
+            "Isolation resistance min 10 MΩ per module before CDC; no continuity. 0.3C DChg, 0.5C Chg, 4C DChg pulse; compliance with all EOL testing criteria including capacity, temperature, and sensor accuracy",
+        ]
+    },
+    "Pack Assembly": {
+        "qc_checks": [
+            "8.1.1 Check whether PRV nut interfering",
+            "8.2.1 Check sealant applied uniformly & MSM gap maintained between two modules (11.2 mm)",
+            "8.3.1 Check sealant application and side foam in fire arrestor. Check width 168.4 mm & leak check",
+            "8.4.1 Torque check @ M4 Allen head",
+            "8.5.1 No gaps allowed / proper fitment check. PRV: M5 - 1 Nm",
+            "8.6.1 Terminal Placement verification with Jig",
+            "8.6.2 PCB Placement verification with Jig",
+            "8.6.3 Stud Placement and weld check with Jig",
+            "8.6.4 Mounting point alignment (Heatsink) with Jig",
+            "8.6.5 Pack dimensions (430 × 168.4 × 301.35 mm) check",
+            "8.6.6 Torque checks & torque marking",
+            "8.6.7 Flatness ≤ 0.5 mm",
+            "8.6.8 Sealing - PCB, Overall Pack Body & Terminals",
+            "8.6.9 Overall aesthetics/cleanliness of the pack",
+            "8.6.10 Top casing torque check and paint marking (M4 socket head)",
+            "8.6.11 Leak test / Pressure test (Passed/Failed)",
+            "8.6.12 Pack weight (CAD Wt.: 38 Kg)",
+            "8.7.1 Pack voltage: 100 V Nominal",
+            "8.7.2 Isolation resistance: Min in MΩ",
+            "8.7.3 Hard leakage to body - Shouldn't present",
+            "8.7.4 Voltage taps and thermistor readings with respect to PRAVAIG BMS (PCB communications: voltage + temperature)",
+            "8.7.5 Hard leakage to body - Shouldn't present (after bench drop test ~20°)",
+        ],
+        "acceptance_criteria": [
+            "Module 1 & 2 sit flush; no tilt or gap >0.5 mm; bolt holes/studs align ±0.5 mm; no connectors/harnesses rubbing enclosure; PRV nut torques freely to full spec",
+            "Tolerance: ±0.10 to 0.15 mm",
+            "Foam seated evenly without compression loss; sealant continuous with no gaps; M6: 6.5–7.0 Nm, M5: 3–3.5 Nm; assembled width 168.4 mm ± 0.2 mm",
+            "M4: 1.5 Nm ± 0.1 Nm; proper alignment with terminal pads; no oxidation/oil/dust on contact area",
+            "Cover flush; no warpage/scratches/dents; PRV: M5 torqued to 1.0 Nm ± 0.1 Nm; clean, free from smudges/sealant spills/loose parts",
+            "Should match acceptance jig for alignment (terminal hole matches busbar)",
+            "Should match acceptance jig for alignment",
+            "Match jig; 90° ± 1° perpendicular to base; no thread damage (M5); no cracks/undercuts/pinholes",
+            "Should match acceptance jig for alignment",
+            "Tolerance: ±0.40 to 0.60 mm",
+            "M6: 6.5–7.0 Nm, M5: 3–3.5 Nm, M4: 1.5 Nm ±0.1 Nm, M3: 0.5–0.6 Nm, PRV M5: 1 Nm",
+            "Tolerance: ±0.1 mm",
+            "Full coverage; no gaps/voids along PCB edge or housing boundary; fasteners must NOT be sealed with sealant",
+            "Dust/particle free; no sealant overflow/oil/grease residue; top cover/side plates/connectors flush ±0.5 mm; all fasteners present and fixed",
+            "M4: 1.5 Nm ± 0.1 Nm with torque wrench",
+            "Terminal glands, casing joints, PRV leak-free after 3 psi applied; pack must hold 3 psi",
+            "Acceptable weight range: 37.5 kg – 38.5 kg",
+            "98 V to 100 V",
+            "Min 10 MΩ (-ve to casing body & +ve to casing body)",
+            "No continuity present",
+            "28 voltage taps verified: 100–150 mV; 11 thermistor readings verified",
+            "No continuity present",
+        ]
+    },
+    "Ready for Dispatch": {
+        "qc_checks": [
+            "9.1 Overall pack visual inspection: No defects/no dents/no stains. HV terminals covered with Kapton, PCB covered, PRV placed and covered, product labels, warning labels, +ve & -ve terminal labels, manufacturing date and QC decals placed. (SOC % before dispatch ≤30%)",
+        ],
+        "acceptance_criteria": [
+            "All inspection criteria met; labels verified; SOC ≤30% confirmed before dispatch",
+        ]
+    }
+})
+
+# Excel row configuration: first template row of the process and its layout
+# kind ("standard", "pack" or "dispatch"). A namedtuple so the Excel writers
+# can unpack it in one step instead of two string-keyed dict lookups.
+RowCfg = namedtuple("RowCfg", "start_row kind")
+
+# Row mapping for Excel sheet
+# Maps process name to starting row and column configuration
+PROCESS_ROW_MAPPING = MappingProxyType({
+    "Cell Sorting": RowCfg(8, "standard"),
+    "Module Assembly": RowCfg(12, "standard"),
+    "Encapsulation & Soldering - Phase 1": RowCfg(29, "standard"),
+    "Wire Bonding": RowCfg(34, "standard"),
+    "Encapsulation Phase II (100%)": RowCfg(35, "standard"),
+    "Module QC Checks": RowCfg(37, "standard"),
+    "EOL Testing": RowCfg(38, "standard"),
+    "Pack Assembly": RowCfg(40, "pack"),
+    "Ready for Dispatch": RowCfg(62, "dispatch")
+})
+
+# Canonical process order (Data Entry selectbox, blocking checks, dashboard stages)
+PROCESS_ORDER = tuple(PROCESS_DEFINITIONS)
+
+# Flat read-only lookup: process name -> tuple of QC check names in template order
+PROCESS_CHECKS = MappingProxyType({
+    name: tuple(definition["qc_checks"]) for name, definition in PROCESS_DEFINITIONS.items()
+})